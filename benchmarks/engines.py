@@ -0,0 +1,236 @@
+### Engine benchmark ###
+#
+# Runs each Fraud Detection System version on the same payment files and
+#   reports throughput, latency and memory
+#
+#
+# Description:
+#
+# The versions trade memory and work done after a transaction against the
+#   time a customer waits for a verdict (see README). This measures those
+#   trade-offs on synthetic files (see generate.py), or on given ones. For each
+#   engine it records:
+#
+#   build_s         seconds to read the batch file and build the network
+#   rows_per_s      stream rows checked and added per second
+#   check_*_us      percentiles of the time to check one transaction, i.e. the
+#                   time a customer waits
+#   update_*_us     percentiles of the time to add its friendship afterwards
+#   peak_rss_mb     the process's peak memory use
+#
+# Versions 1, 1.5 and 2 are run through their paymo strategies (see the paymo
+#   package), so they all read and write files with exactly the same code and
+#   each row can be timed. antifraud_2.extras.py has no strategy, so it is run
+#   as a script and only its overall rate and memory are recorded. Each engine
+#   runs in its own process, so their memory use doesn't mix.
+#
+# The results are written as a JSON list and a CSV table with one row per
+#   engine, so that runs on different machines or traffic can be compared.
+#
+# Usage: python benchmarks/engines.py REPORT [--engines v1,v1.5,v2,extras]
+#   [generator options, see generate.py]. Writes REPORT.json and REPORT.csv
+
+
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE,'..','src')
+sys.path.insert(0,SRC)
+
+from generate import add_arguments, generate
+
+
+ENGINES = ('v1','v1.5','v2','extras')
+PERCENTILES = (50,90,99,100)
+COLUMNS = ['engine','batch_rows','stream_rows','status','build_s',
+'stream_s','rows_per_s'] + ['check_p%d_us' % p for p in PERCENTILES] + \
+['update_p%d_us' % p for p in PERCENTILES] + ['peak_rss_mb']
+
+
+# Returns the given percentiles of a list of times (in seconds), in
+#   microseconds
+def percentiles(times,labels,prefix):
+    times = sorted(times)
+    result = {}
+    for p in labels:
+        if (times):
+            result['%s_p%d_us' % (prefix,p)] = round(times[int(p / 100.0 *
+            (len(times) - 1))] * 1e6,2)
+        else:
+            result['%s_p%d_us' % (prefix,p)] = None
+    return result
+
+
+# Runs in a child process: builds the network with strategy name from the
+#   batch file, then checks and adds every stream row, timing each. Writes the
+#   measurements as JSON to result_path
+def worker(name,batch_in,stream_in,hub_threshold,result_path):
+    from id_reader import read_ids, iter_id_blocks
+    from paymo.strategies import STRATEGIES
+
+    strategy = STRATEGIES[name](argparse.Namespace(hub_threshold =
+    hub_threshold,compact = False))
+    clock = time.time
+    start = clock()
+    ids_1, ids_2 = read_ids(batch_in,'batch_payments')
+    strategy.build(ids_1,ids_2)
+    build_s = clock() - start
+    del ids_1, ids_2
+
+    check_times = []
+    update_times = []
+    start = clock()
+    for ids_1, ids_2 in iter_id_blocks(stream_in,'stream_payments'):
+        check = strategy.check
+        add = strategy.add
+        for k in xrange(len(ids_1)):
+            id_1 = ids_1[k]
+            id_2 = ids_2[k]
+            t_0 = clock()
+            check(id_1,id_2)
+            t_1 = clock()
+            add(id_1,id_2)
+            t_2 = clock()
+            check_times.append(t_1 - t_0)
+            update_times.append(t_2 - t_1)
+    stream_s = clock() - start
+
+    result = {'build_s': round(build_s,3), 'stream_s': round(stream_s,3)}
+    result.update(percentiles(check_times,PERCENTILES,'check'))
+    result.update(percentiles(update_times,PERCENTILES,'update'))
+    with open(result_path,'w') as f:
+        json.dump(result,f)
+
+
+# Runs command, killing it after timeout seconds (if given). Returns its exit
+#   status, its peak memory use in megabytes and the time it took
+def run_measured(command,timeout):
+    start = time.time()
+    with open(os.devnull,'w') as devnull:
+        process = subprocess.Popen(command,stdout = devnull)
+        timer = None
+        if (timeout):
+            timer = threading.Timer(timeout,process.kill)
+            timer.start()
+        pid, status, usage = os.wait4(process.pid,0)                            # Unlike getrusage, gives this child's own peak memory
+        if (timer):
+            timer.cancel()
+    return status, usage.ru_maxrss / 1024.0, time.time() - start
+
+
+# Counts the data rows of a payments file
+def count_rows(path):
+    with open(path,'rb') as f:
+        return sum(block.count('\n') for block in iter(lambda:
+        f.read(1 << 20),'')) - 1
+
+
+# Measures engine name on the given files. Returns a dictionary of COLUMNS
+def measure(name,batch_in,stream_in,args,scratch):
+    row = dict((column,None) for column in COLUMNS)
+    row['engine'] = name
+    row['batch_rows'] = count_rows(batch_in)
+    row['stream_rows'] = count_rows(stream_in)
+    result_path = os.path.join(scratch,name + '.json')
+
+    if (name == 'extras'):
+        outputs = [os.path.join(scratch,f) for f in ('x_out','x_rewards',
+        'x_suspects')]
+        command = [sys.executable,os.path.join(SRC,'antifraud_2.extras.py'),
+        batch_in,stream_in] + outputs
+    else:
+        command = [sys.executable,os.path.abspath(__file__),'--worker',name,
+        '--result',result_path,'--hub-threshold',str(args.hub_threshold),
+        '--batch-in',batch_in,'--stream-in',stream_in]
+    status, row['peak_rss_mb'], total_s = run_measured(command,args.timeout)
+    row['peak_rss_mb'] = round(row['peak_rss_mb'],1)
+
+    if (status != 0):
+        row['status'] = 'timed out' if args.timeout and total_s >= \
+        args.timeout else 'failed'
+        return row
+    row['status'] = 'ok'
+    if (name == 'extras'):
+        row['stream_s'] = round(total_s,3)                                      # The whole run, batch file included, as the script can't be timed by phase
+    else:
+        with open(result_path) as f:
+            row.update(json.load(f))
+    if (row['stream_s']):
+        row['rows_per_s'] = round(row['stream_rows'] / row['stream_s'],1)
+    return row
+
+
+parser = argparse.ArgumentParser(description = "Benchmarks the Fraud " +
+"Detection System versions on the same payment files")
+parser.add_argument('report', nargs = '?', help = "Writes REPORT.json and " +
+"REPORT.csv")
+parser.add_argument('--engines', default = ','.join(ENGINES), help =
+"Comma-separated engines to run (default: %(default)s)")
+parser.add_argument('--batch-in', metavar = 'FILE', help = "Use this batch " +
+"file instead of generating one (requires --stream-in)")
+parser.add_argument('--stream-in', metavar = 'FILE', help = "Use this " +
+"stream file instead of generating one")
+parser.add_argument('--hub-threshold', metavar = 'N', type = int,
+default = 100, help = "v1.5's hub threshold (default: %(default)s)")
+parser.add_argument('--timeout', metavar = 'SECONDS', type = float, help =
+"Give up on an engine after this long (version 1 can take a very long time " +
+"on large files)")
+parser.add_argument('--worker', help = argparse.SUPPRESS)
+parser.add_argument('--result', help = argparse.SUPPRESS)
+add_arguments(parser)
+args = parser.parse_args()
+
+if (args.worker):
+    worker(args.worker,args.batch_in,args.stream_in,args.hub_threshold,
+    args.result)
+    sys.exit()
+
+if (not args.report):
+    parser.error("REPORT is required")
+engines = args.engines.split(',')
+for name in engines:
+    if (not name in ENGINES):
+        parser.error("unknown engine '%s' (choose from %s)" % (name,
+        ', '.join(ENGINES)))
+if (bool(args.batch_in) != bool(args.stream_in)):
+    parser.error("--batch-in and --stream-in must be given together")
+
+scratch = tempfile.mkdtemp(prefix = 'paymo_bench_')
+try:
+    if (args.batch_in):
+        batch_in = os.path.abspath(args.batch_in)
+        stream_in = os.path.abspath(args.stream_in)
+        source = {'batch_in': batch_in, 'stream_in': stream_in}
+    else:
+        batch_in = os.path.join(scratch,'batch.csv')
+        stream_in = os.path.join(scratch,'stream.csv')
+        generate(args,batch_in,stream_in)
+        source = dict((key,getattr(args,key)) for key in ('batch_rows',
+        'stream_rows','users','alpha','hubs','hub_share','seed'))
+
+    rows = []
+    for name in engines:
+        row = measure(name,batch_in,stream_in,args,scratch)
+        rows.append(row)
+        print "%-7s %-9s %10s rows/s  check p50 %8s us  p99 %8s us  " % \
+        (name,row['status'],row['rows_per_s'],row['check_p50_us'],
+        row['check_p99_us']) + "peak %s MB" % row['peak_rss_mb']
+finally:
+    shutil.rmtree(scratch)
+
+with open(args.report + '.json','w') as f:
+    json.dump({'source': source, 'python': sys.version.split()[0],
+    'results': rows},f,indent = 2,sort_keys = True)
+with open(args.report + '.csv','wb') as f:
+    writer = csv.DictWriter(f,COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
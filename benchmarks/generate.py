@@ -0,0 +1,111 @@
+### Synthetic payments generator ###
+#
+# Writes batch and stream payment files with a power-law network, for
+#   benchmarking
+#
+#
+# Description:
+#
+# Real payment networks are dominated by a few very popular accounts: most
+#   people pay a handful of others, while shops and the like are paid by
+#   thousands. The files written here imitate that. Each participant of a
+#   transaction is drawn from --users ordinary customers, customer k (in order
+#   of popularity) being chosen with probability proportional to
+#   1 / k ** --alpha, so that the number of friends people have roughly
+#   follows a power law. On top of that, with probability --hub-share one side
+#   of a transaction is one of --hubs 'hubs', accounts with huge numbers of
+#   friends (see README). Customer ids are shuffled, so popularity has nothing
+#   to do with the size of the id.
+#
+# The files have the challenge's layout ('time, id1, id2, amount, message'),
+#   with the stream file's transactions following on from the batch file's.
+#
+# Usage: python benchmarks/generate.py batch.csv stream.csv [options]
+#   (also used by benchmarks/engines.py)
+
+
+import random
+import argparse
+import datetime
+from bisect import bisect
+
+
+# Class drawing transaction participants. Inputs: the number of ordinary
+#   customers, the power-law exponent, the number of hubs, the chance of a
+#   hub taking part in a transaction, and a random.Random
+class Payment_generator:
+
+    def __init__(self,users,alpha,hubs,hub_share,rng):
+        self.rng = rng
+        self.hub_share = hub_share
+        self.ids = range(1,users + 1)
+        rng.shuffle(self.ids)                                                   # self.ids[k] is the (k+1)-th most popular customer
+        self.hubs = range(users + 1,users + hubs + 1)
+        self.cumulative = []                                                    # Running totals of the popularity weights, for bisect
+        total = 0.0
+        for k in xrange(users):
+            total += (k + 1) ** -alpha
+            self.cumulative.append(total)
+        self.time = datetime.datetime(2016,11,1)
+
+    def customer(self):
+        k = bisect(self.cumulative,self.rng.random() * self.cumulative[-1])
+        return self.ids[min(k,len(self.ids) - 1)]
+
+    # Returns the next row of a payments file (without the newline)
+    def row(self):
+        rng = self.rng
+        id_1 = self.customer()
+        id_2 = self.customer()
+        if (self.hubs and rng.random() < self.hub_share):
+            if (rng.random() < 0.5):
+                id_1 = rng.choice(self.hubs)
+            else:
+                id_2 = rng.choice(self.hubs)
+        self.time += datetime.timedelta(seconds = rng.randint(0,3))
+        return "%s, %d, %d, %.2f, generated" % (self.time,id_1,id_2,
+        rng.uniform(1,100))
+
+    # Writes a payments file of the given number of rows
+    def write(self,path,rows):
+        with open(path,'w') as f:
+            f.write('time, id1, id2, amount, message\n')
+            for k in xrange(rows):
+                f.write(self.row() + '\n')
+
+
+# Adds the generator's options to argparse parser
+def add_arguments(parser):
+    parser.add_argument('--batch-rows', metavar = 'N', type = int,
+    default = 200000, help = "Rows in the batch file (default: %(default)s)")
+    parser.add_argument('--stream-rows', metavar = 'N', type = int,
+    default = 20000, help = "Rows in the stream file (default: %(default)s)")
+    parser.add_argument('--users', metavar = 'N', type = int, default = 50000,
+    help = "Ordinary customers (default: %(default)s)")
+    parser.add_argument('--alpha', type = float, default = 1.0, help =
+    "Power-law exponent of customer popularity (default: %(default)s)")
+    parser.add_argument('--hubs', metavar = 'N', type = int, default = 5,
+    help = "Accounts with huge numbers of friends (default: %(default)s)")
+    parser.add_argument('--hub-share', metavar = 'P', type = float,
+    default = 0.2, help = "Chance of a hub taking part in a transaction " +
+    "(default: %(default)s)")
+    parser.add_argument('--seed', type = int, default = 1, help = "Random " +
+    "seed (default: %(default)s)")
+
+
+# Writes the batch and stream files described by parsed options args
+def generate(args,batch_path,stream_path):
+    generator = Payment_generator(args.users,args.alpha,args.hubs,
+    args.hub_share,random.Random(args.seed))
+    generator.write(batch_path,args.batch_rows)
+    generator.write(stream_path,args.stream_rows)
+
+
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(description = "Writes synthetic " +
+    "payment files with a power-law network")
+    parser.add_argument('batch_out', help = "Batch file to write")
+    parser.add_argument('stream_out', help = "Stream file to write")
+    add_arguments(parser)
+    args = parser.parse_args()
+    generate(args,args.batch_out,args.stream_out)
@@ -0,0 +1,119 @@
+### Hub pair benchmark ###
+#
+# Times the friendship checks in graph_query.py against the set-building
+#   versions they replaced, for pairs of accounts with huge numbers of friends
+#
+#
+# Description:
+#
+# The mutual friend check used to be 'len(friends_1 & friends_2) > 0', and
+#   antifraud_2.extras.py's fourth-order check used to build the union of each
+#   participant's friends of friends and intersect them. Both cost time and
+#   memory in proportion to the size of the sets, even when the first element
+#   looked at already answers the question. This builds a network with a few
+#   'hubs' (accounts with --hub-size friends each, overlapping by --overlap
+#   of them) and times each version of each check on pairs of hubs, pairs of
+#   their ordinary customers, and hubs as both plain sets and compressed
+#   bitmaps (see friend_bitmap.py). Both versions are checked to give the same
+#   answers.
+#
+# Usage: python benchmarks/hub_pairs.py [--hub-size N] [--overlap N] ...
+
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),
+'..','src'))
+
+from friend_bitmap import Friend_bitmap
+from graph_query import has_common_neighbor, within_distance
+
+
+# The checks as they were before graph_query.py
+def old_common_neighbor(friends_1,friends_2):
+    return len(friends_1 & friends_2) > 0
+
+def old_within_four(net,id_1,id_2):
+    second_degree_1 = set(net[id_1])
+    for person in net[id_1]:
+        second_degree_1 |= net[person]
+    second_degree_2 = set(net[id_2])
+    for person in net[id_2]:
+        second_degree_2 |= net[person]
+    return len(second_degree_1 & second_degree_2) > 0
+
+
+# Returns the average time per call of check(*arguments) in microseconds, and
+#   its result
+def time_check(check,arguments,repeats):
+    start = time.time()
+    for k in xrange(repeats):
+        result = check(*arguments)
+    return (time.time() - start) / repeats * 1e6, result
+
+
+parser = argparse.ArgumentParser(description = "Times graph_query.py's " +
+"checks on pairs of accounts with huge numbers of friends")
+parser.add_argument('--hubs', type = int, default = 4, help = "Number of " +
+"hubs (default: %(default)s)")
+parser.add_argument('--hub-size', metavar = 'N', type = int, default = 100000,
+help = "Friends of each hub (default: %(default)s)")
+parser.add_argument('--overlap', metavar = 'N', type = int, default = 10,
+help = "Friends shared by each pair of hubs (default: %(default)s)")
+parser.add_argument('--repeats', metavar = 'N', type = int, default = 20,
+help = "Calls timed per check (default: %(default)s)")
+parser.add_argument('--seed', type = int, default = 1)
+args = parser.parse_args()
+
+random.seed(args.seed)
+
+# Each hub gets its own block of customer ids, plus args.overlap customers
+#   shared with every other hub. Ordinary customers also get a few friends
+#   among themselves
+net = {}
+shared = range(1,args.overlap + 1)
+hubs = []
+next_id = args.overlap + 1
+for h in xrange(args.hubs):
+    hub = -(h + 1)                                                              # Hubs get negative ids, so they can't clash with their customers
+    hubs.append(hub)
+    customers = range(next_id,next_id + args.hub_size - args.overlap)
+    next_id += len(customers)
+    net[hub] = set(customers + shared)
+    for customer in customers + shared:
+        net.setdefault(customer,set()).add(hub)
+    for k in xrange(len(customers) // 10):
+        id_1 = random.choice(customers)
+        id_2 = random.choice(customers)
+        if (id_1 != id_2):
+            net[id_1].add(id_2)
+            net[id_2].add(id_1)
+bitmaps = dict((hub,Friend_bitmap(net[hub])) for hub in hubs)
+customers = [id for id in net if id > args.overlap]
+
+print "%d hubs of %d friends each, %d shared between each pair" % \
+(args.hubs,args.hub_size,args.overlap)
+print "%-44s %12s %12s %8s" % ("check","old (us)","new (us)","speedup")
+for label, old, new, arguments, repeats in (
+("mutual friend, hub sets",old_common_neighbor,has_common_neighbor,
+(net[hubs[0]],net[hubs[1]]),args.repeats),
+("mutual friend, hub bitmaps",old_common_neighbor,has_common_neighbor,
+(bitmaps[hubs[0]],bitmaps[hubs[1]]),args.repeats),
+("mutual friend, hub set and bitmap",old_common_neighbor,has_common_neighbor,
+(net[hubs[0]],bitmaps[hubs[1]]),args.repeats),
+("mutual friend, hub and customer",old_common_neighbor,has_common_neighbor,
+(net[hubs[0]],net[customers[-1]]),args.repeats * 1000),
+("within four, customers of different hubs",
+lambda *pair: old_within_four(net,*pair),
+lambda *pair: within_distance(net,pair[0],pair[1],4),
+(customers[0],customers[-1]),max(1,args.repeats // 10))):
+    old_time, old_result = time_check(old,arguments,repeats)
+    new_time, new_result = time_check(new,arguments,repeats)
+    if (old_result != new_result):
+        sys.exit("Results differ for '%s'" % label)
+    print "%-44s %12.1f %12.1f %7.1fx" % (label,old_time,new_time,
+    old_time / new_time)
@@ -0,0 +1,218 @@
+### Engine tests ###
+#
+# Runs every Fraud Detection System version and option end to end on
+#   generated payment files, and compares the output files with the original
+#   antifraud_2.py's answers
+#
+#
+# Description:
+#
+# The batch and stream files are written by benchmarks/generate.py, with a few
+#   accounts ('hubs') taking part in a large share of the transactions, so
+#   that friend bitmaps, hub thresholds and the search's shortcuts all come
+#   into play. The expected outputs are worked out in this process with the
+#   original version 2's checks (baseline_degree in unit_tests.py). Each
+#   script is then run as a separate process, as run.sh would run it, and its
+#   output files must match exactly.
+#
+# Versions 1 and 1.5 treat someone paying themselves differently from version
+#   2, so they are run on files with those rows left out.
+#
+# Usage: python insight_testsuite/engine_tests.py [-v] (Python 2, like the
+#   scripts)
+
+
+import os
+import sys
+import shutil
+import random
+import tempfile
+import unittest
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE,'..','src')
+sys.path.insert(0,SRC)
+sys.path.insert(0,os.path.join(HERE,'..','benchmarks'))
+
+from generate import Payment_generator
+from unit_tests import baseline_degree, add_friendship
+
+
+VERDICTS = (('trusted','trusted','trusted'),
+('unverified','trusted','trusted'),
+('unverified','unverified','trusted'),
+('unverified','unverified','unverified'))
+
+
+# Returns the (id1, id2) pairs of payments file path
+def read_pairs(path):
+    with open(path) as f:
+        next(f)
+        return [tuple(int(field) for field in line.split(',')[1:3]) for line
+        in f]
+
+
+# Writes the rows of payments file path_in to path_out, leaving out anyone
+#   paying themselves
+def drop_self_payments(path_in,path_out):
+    with open(path_in) as f_in:
+        with open(path_out,'w') as f_out:
+            f_out.write(next(f_in))
+            for line in f_in:
+                fields = line.split(',')
+                if (int(fields[1]) != int(fields[2])):
+                    f_out.write(line)
+
+
+# Returns the expected contents of the three output files for batch file
+#   batch_in and stream file stream_in
+def expected_outputs(batch_in,stream_in):
+    net = {}
+    for id_1, id_2 in read_pairs(batch_in):
+        add_friendship(net,id_1,id_2)
+    outputs = ([],[],[])
+    for id_1, id_2 in read_pairs(stream_in):
+        for output, verdict in zip(outputs,VERDICTS[baseline_degree(net,id_1,
+        id_2)]):
+            output.append(verdict + '\n')
+        add_friendship(net,id_1,id_2)
+    return tuple(''.join(output) for output in outputs)
+
+
+class Engine_test(unittest.TestCase):
+
+    # Writes the files of each data set: 'hubs', with a few accounts taking
+    #   part in a large share of the transactions, the same without anyone
+    #   paying themselves ('no_self') and 'sparse', a larger network where
+    #   everyone is equally likely to pay anyone, so that the network stays
+    #   thin and most transactions go through the fourth-order check
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.data = {}
+        for name, generator, batch_rows, stream_rows in (('hubs',
+        Payment_generator(200,1.0,3,0.2,random.Random(5)),1500,500),
+        ('sparse',Payment_generator(1000,0.0,0,0,random.Random(6)),300,
+        3000)):
+            batch = os.path.join(cls.folder,name + '_batch.csv')
+            stream = os.path.join(cls.folder,name + '_stream.csv')
+            generator.write(batch,batch_rows)
+            generator.write(stream,stream_rows)
+            cls.data[name] = (batch,stream,expected_outputs(batch,stream))
+        batch = os.path.join(cls.folder,'no_self_batch.csv')
+        stream = os.path.join(cls.folder,'no_self_stream.csv')
+        drop_self_payments(cls.data['hubs'][0],batch)
+        drop_self_payments(cls.data['hubs'][1],stream)
+        cls.data['no_self'] = (batch,stream,expected_outputs(batch,stream))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    # Runs the Python command line arguments + [output files] + options from
+    #   src, and returns the contents of the three output files it writes.
+    #   Unless keep is set, the output files of the previous run are removed
+    #   first
+    def run_engine(self,arguments,options,keep = False):
+        outputs = [os.path.join(self.folder,'output%d.txt' % k) for k in
+        (1,2,3)]
+        for path in outputs:
+            if (os.path.exists(path) and not keep):
+                os.remove(path)
+        command = [sys.executable] + arguments + outputs + options
+        process = subprocess.Popen(command,cwd = SRC,stdout = subprocess.PIPE,
+        stderr = subprocess.PIPE)
+        errors = process.communicate()[1]
+        if (process.returncode != 0):
+            raise AssertionError("%s failed:\n%s" % (' '.join(command),errors))
+        results = []
+        for path in outputs:
+            with open(path) as f:
+                results.append(f.read())
+        return tuple(results)
+
+    # Checks a script (or a list of arguments running the paymo package) with
+    #   the given options against the expected outputs, with and without a
+    #   network snapshot, on the files of data set data (see setUpClass)
+    def check_script(self,script,options,data = 'hubs'):
+        batch, stream, expected = self.data[data]
+        command = (script if isinstance(script,list) else [script]) + [batch,
+        stream]
+        snapshot = os.path.join(self.folder,'network.snapshot')
+        message = ' '.join(command[:-2] + options)
+        self.assertEqual(self.run_engine(command,options),expected,message)
+        self.assertEqual(self.run_engine(command,options + ['--snapshot-out',
+        snapshot]),expected,message)
+        self.assertEqual(self.run_engine(command,options + ['--snapshot-in',
+        snapshot]),expected,message + ' --snapshot-in')
+
+    def test_version_2(self):
+        for options in ([],['--compact'],['--pipelined'],['--processes','2'],
+        ['--clean'],['--compact','--pipelined']):
+            self.check_script('antifraud_2.py',options)
+        self.check_script('antifraud_2.py',['--compact'],'sparse')
+
+    def test_two_hop_cache(self):
+        for data in ('hubs','sparse'):
+            self.check_script('antifraud_2.py',['--two-hop-cache','1000000'],
+            data)
+            self.check_script('antifraud_2.py',['--two-hop-cache','200000'],
+            data)                                                               # Small enough that entries are evicted
+
+    def test_version_1(self):
+        self.check_script('antifraud_1.py',[],data = 'no_self')
+
+    def test_version_1_5(self):
+        self.check_script('antifraud_1.5.py',[],data = 'no_self')
+        self.check_script('antifraud_1.5.py',['--hub-threshold','3'],
+        data = 'no_self')
+
+    # antifraud_2.extras.py has no expected outputs, but output.txt and the
+    #   suspects file must be the same with a snapshot, with checkpoints and
+    #   when resumed from a checkpoint after a crash (rewards.csv records the
+    #   times rewards were paid, so it differs)
+    def test_extras(self):
+        batch, stream = self.data['hubs'][:2]
+        snapshot = os.path.join(self.folder,'extras.snapshot')
+        checkpoint = os.path.join(self.folder,'extras.checkpoint')
+        script = ['antifraud_2.extras.py',batch,stream]
+        expected = self.run_engine(script,['--snapshot-out',snapshot])
+        self.assertTrue(expected[0])
+        for options in (['--snapshot-in',snapshot],['--checkpoint',checkpoint,
+        '--checkpoint-every','100']):
+            outputs = self.run_engine(script,options)
+            self.assertEqual((outputs[0],outputs[2]),(expected[0],
+            expected[2]),' '.join(options))
+
+        # A timestamp that can't be read stops the run partway through. With
+        #   the row fixed, resuming gives the same outputs
+        with open(stream) as f:
+            lines = f.readlines()
+        broken = os.path.join(self.folder,'extras_stream.csv')
+        with open(broken,'w') as f:
+            f.writelines(lines[:300] + ['x' + lines[300][1:]] + lines[301:])
+        self.assertRaises(AssertionError,self.run_engine,
+        ['antifraud_2.extras.py',batch,broken],['--checkpoint',checkpoint,
+        '--checkpoint-every','100'])
+        self.assertTrue(os.path.exists(checkpoint))
+        shutil.copy(stream,broken)
+        for options in ([],['--snapshot-in',snapshot]):
+            shutil.copy(checkpoint,checkpoint + '.saved')
+            outputs = self.run_engine(['antifraud_2.extras.py',batch,broken],
+            ['--checkpoint',checkpoint,'--resume'] + options,keep = True)
+            shutil.move(checkpoint + '.saved',checkpoint)
+            self.assertEqual((outputs[0],outputs[2]),(expected[0],
+            expected[2]),' '.join(['--resume'] + options))
+
+    def test_paymo(self):
+        paymo = ['-m','paymo','score']
+        self.check_script(paymo,['--strategy','v1'],data = 'no_self')
+        self.check_script(paymo,['--strategy','v1.5'],data = 'no_self')
+        self.check_script(paymo,['--strategy','v1.5','--hub-threshold','3'],
+        data = 'no_self')
+        self.check_script(paymo,['--strategy','v2'])
+        self.check_script(paymo,['--strategy','v2','--compact','--clean'])
+
+if (__name__ == '__main__'):
+    unittest.main()
@@ -0,0 +1,453 @@
+### Unit and differential tests ###
+#
+# Checks of the modules in src that the output comparisons of run_tests.sh
+#   don't reach
+#
+#
+# Description:
+#
+# run_tests.sh runs the scripts on the small example in tests and compares
+#   the output files with the expected ones. The alternative data structures,
+#   caches and engines added since are meant to give exactly the same answers
+#   as the plain versions, which a handful of rows can't show. The tests here
+#   run them side by side with the plain versions on random networks and
+#   transaction sequences ('differential' tests), seeded so that any failure
+#   can be repeated.
+#
+# Usage: python insight_testsuite/unit_tests.py [-v] (Python 2, like the
+#   scripts)
+
+
+import os
+import re
+import sys
+import random
+import shutil
+import argparse
+import tempfile
+import unittest
+from array import array
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0,os.path.join(HERE,'..','src'))
+
+import two_hop_cache
+from two_hop_cache import Two_hop_cache
+from graph_query import within_distance, has_common_neighbor
+from friend_bitmap import Friend_bitmap
+from paymo.strategies import STRATEGIES, DEGREE_CODES
+from checkpoint import Stream_lines, Checkpoint_error, save_checkpoint, \
+load_checkpoint
+from filecleaner import Clean_file
+from rule_config import load_rules, Rule_error
+from compact_network import Compact_network
+from message_scanner import Message_scanner
+from network_snapshot import save_snapshot, load_snapshot, Snapshot_error, \
+layer_from_sets, sets_from_layer
+
+
+# Returns a list of n random transactions between customers 0 to size - 1
+def random_pairs(rng,size,n):
+    return [(rng.randrange(size),rng.randrange(size)) for k in xrange(n)]
+
+
+# Adds the friendship between id_1 and id_2 to network dictionary net
+def add_friendship(net,id_1,id_2):
+    net.setdefault(id_1,set()).add(id_2)
+    net.setdefault(id_2,set()).add(id_1)
+
+
+# The checks of the original antifraud_2.py, which everything else is compared
+#   with. Returns 0 if id_1 and id_2 are friends in network dictionary net, 1
+#   if they have a mutual friend, 2 if their first- and second-order friends
+#   overlap and 3 otherwise
+def baseline_degree(net,id_1,id_2):
+    net.setdefault(id_1,set())
+    net.setdefault(id_2,set())
+    if (id_2 in net[id_1]):
+        return 0
+    if (len(net[id_1] & net[id_2]) > 0):
+        return 1
+    second_degree_1 = net[id_1].copy()
+    for friend in net[id_1]:
+        second_degree_1 |= net[friend]
+    second_degree_2 = net[id_2].copy()
+    for friend in net[id_2]:
+        second_degree_2 |= net[friend]
+    if (len(second_degree_1 & second_degree_2) > 0):
+        return 2
+    return 3
+
+
+# Returns a list of n random transactions on a network where a few customers
+#   (the first hubs ids) take part in a large share of the transactions
+def hub_pairs(rng,size,n,hubs = 3,hub_share = 0.3):
+    pairs = []
+    for k in xrange(n):
+        id_1 = rng.randrange(hubs,size)
+        id_2 = rng.randrange(hubs,size)
+        if (rng.random() < hub_share):
+            id_1 = rng.randrange(hubs)
+        pairs.append((id_1,id_2) if rng.random() < 0.5 else (id_2,id_1))
+    return pairs
+
+
+class Two_hop_cache_test(unittest.TestCase):
+
+    # Runs the same checks and additions with and without a cache, returning
+    #   the number of checks where they disagree
+    def compare(self,seed,size,rows,budget):
+        rng = random.Random(seed)
+        net = {}
+        cache = Two_hop_cache(budget)
+        cached_within = cache.searching(within_distance)
+        cached_add = cache.updating(add_friendship)
+        mismatches = 0
+        for id_1, id_2 in random_pairs(rng,size,rows):
+            net.setdefault(id_1,set())
+            net.setdefault(id_2,set())
+            if (cached_within(net,id_1,id_2,4) !=
+            within_distance(net,id_1,id_2,4)):
+                mismatches += 1
+            cached_add(net,id_1,id_2)
+        return mismatches
+
+    def test_matches_search(self):
+        for seed in xrange(200):
+            self.assertEqual(self.compare(seed,60,300,1 << 20),0,
+            "seed %d" % seed)
+
+    def test_matches_search_small_sets(self):
+        saved = two_hop_cache.MAX_SIZE
+        two_hop_cache.MAX_SIZE = 12                                             # Forces sets to be dropped as they grow
+        try:
+            for seed in xrange(200):
+                self.assertEqual(self.compare(seed,40,200,1 << 20),0,
+                "seed %d" % seed)
+        finally:
+            two_hop_cache.MAX_SIZE = saved
+
+    def test_matches_search_small_budget(self):
+        for seed in xrange(50):
+            self.assertEqual(self.compare(seed,60,300,4096),0,"seed %d" % seed)
+
+
+class Compact_network_test(unittest.TestCase):
+
+    # Checks that Compact_network answers like the dictionary of sets it
+    #   replaces, as friendships are added to its delta and compacted
+    def test_matches_sets(self):
+        for seed in xrange(100):
+            rng = random.Random(seed)
+            net = {}
+            batch = random_pairs(rng,50,60)
+            for id_1, id_2 in batch:
+                add_friendship(net,id_1,id_2)
+            compact = Compact_network([pair[0] for pair in batch],
+            [pair[1] for pair in batch],delta_limit = 8)
+            for id_1, id_2 in random_pairs(rng,60,200):
+                net.setdefault(id_1,set())
+                net.setdefault(id_2,set())
+                self.assertEqual(compact.are_friends(id_1,id_2),
+                id_2 in net[id_1])
+                self.assertEqual(compact.have_mutual_friend(id_1,id_2),
+                has_common_neighbor(net[id_1],net[id_2]),"seed %d" % seed)
+                self.assertEqual(compact.within_degree(id_1,id_2,4),
+                within_distance(net,id_1,id_2,4),"seed %d" % seed)
+                add_friendship(net,id_1,id_2)
+                compact.add_friendship(id_1,id_2)
+
+    def test_large_ids(self):
+        big = (1 << 40) + 7
+        compact = Compact_network([big,1],[2,big])
+        compact.add_friendship(big + 1,2)
+        self.assertTrue(compact.have_mutual_friend(1,2))
+        self.assertTrue(compact.within_degree(1,big + 1,4))
+        self.assertEqual(compact.ids[0],big)
+
+
+class Message_scanner_test(unittest.TestCase):
+
+    # Checks that the scanner finds the same patterns as searching for each
+    #   one separately
+    def assert_same_hits(self,patterns,messages):
+        scanner = Message_scanner(patterns)
+        for message in messages:
+            self.assertEqual(list(scanner.hits(message)),[pattern for pattern
+            in patterns if re.search(pattern,message)],message)
+
+    def test_plain_patterns(self):
+        self.assert_same_hits(['drugs?','gun','c[o0]ke'],['Pizza','2 drug',
+        'GUN','c0ke and gun',''])
+
+    def test_inline_flags(self):
+        self.assert_same_hits(['(?x) w e e d','(?i)heroin','meth'],['weed',
+        'HEROIN','w e e d','meth','nothing'])
+        self.assert_same_hits(['bad word','(?x)mon ey'],['bad word',
+        'badword','money'])                                                     # (?x) would make the combined alternation ignore the space in 'bad word'
+        self.assert_same_hits(['(?i)heroin'],['Heroin','pizza'])
+
+    def test_back_references(self):
+        self.assert_same_hits(['(x)y','(a)\\1','(?P<b>c)(?P=b)'],['aa','cc',
+        'xy','ax'])
+
+    # A pattern listed twice is one bad word, as in the original set of them
+    def test_duplicates(self):
+        scanner = Message_scanner(['gun','(?i)weed','gun','drugs','(?i)weed'])
+        self.assertEqual(scanner.patterns,['gun','(?i)weed','drugs'])
+        self.assertEqual(list(scanner.hits('gun, WEED and drugs')),['gun',
+        '(?i)weed','drugs'])
+
+
+class Network_snapshot_test(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.batch = os.path.join(self.folder,'batch.csv')
+        with open(self.batch,'w') as f:
+            f.write('time, id1, id2, amount, message\n')
+        self.path = os.path.join(self.folder,'network.snapshot')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_round_trip(self):
+        ids = array('l',[5,(1 << 40),7])
+        friends = [set([1 << 40]),set([5,7]),set([1 << 40])]
+        save_snapshot(self.path,'v2',self.batch,ids,[layer_from_sets(ids,
+        friends)])
+        loaded_ids, layers = load_snapshot(self.path,'v2',self.batch)
+        self.assertEqual(list(loaded_ids),list(ids))
+        self.assertEqual(list(sets_from_layer(loaded_ids,*layers[0])),friends)
+        self.assertRaises(Snapshot_error,load_snapshot,self.path,'v1',
+        self.batch)
+
+    def test_bad_files(self):
+        self.assertRaises(Snapshot_error,load_snapshot,self.path,'v2',
+        self.batch)                                                             # Missing
+        open(self.path,'w').close()
+        self.assertRaises(Snapshot_error,load_snapshot,self.path,'v2',
+        self.batch)                                                             # Empty
+        ids = array('l',[1,2])
+        save_snapshot(self.path,'v2',self.batch,ids,[layer_from_sets(ids,
+        [set([2]),set([1])])])
+        with open(self.path,'rb') as f:
+            data = f.read()
+        for size in (10,60,len(data) - 4):
+            with open(self.path,'wb') as f:
+                f.write(data[:size])
+            self.assertRaises(Snapshot_error,load_snapshot,self.path,'v2',
+            self.batch)                                                         # Truncated
+
+
+class Graph_query_test(unittest.TestCase):
+
+    # Checks within_distance and has_common_neighbor against the original
+    #   checks, including the pairwise intersection shortcut (made more likely
+    #   by the hubs) and friends sets stored as Friend_bitmaps
+    def test_matches_baseline(self):
+        for seed in xrange(100):
+            rng = random.Random(seed)
+            net = {}
+            for id_1, id_2 in hub_pairs(rng,80,300):
+                expected = baseline_degree(net,id_1,id_2)
+                self.assertEqual(within_distance(net,id_1,id_2,4),
+                expected <= 2,"seed %d" % seed)
+                self.assertEqual(has_common_neighbor(net[id_1],net[id_2]),
+                len(net[id_1] & net[id_2]) > 0)
+                add_friendship(net,id_1,id_2)
+            bitmaps = dict((id, Friend_bitmap(friends) if len(friends) > 10
+            else friends) for id, friends in net.iteritems())
+            for id_1, id_2 in random_pairs(rng,80,100):
+                if (id_1 in net and id_2 in net):
+                    self.assertEqual(within_distance(bitmaps,id_1,id_2,4),
+                    baseline_degree(net,id_1,id_2) <= 2,"seed %d" % seed)
+
+    def test_trace(self):
+        net = {}
+        for id_1, id_2 in ((1,2),(2,3),(3,4)):
+            add_friendship(net,id_1,id_2)
+        trace = []
+        self.assertTrue(within_distance(net,1,4,4,trace))
+        self.assertTrue(trace)
+        self.assertFalse(within_distance(net,1,4,2))
+
+    def test_exclude(self):
+        self.assertFalse(has_common_neighbor(set([1,2]),set([2,3]),set([2])))
+        self.assertTrue(has_common_neighbor(set([1,2,3]),set([2,3]),set([2])))
+
+
+class Friend_bitmap_test(unittest.TestCase):
+
+    def test_matches_sets(self):
+        rng = random.Random(1)
+        for size in (0,5,3000,12000):                                           # Up to 12000 ids in 2 chunks gives bitmap containers
+            ids = set(rng.sample(xrange(2 << 16),size))
+            others = set(rng.sample(xrange(3 << 16),5000))
+            bitmap = Friend_bitmap(ids)
+            other_bitmap = Friend_bitmap(others)
+            self.assertEqual(len(bitmap),len(ids))
+            self.assertEqual(set(bitmap),ids)
+            for id in rng.sample(xrange(3 << 16),200):
+                self.assertEqual(id in bitmap,id in ids)
+            for other in (others,other_bitmap):
+                self.assertEqual(set(bitmap & other),ids & others)
+                self.assertEqual(set(other & bitmap),ids & others)
+                self.assertEqual(set(bitmap | other),ids | others)
+                self.assertEqual(bitmap.intersects(other),bool(ids & others))
+            self.assertFalse(bitmap.intersects(set([5 << 16])))
+            added = set(rng.sample(xrange(4 << 16),3000))
+            bitmap.update(added)
+            bitmap.add(7)
+            self.assertEqual(set(bitmap),ids | added | set([7]))
+            self.assertEqual(len(bitmap),len(ids | added | set([7])))
+
+
+class Strategy_test(unittest.TestCase):
+
+    # Checks a strategy's result codes against the original checks. Pairs of
+    #   someone paying themselves are left out unless self_payments is set,
+    #   since versions 1 and 1.5 treat them differently (see strategies.py)
+    def compare(self,name,seeds,self_payments = False,**options):
+        settings = {'compact': False,'hub_threshold': 100}
+        settings.update(options)
+        for seed in seeds:
+            rng = random.Random(seed)
+            pairs = [(id_1, id_2) for id_1, id_2 in hub_pairs(rng,70,400) if
+            self_payments or id_1 != id_2]
+            batch = pairs[:150]
+            net = {}
+            for id_1, id_2 in batch:
+                add_friendship(net,id_1,id_2)
+            strategy = STRATEGIES[name](argparse.Namespace(**settings))
+            strategy.build(array('l',[pair[0] for pair in batch]),
+            array('l',[pair[1] for pair in batch]))
+            for id_1, id_2 in pairs[150:]:
+                self.assertEqual(strategy.check(id_1,id_2),
+                DEGREE_CODES[baseline_degree(net,id_1,id_2)],
+                "%s, seed %d, %d and %d" % (name,seed,id_1,id_2))
+                strategy.add(id_1,id_2)
+                add_friendship(net,id_1,id_2)
+
+    def test_reach_bitmaps(self):
+        self.compare('v1',xrange(30))
+
+    def test_two_hop_index(self):
+        self.compare('v1.5',xrange(30))
+        self.compare('v1.5',xrange(30),hub_threshold = 4)                       # Most checks go through hubs
+
+    def test_search(self):
+        self.compare('v2',xrange(50),self_payments = True)
+        self.compare('v2',xrange(50),self_payments = True,compact = True)
+
+    def test_base_class(self):
+        self.assertRaises(TypeError,STRATEGIES['v2'].__bases__[0],None)
+
+
+class Checkpoint_test(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder,'checkpoint')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_round_trip(self):
+        arrays = [('ids',array('l',[1,1 << 40,3])),('flags',array('B',[1,0])),
+        ('empty',array('i'))]
+        save_checkpoint(self.path,{'row_number': 7,'name': 'x'},arrays)
+        meta, loaded = load_checkpoint(self.path)
+        self.assertEqual(meta,{'row_number': 7,'name': 'x'})
+        self.assertEqual(loaded,dict(arrays))
+
+    def test_bad_files(self):
+        open(self.path,'w').close()
+        self.assertRaises(Checkpoint_error,load_checkpoint,self.path)
+        save_checkpoint(self.path,{},[('ids',array('l',range(100)))])
+        with open(self.path,'rb') as f:
+            data = f.read()
+        with open(self.path,'wb') as f:
+            f.write(data[:-8])
+        self.assertRaises(Checkpoint_error,load_checkpoint,self.path)
+
+
+class Stream_lines_test(unittest.TestCase):
+
+    TEXT = 'time, id1, id2\r\na, 1, 2\rb, 3, 4\nc, 5, 6\r\n\r\nd, 7, 8\re\r'
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder,'stream.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def check_file(self,text):
+        with open(self.path,'wb') as f:
+            f.write(text)
+        with open(self.path,'rU') as f:
+            expected = f.readlines()
+        with Clean_file(self.path) as f:
+            expected_clean = list(f)
+        for chunk_size in (1,2,3,5,8,1 << 20):
+            for clean, wanted in ((False,expected),(True,expected_clean)):
+                lines = Stream_lines(self.path,clean = clean,chunk_size =
+                chunk_size)
+                self.assertEqual(list(lines),wanted,(clean,chunk_size))
+                self.assertEqual(lines.offset,len(text))
+                lines.close()
+
+            # Reading from where the first two lines ended gives the rest
+            if (len(expected) < 2):
+                continue
+            lines = Stream_lines(self.path,chunk_size = chunk_size)
+            iterator = iter(lines)
+            next(iterator)
+            next(iterator)
+            rest = Stream_lines(self.path,start = lines.offset,chunk_size =
+            chunk_size)
+            self.assertEqual(list(rest),expected[2:],chunk_size)
+            lines.close()
+            rest.close()
+
+    def test_matches_file_objects(self):
+        self.check_file(self.TEXT)
+        self.check_file(self.TEXT + '\n')
+        self.check_file('header\nno newline at the end')
+        self.check_file('')
+
+
+class Rule_config_test(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder,'rules.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write_rules(self,text):
+        with open(self.path,'w') as f:
+            f.write(text)
+
+    def test_list_files(self):
+        with open(os.path.join(self.folder,'verified.txt'),'w') as f:
+            f.write('# Verified merchants\n5\n\n3000000000\n')
+        self.write_rules('{"verified": "verified.txt"}')
+        rules = load_rules(self.path)
+        self.assertEqual(list(rules.verified),[5,3000000000])
+        self.assertTrue(3000000000 in rules.verified)
+        self.assertFalse(4 in rules.verified)
+        self.assertEqual(list(rules.suspects),sorted(load_rules().suspects))
+
+    def test_bad_files(self):
+        for text in ('{"verified": 5}','{"bad_words": ["a.txt"]}',
+        '{"verified": null}','{"unknown": "x.txt"}','["verified.txt"]',
+        '{"verified": "missing.txt"}','not JSON'):
+            self.write_rules(text)
+            self.assertRaises(Rule_error,load_rules,self.path)
+
+
+if (__name__ == '__main__'):
+    unittest.main()
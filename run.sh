@@ -12,8 +12,11 @@
 
 
 # File cleaning script. Overwrites batch_payment_2.csv with a cleaned version of
-#   batch_payment.csv (can be used with stream_payment as well)
-# Requires modules: sys
+#   batch_payment.csv (can be used with stream_payment as well). Works a chunk
+#   at a time (--chunk-size BYTES, or --mmap to map the file into memory). The
+#   antifraud codes below never need it (antifraud_2.extras.py accepts --clean,
+#   which cleans the stream file as it is read instead).
+# Requires modules: os, sys, mmap, argparse
 
 #python ./src/filecleaner.py ./paymo_input/batch_payment.csv ./paymo_input/batch_payment_2.csv
 
@@ -21,15 +24,67 @@
 # Fraud Detection System versions 1, 1.5 and 2. Be sure to specify version
 #   number of first arguement. With inputs batch_payment.csv and
 #   stream_payment.csv, writes outputs output1.txt, output2.txt and output3.txt.
-#   Output files are replaced.
-# Requires modules: sys, csv
+#   Output files are replaced. All three read the batch file with N processes
+#   with --processes N. antifraud_2.py also accepts --compact, which stores the
+#   network in flat integer arrays to save memory. With --serve ADDRESS,
+#   antifraud_2.py needs only the batch file and keeps running, answering
+#   transactions sent to ADDRESS (see scoring_server.py). --two-hop-cache
+#   BYTES keeps up to BYTES bytes of customers' second-order friends to speed
+#   up repeat checks (see two_hop_cache.py). antifraud_1.5.py accepts
+#   --hub-threshold N, the number of friends above which an account's friends
+#   aren't indexed as each other's mutual friends. All versions
+#   (including extras) accept --snapshot-out FILE, to save the network built
+#   from the batch file, and --snapshot-in FILE, to load it back next time
+#   instead of reading the batch file.
+# Requires modules: sys, atexit, argparse, array, itertools, threading
 
 #python ./src/antifraud_2.py ./paymo_input/batch_payment.csv ./paymo_input/stream_payment.csv ./paymo_output/output1.txt ./paymo_output/output2.txt ./paymo_output/output3.txt
 
 
+# The same versions through a single entry point (see the paymo package in
+#   README), choosing the version with --strategy v1, v1.5 or v2 (the
+#   default). Outputs are the same as the scripts', and it accepts the same
+#   --snapshot-out, --snapshot-in and --clean options.
+# Requires modules: sys, argparse, array, itertools, threading
+
+#(cd ./src && python -m paymo score ../paymo_input/batch_payment.csv ../paymo_input/stream_payment.csv ../paymo_output/output1.txt ../paymo_output/output2.txt ../paymo_output/output3.txt --strategy v2)
+
+
 # Fraud Detection System version 2 with extra features. With inputs
 #   batch_payment.csv and stream_payment.csv, writes outputs output.txt,
-#   rewards.csv and suspects.txt. Output files are replaced.
-# Requires modules: sys, csv, datetime, re
+#   rewards.csv and suspects.txt. Output files are replaced. With --profile,
+#   prints the time spent in each phase of the stream loop and how far the
+#   degree checks went to stderr, every --profile-every SECONDS seconds (60 by
+#   default) and at exit (see phase_profile.py). With --watch-words FILE, reads
+#   Extra 7's bad words from FILE, one regular expression per line, reloading
+#   it whenever it changes (see message_scanner.py). With --payouts FILE, also
+#   sends the rewards to a stand-in payout service, which writes them to FILE
+#   as lines of JSON (see reward_queue.py). With --rules FILE, reads the lists
+#   of verified accounts, suspected scammers, suspicious cent amounts and bad
+#   words from the files named in FILE (JSON), reloading them when the process
+#   is sent SIGHUP (see rule_config.py). With --checkpoint FILE, saves the
+#   state to FILE every --checkpoint-every ROWS rows of the stream file
+#   (100000 by default); after a crash, running again with --resume as well
+#   carries on from the last checkpoint (see checkpoint.py).
+# Requires modules: os, sys, csv, json, datetime, re, argparse, array, itertools, time, atexit, collections, signal, bisect, struct
 
 #python ./src/antifraud_2.extras.py ./paymo_input/batch_payment_2.csv ./paymo_input/stream_payment_2.csv ./paymo_output/output.txt ./paymo_output/rewards.csv ./paymo_output/suspects.txt
+
+
+# Offline rescoring of version 2 with extras. Writes the output.txt that
+#   antifraud_2.extras.py would with other values of its thresholds and
+#   weights, given with --set NAME=VALUE (see 'python ./src/rescore.py
+#   --help'). --features-out FILE saves what was read from the input files,
+#   and --features-in FILE loads it instead of reading them again.
+# Requires modules: sys, csv, json, zlib, datetime, argparse, array, itertools, collections, re, binascii, bisect, os, hashlib, mmap, ctypes, struct, multiprocessing, signal
+
+#python ./src/rescore.py ./paymo_input/batch_payment_2.csv ./paymo_input/stream_payment_2.csv ./paymo_output/rescored.txt --set take_per_day=8
+
+
+# Parameter sweep of version 2 with extras. Scores every combination of the
+#   --vary NAME=[V1,V2,...] values (or the sets listed in --configs FILE) in
+#   parallel worker processes, writing a csv table of how many transactions
+#   each set flags (see 'python ./src/sweep.py --help').
+# Requires modules: the same as rescore.py
+
+#python ./src/sweep.py ./paymo_input/batch_payment_2.csv ./paymo_input/stream_payment_2.csv ./paymo_output/sweep.csv --vary 'take_per_day=[6,8,10,12]' --vary 'burst_seconds=[5,10,20]'
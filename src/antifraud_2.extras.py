@@ -16,22 +16,21 @@
 #
 # Basic outline:
 #
-# The code creates a dictionary 'network' containing an entry for each unique
-#   costumer id. The value attached this entry is a User_account object
-#   containing their friends set and a wealth of other information about their
-#   PayMo transaction history.
+# The code creates a User_accounts table 'accounts' with an entry for each
+#   unique costumer id, holding their friends set and a wealth of other
+#   information about their PayMo transaction history. Each costumer is given a
+#   dense index, and each piece of information is kept in its own array.
 #
 # While reading the batch file, with each transaction both participants are
 #   simply added to each other's friends sets.
 #
 # While reading the stream file, with each new transaction the code checks
-#   whether the participants are already friends, then checks if the
-#   intersection of their friend sets is non-empty (i.e. they have a mutual
-#   friend, i.e. they are second-order friends), and if that fails finally
-#   constructs sets of the union of each participant's first- and second-order
-#   friends and sees if there is any overlap (which would make them third- or
-#   fourth-order friends). This sets the basline untrustworthiness of the
-#   transaction. A variety of new fraud detection methods (explained in the
+#   whether the participants are already friends, then checks if their
+#   friends sets have an id in common (i.e. they have a mutual friend, i.e.
+#   they are second-order friends), and if that fails finally searches
+#   outwards from both participants (see graph_query.py) to see if they are
+#   third- or fourth-order friends. This sets the basline untrustworthiness of
+#   the transaction. A variety of new fraud detection methods (explained in the
 #   code) are then employed, which further refine the untrustworthiness of the
 #   transaction and flag User_accounts for suspicious behaviors. The final
 #   untrustworthiness of the transaction is outputted, friends lists are updated
@@ -63,54 +62,192 @@
 #   specified by the receiver also makes fraud far more likely.
 
 
+import os
 import sys
 import csv
-import datetime
 import re
+import argparse
+from array import array
+from itertools import izip
 
-# Class containing client information. Can be considered a client's 'account'
-class User_account:
-    
-    def __init__(self):
-        self.friends = set()                                                    # List of client's previous transaction partners
-        self.fraud_score = 0                                                    # Measure of how much this client is suspected of fraud/scamming, used in multiple Extras
-        self.five_transactions_ago = datetime.datetime(1,1,1,1,0,0)             # The timestamp of the fifth-previous transaction, for Extra 1b
-        self.four_transactions_ago = datetime.datetime(1,1,1,1,0,0)             # The timestamp of the fourth-previous transaction, for Extra 1b
-        self.three_transactions_ago = datetime.datetime(1,1,1,1,0,0)            # The timestamp of the third-previous transaction, for Extra 1b
-        self.two_transactions_ago = datetime.datetime(1,1,1,1,0,0)              # The timestamp of the second-previous transaction, for Extra 1b
-        self.last_transaction = datetime.datetime(1,1,1,1,0,0)                  # The timestamp of the previous transaction, for Extra 1b
-        self.big_transactions_count = 0                                         # The number of large transactions the account has been part of, for Extra 3
-        self.transactions_take_count_today = 0                                  # The number of transaction requests the accound has sent (i.e. requests to be paid) today (NOTE: count only resets on new transaction), for Extra 1a.1
-        self.transactions_give_count_today = 0                                  # The number of transaction requests the accound has recieved (i.e. requests for them to pay) today (NOTE: count only resets on new transaction), for Extra 1a.2
-        self.crime_flags = 0                                                    # The number of transactions where this user has been flagged for possible illegal activity (Extra 7)
-        self.suspected_scammer = 0                                              # Whether or not an account has been manually flagged as a scammer, for Extra 4
-        self.verified = 0                                                       # Whether or not an account has been verified, for Extra 0
-        self.clean_transactions_count = 0                                       # The number of 'clean' transactions the account has participated in sequentially, for Extra 2
-        self.last_requested_amount = '0.00'                                     # The last amount this client requested, for Extra 8
-        self.request_targets = set()                                            # The targets of repeated requests, for Extra 8
+from id_reader import read_ids
+from extras_params import read_row, DEGREE_UNTRUST, TAKE_PER_DAY, \
+GIVE_PER_DAY, GIVE_EVERY, BURST_EVENTS, BURST_SECONDS, CLEAN_RUN, BIG_DOLLARS, \
+BIG_TRANSACTIONS, SCAMMER_UNTRUST, CENTS_UNTRUST, EMPTY_UNTRUST, \
+REPEAT_TARGETS, REPEAT_PENALTY
+from filecleaner import Clean_file
+from graph_query import has_common_neighbor, within_distance
+from phase_profile import Phase_profile
+from rate_windows import Rate_windows, Timestamp_parser
+from message_scanner import Watch_list
+from reward_queue import Reward_queue, Payout_log
+from rule_config import Rule_reloader, Rule_error, Rules, Id_list, \
+rules_fingerprint
+from checkpoint import Stream_lines, Checkpoint_error, save_checkpoint, \
+load_checkpoint, sync_output, open_output
+from network_snapshot import save_snapshot, load_snapshot, Snapshot_error, \
+layer_from_sets, sets_from_layer, batch_fingerprint
+
+# Extra 1's rates, kept for every account in shared arrays (see rate_windows.py)
+account_rates = Rate_windows()
+take_today = account_rates.add_daily_count()                                    # The number of transaction requests the account has sent (i.e. requests to be paid) today (NOTE: count only resets on new transaction), for Extra 1a.1
+give_today = account_rates.add_daily_count()                                    # The number of transaction requests the account has recieved (i.e. requests for them to pay) today (NOTE: count only resets on new transaction), for Extra 1a.2
+bursts = account_rates.add_window(BURST_EVENTS,BURST_SECONDS)                   # BURST_EVENTS transactions within BURST_SECONDS seconds, for Extra 1b
+
+NO_FRIENDS = frozenset()                                                        # The friends set of every client without friends, shared until they make one
+
+# Class containing the information of every client, i.e. their 'accounts'.
+#   Rather than an object per client, each piece of information is a column:
+#   an array (or list) with one entry per client, indexed by a dense index
+#   (0, 1, 2, ...) given to each client when they first appear. This saves a
+#   Python object, an attribute dictionary and two sets per client, about a
+#   kilobyte and a half, which adds up on networks of millions of clients.
+#   Sets are only created once something is added to them. Indexing the table
+#   with a client id gives their friends set, so it can be searched by
+#   within_distance (see graph_query.py)
+class User_accounts:
+
+    def __init__(self,rules):
+        self.rules = rules                                                      # The lists of verified accounts and suspected scammers, checked when an account is created (see rule_config.py)
+        self.index = {}                                                         # Client id: dense index
+        self.ids = array('l')                                                   # Dense index: client id
+        self.friends = []                                                       # Client's previous transaction partners (NO_FRIENDS until they have one)
+        self.fraud_score = array('i')                                           # Measure of how much this client is suspected of fraud/scamming, used in multiple Extras
+        self.big_transactions_count = array('i')                                # The number of large transactions the account has been part of, for Extra 3
+        self.crime_flags = array('i')                                           # The number of transactions where this user has been flagged for possible illegal activity (Extra 7)
+        self.suspected_scammer = array('B')                                     # Whether or not an account has been manually flagged as a scammer, for Extra 4
+        self.verified = array('B')                                              # Whether or not an account has been verified, for Extra 0
+        self.clean_transactions_count = array('B')                              # The number of 'clean' transactions the account has participated in sequentially, for Extra 2
+        self.last_requested_amount = []                                         # The last amount this client requested, for Extra 8
+        self.request_targets = {}                                               # Dense index: the targets of repeated requests, for Extra 8 (only for clients who have made requests)
+        self.slot = array('i')                                                  # The account's slot in the shared arrays of account_rates, for Extra 1 (-1 until they transact in the stream file)
+        self.added = None                                                       # The friendships added since start_recording, as pairs of dense indices (for checkpoints)
+
+    # Returns the dense index of client id, creating their account if they are
+    #   new
+    def add(self,id):
+        i = self.index.get(id)
+        if (i is None):
+            i = self.index[id] = len(self.ids)
+            self.ids.append(id)
+            self.friends.append(NO_FRIENDS)
+            self.fraud_score.append(0)
+            self.big_transactions_count.append(0)
+            self.crime_flags.append(0)
+            self.suspected_scammer.append(id in self.rules.suspects)
+            self.verified.append(id in self.rules.verified)
+            self.clean_transactions_count.append(0)
+            self.last_requested_amount.append('0.00')
+            self.slot.append(-1)
+        return i
+
+    # Replaces the lists of verified accounts and suspected scammers, updating
+    #   every account's entry. The columns are updated in place, so references
+    #   to them stay valid
+    def set_rules(self,rules):
+        self.rules = rules
+        index = self.index
+        for column, ids in ((self.verified,rules.verified),
+        (self.suspected_scammer,rules.suspects)):
+            column[:] = array('B',[0]) * len(column)
+            for id in ids:
+                i = index.get(id)
+                if (i is not None):
+                    column[i] = 1
+
+    # Returns the friends set of client id
+    def __getitem__(self,id):
+        return self.friends[self.index[id]]
+
+    # Adds each of the clients with indices i_1 and i_2 to the other's friends
+    #   set
+    def add_friendship(self,i_1,i_2):
+        friends = self.friends
+        if (friends[i_1] is NO_FRIENDS):
+            friends[i_1] = set()
+        if (friends[i_2] is NO_FRIENDS):
+            friends[i_2] = set()
+        friends[i_1].add(self.ids[i_2])
+        friends[i_2].add(self.ids[i_1])
+        if (self.added is not None):
+            self.added.extend((i_1,i_2))
+
+    # Starts recording the friendships added from now on, which are saved in
+    #   checkpoints (the batch file's friendships aren't, see checkpoint.py)
+    def start_recording(self):
+        self.added = array('i')
+
+    # Returns the (name, array) pairs saved in checkpoints: every column except
+    #   the friends sets, and the friendships added since start_recording
+    def checkpoint_arrays(self):
+        target_keys = array('i',self.request_targets.iterkeys())
+        target_sizes = array('i',[len(self.request_targets[i]) for i in
+        target_keys])
+        target_members = array('l')
+        for i in target_keys:
+            target_members.extend(self.request_targets[i])
+        return [('ids',self.ids),('fraud_score',self.fraud_score),
+        ('big_transactions_count',self.big_transactions_count),
+        ('crime_flags',self.crime_flags),
+        ('suspected_scammer',self.suspected_scammer),
+        ('verified',self.verified),
+        ('clean_transactions_count',self.clean_transactions_count),
+        ('slot',self.slot),
+        ('last_requested_amount',array('c',
+        '\n'.join(self.last_requested_amount))),
+        ('target_keys',target_keys),('target_sizes',target_sizes),
+        ('target_members',target_members),('added',self.added)]
+
+    # Restores the arrays saved by checkpoint_arrays. The table must hold just
+    #   the batch_accounts accounts created while reading the batch file, in
+    #   the same order as when the checkpoint was saved (raises
+    #   Checkpoint_error if not). The recorded friendships are added again
+    def restore_checkpoint(self,arrays,batch_accounts):
+        ids = arrays['ids']
+        if (len(self.ids) != batch_accounts or
+        self.ids != ids[:batch_accounts]):
+            raise Checkpoint_error("the batch file gives different accounts " +
+            "than when the checkpoint was saved")
+        self.index.update(izip(ids[batch_accounts:],xrange(batch_accounts,
+        len(ids))))
+        self.ids = ids
+        self.friends.extend([NO_FRIENDS] * (len(ids) - batch_accounts))
+        for name in ('fraud_score','big_transactions_count','crime_flags',
+        'suspected_scammer','verified','clean_transactions_count','slot'):
+            setattr(self,name,arrays[name])
+        self.last_requested_amount = \
+        arrays['last_requested_amount'].tostring().split('\n') if ids else []
+        members = iter(arrays['target_members'])
+        for i, size in izip(arrays['target_keys'],arrays['target_sizes']):
+            self.request_targets[i] = set(next(members) for k in xrange(size))
+        self.start_recording()
+        added = arrays['added']
+        for k in xrange(0,len(added),2):
+            self.add_friendship(added[k],added[k + 1])
     
     # Extra 1: A variety of fraud detection algorithms based on the timing and
     #   frequency of payment requests.
-    def tick(self,current,give_take):                                           # give_take = 1 for the person giving money, 0 for person receiving
-        c_time = datetime.datetime.strptime(current, "%Y-%m-%d %H:%M:%S")
+    def tick(self,i,c_time,give_take):                                          # i is the client's dense index, c_time the transaction's time in seconds (see Timestamp_parser). give_take = 1 for the person giving money, 0 for person receiving
+        
+        slot = self.slot[i]
+        if (slot < 0):
+            slot = self.slot[i] = account_rates.add_slot()
         
         # If it's been a day since last transaction, reset daily counters
-        if ((c_time - self.last_transaction).days > 1):
-            self.transactions_give_count_today = 0
-            self.transactions_take_count_today = 0
+        account_rates.start_event(slot,c_time)
         
         # Increment appropriate daily counter
         if (give_take):
-            self.transactions_give_count_today += 1
+            give_count = give_today.increment(slot)
         else:
-            self.transactions_take_count_today += 1
+            take_count = take_today.increment(slot)
 
         # Extra 1a.1: We have found that customers who send more than 10
         #   payment requests in a day are frequently scammer accounts. This
         #   implementation increments the id's fraud score for the 11th payment
         #   request each day, and every payment request thereafter
-        if (self.transactions_take_count_today > 10 and not give_take):
-            self.fraud_score += 1
+        if (not give_take and take_count > TAKE_PER_DAY):
+            self.fraud_score[i] += 1
 
         # Extra 1a.2: We have found that customers who receive more than 50
         #   payment offers in a day are frequently associated with scammers 
@@ -119,331 +256,497 @@ class User_account:
         #   fraud score for the 51st daily recieve transaction and every 3
         #   transactions thereafter (until the next day). NOTE: It might make
         #   more sense to give such "bank" accounts a unique flag.
-        if (self.transactions_give_count_today > 50 and 
-        self.transactions_give_count_today % 3 == 0 and
-        give_take):
-            self.fraud_score += 1
+        if (give_take and give_count > GIVE_PER_DAY and
+        give_count % GIVE_EVERY == 0):
+            self.fraud_score[i] += 1
 
         # Extra 1b: We have found that scammer accounts frequently make many
         #   transactions (both sending and receiving) in short time frames. This
         #   implementation increases fraud score every time six transactions
-        #   are made within 10 seconds of eachother.
-        if ((c_time - self.five_transactions_ago).total_seconds() < 10):
-            self.fraud_score += 1
-        
-        # Ticks time recordings for Extra 1b
-        self.five_transactions_ago = self.four_transactions_ago
-        self.four_transactions_ago = self.three_transactions_ago
-        self.three_transactions_ago = self.two_transactions_ago
-        self.two_transactions_ago = self.last_transaction
-        self.last_transaction = c_time
+        #   are made within 10 seconds of eachother. The window also records
+        #   this transaction's time.
+        if (bursts.record(slot,c_time)):
+            self.fraud_score[i] += 1
         
         
     # Extra 2: Making four transactions in a row which don't trigger any fraud
     #   detection algorithms makes a client account more trustworthy in general,
     #   reducing its fraud score (with a minimum score of 0).
-    def fraud_reducer(self,initial):                                            # This subroutine is called at the end of a transaction. Variable 'initial' is the account's fraud score on entering the transaction
-        if (initial == self.fraud_score):
-            self.clean_transactions_count += 1
-            if (self.clean_transactions_count >= 4):
-                self.clean_transactions_count = 0
-                self.fraud_score = max(self.fraud_score-1,0)
+    def fraud_reducer(self,i,initial):                                          # This subroutine is called at the end of a transaction. Variable 'initial' is the account's fraud score on entering the transaction
+        if (initial == self.fraud_score[i]):
+            self.clean_transactions_count[i] += 1
+            if (self.clean_transactions_count[i] >= CLEAN_RUN):
+                self.clean_transactions_count[i] = 0
+                self.fraud_score[i] = max(self.fraud_score[i]-1,0)
         else:
-            self.clean_transactions_count = 0                                   # A suspicious transaction resets the counter
+            self.clean_transactions_count[i] = 0                                # A suspicious transaction resets the counter
     
     # Extra 3: Marketing has decided to implement a rewards system. After
     #   participating in 20 'large' transactions (either as sender or reciever),
     #   accounts are given a one-time award of 5 dollars. This is implemented by
-    #   writing to a new file, which is read after stream_payments. Note that 
-    #   this program began between the periods covered by the two input files.
-    def account_rewards(self,id,rewards_writer):
-        self.big_transactions_count += 1
-        if (self.big_transactions_count == 20):
-            rewards_writer.writerow([
-            datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),' 0',      # 0 is the id of PayMo itself
-            ' %d' % id,' 5.00',' Thank you for using PayMo! Here is a special' +
-            ' gift for our loyal customers!'])
+    #   putting the payment on a queue (see reward_queue.py), which writes it to
+    #   a new file. Note that this program began between the periods covered by
+    #   the two input files.
+    def account_rewards(self,i,rewards_queue):
+        self.big_transactions_count[i] += 1
+        if (self.big_transactions_count[i] == BIG_TRANSACTIONS):
+            rewards_queue.put(0,self.ids[i],'5.00','Thank you for using ' +     # 0 is the id of PayMo itself
+            'PayMo! Here is a special gift for our loyal customers!')
 
 
 ### Main code ###
 
 ## Input files
+parser = argparse.ArgumentParser(description = "Fraud Detection System, " +
+"version 2 with extras")
+parser.add_argument('batch_in', help = "Batch input payments")
+parser.add_argument('stream_in', help = "Stream input payments")
+parser.add_argument('out_file', help = "Trustworthiness output")
+parser.add_argument('rewards_file', help = "Extra 3 rewards file")
+parser.add_argument('suspects_file', help = "Extra 7 suspects file")
+parser.add_argument('--snapshot-out', metavar = 'FILE', help = "After " +
+"reading the batch file, save the network to FILE (see network_snapshot.py)")
+parser.add_argument('--snapshot-in', metavar = 'FILE', help = "Load the " +
+"network from FILE instead of reading the batch file. batch_in must still " +
+"be the file the snapshot was made from")
+parser.add_argument('--profile', action = 'store_true', help = "Time each " +
+"phase of the stream loop and record how far degree checks go, printing a " +
+"summary to stderr (see phase_profile.py)")
+parser.add_argument('--profile-every', metavar = 'SECONDS', type = float,
+default = 60, help = "With --profile, also print the summary every SECONDS " +
+"seconds (0 for only at exit, default: %(default)s)")
+parser.add_argument('--watch-words', metavar = 'FILE', help = "Read " +
+"Extra 7's bad words from FILE (one regular expression per line), " +
+"reloading it whenever it changes (see message_scanner.py)")
+parser.add_argument('--clean', action = 'store_true', help = "Remove " +
+"'\\r' characters from the stream file while reading it, as filecleaner.py " +
+"does, without writing a cleaned copy")
+parser.add_argument('--rules', metavar = 'FILE', help = "Read the lists " +
+"of verified accounts, suspected scammers, suspicious cent amounts and bad " +
+"words from the files named in FILE (JSON), reloading them when the " +
+"process is sent SIGHUP (see rule_config.py)")
+parser.add_argument('--payouts', metavar = 'FILE', help = "Also send " +
+"Extra 3's rewards to a stand-in payout service, which writes them to FILE " +
+"as lines of JSON (see reward_queue.py)")
+parser.add_argument('--checkpoint', metavar = 'FILE', help = "Save the " +
+"state of the run to FILE every --checkpoint-every rows of the stream file, " +
+"so it can be resumed with --resume (see checkpoint.py). FILE is removed " +
+"when the run completes")
+parser.add_argument('--checkpoint-every', metavar = 'ROWS', type = int,
+default = 100000, help = "Rows between checkpoints (default: %(default)s)")
+parser.add_argument('--resume', action = 'store_true', help = "Carry on " +
+"from the --checkpoint FILE of an earlier run with the same files and " +
+"options, if there is one, producing the same outputs as if it had never " +
+"stopped")
+args = parser.parse_args()
+if (args.resume and not args.checkpoint):
+    parser.error("--resume needs --checkpoint FILE")
+if (args.checkpoint_every < 1):
+    parser.error("--checkpoint-every must be positive")
+
+batch_in = args.batch_in
+stream_in = args.stream_in
+out_file = args.out_file
+rewards_file = args.rewards_file
+suspects_file = args.suspects_file
+snapshot_out = args.snapshot_out
+snapshot_in = args.snapshot_in
+watch_words = args.watch_words
+clean = args.clean
+payouts = args.payouts
+checkpoint_path = args.checkpoint
+
+# The lists of Extras 0, 4, 5 and 7, built in or read from the --rules file
 try:
-    batch_in = sys.argv[1]                                                      # Batch input payments
-    stream_in = sys.argv[2]                                                     # Stream input payments
-    out_file = sys.argv[3]                                                      # Trustworthiness output
-    rewards_file = sys.argv[4]                                                  # Extra 3 rewards file
-    suspects_file = sys.argv[5]                                                 # Extra 7 suspects file
-except:
-    sys.exit("Input failed. Please check command line syntax")
+    rule_reloader = Rule_reloader(args.rules)
+except Rule_error as error:
+    sys.exit(str(error))
+rules = rule_reloader.rules
+
+# Load the checkpoint to resume from, if there is one (see checkpoint.py)
+resumed = None
+if (args.resume):
+    if (os.path.exists(checkpoint_path)):
+        try:
+            resumed, saved = load_checkpoint(checkpoint_path)
+        except (Checkpoint_error,IOError) as error:
+            sys.exit("Can't resume: %s" % error)
+        if (resumed['batch'] != list(batch_fingerprint(batch_in,False)[:2]) or
+        resumed['clean'] != clean):
+            sys.exit("Can't resume: the batch file or --clean has changed " +
+            "since %s was saved" % checkpoint_path)
+    else:
+        sys.stderr.write("No checkpoint in %s, starting from the " %
+        checkpoint_path + "beginning\n")
 
-network = {}                                                                    # The dictionary containing costumer ids and their friends sets
+# The batch file must be read with the verified accounts it was first read with
+if (resumed):
+    batch_rules = Rules(Id_list(saved['batch_verified']),rules.suspects,
+    rules.suspicious_cents,rules.bad_words)
+else:
+    batch_rules = rules
+accounts = User_accounts(batch_rules)                                           # The table of costumer accounts, including their friends sets
+add_account = accounts.add                                                      # Returns a costumer's dense index, creating their account if needed
 
 # Extra 0: We have implemented a program where buisnesses can get their accounts
 #   verified. All requests from verified accounts are assumed to be trustworthy.
 #   However, since thousands or even millions of people might have transactions
 #   with certain buisnesses, it's been decided that connections through verified
-#   accounts don't contribute to 'friendship' chains. I'm hard-coding the list
-#   here, but it could just as easily be imported from a file.
-verified_accounts = set([6101,1023,67385,18768,22467])
-for account in verified_accounts:
-    if (not network.has_key(account)):                                          # With the final placement of this section the if command is superfluous. I'm leaving it in since the time cost is negligible and if things change again it could prevent a nasty (and hard to trace) bug
-        network[account] = User_account()                                           
-    network[account].verified = 1
+#   accounts don't contribute to 'friendship' chains. The list is
+#   rules.verified, and accounts are marked as verified when created.
 
 
 ## Read batch file
-row_number = 1                                                                  # Row numbering starts at 2 (increments at beginning of loop) so that row_number lines up with files, which contain header line
 
-with open(batch_in,'rU') as batch_file:                                         # Opening with 'rU' instead of 'r' circumvents a bug related to newline characters in csv module
-    batch_connections = csv.DictReader(batch_file, skipinitialspace = True,
-    quoting=csv.QUOTE_NONE)
-    for row in batch_connections:                                               
-        # For each row in the batch file:
+# If a snapshot was given, load the network from it instead (see
+#   network_snapshot.py). Only friendships are saved in snapshots, since that
+#   is all that reading the batch file changes
+if (snapshot_in):
+    try:
+        snapshot_ids, snapshot_layers = load_snapshot(snapshot_in,'v2.extras',
+        batch_in)
+    except Snapshot_error as error:
+        sys.exit(str(error))
+    for id, friends in izip(snapshot_ids,
+    sets_from_layer(snapshot_ids,*snapshot_layers[0])):
+        accounts.friends[add_account(id)] = friends
 
-        row_number += 1
-        
-        # See if the id1 and id2 elements of the csv file are integers and
-        #   create simple references
-        try:                                                                    
-            id_1 = int(row['id1'])
-            id_2 = int(row['id2'])
-        except:
-            # Send error message and skip rows that do not contain integer ids
-            print "(In batch_payments) id field does not contain an integer! "+\
-            "Ignoring this entry... row number is:\n", row_number               # Outputs the string for debugging
-            continue
-        
-        # If a dictionary entry does not yet exist for one of the participants,
-        #   create it and initialize its value as an empty set
-        if (not network.has_key(id_1)):
-            network[id_1] = User_account()
-        if (not network.has_key(id_2)):
-            network[id_2] = User_account() 
-        
+else:
+    batch_ids_1, batch_ids_2 = read_ids(batch_in,'batch_payments')             # Reads just the id columns, skipping (and reporting) rows whose ids aren't integers (see id_reader.py)
+    verified = accounts.verified
+    add_friendship = accounts.add_friendship
+    
+    for id_1, id_2 in izip(batch_ids_1,batch_ids_2):
+        # For each row in the batch file:
+    
+        # If an account does not yet exist for one of the participants, create
+        #   it
+        i_1 = add_account(id_1)
+        i_2 = add_account(id_2)
+    
         # If the account requesting the payment is verified, the transaction
         #   doesn't generate friendships.
-        if (network[id_1].verified == 1 or network[id_2].verified == 1):
+        if (verified[i_1] == 1 or verified[i_2] == 1):
             continue
-        
+    
         # Add each participant to the other's friends set
-        network[id_1].friends.add(id_2)
-        network[id_2].friends.add(id_1)
-        
+        add_friendship(i_1,i_2)
+
+    del batch_ids_1, batch_ids_2
+
+# Save a snapshot of the network, if requested
+if (snapshot_out):
+    snapshot_ids = accounts.ids                                                 # In dense index order, so that loading the snapshot gives everyone the same index again (which checkpoints rely on)
+    save_snapshot(snapshot_out,'v2.extras',batch_in,snapshot_ids,
+    [layer_from_sets(snapshot_ids,(accounts[id] for id in snapshot_ids))])
+
+# Restore the rest of the state from the checkpoint, or start recording the
+#   stream file's friendships for checkpoints
+if (resumed):
+    try:
+        accounts.restore_checkpoint(saved,resumed['batch_accounts'])
+    except Checkpoint_error as error:
+        sys.exit("Can't resume: %s" % error)
+    account_rates.restore([saved['rates_%d' % k] for k in
+    xrange(resumed['rates'])])
+    
+    # The verified and suspected scammer columns were saved with the rules of
+    #   the time. If the rules have changed since, mark the accounts again
+    #   with the current ones, as SIGHUP would have done
+    if (resumed.get('rules') == rules_fingerprint(rules)):
+        accounts.rules = rules
+    else:
+        sys.stderr.write("The rules have changed since %s was saved, " %
+        checkpoint_path + "carrying on with the current ones\n")
+        accounts.set_rules(rules)
+    batch_accounts = resumed['batch_accounts']
+elif (checkpoint_path):
+    accounts.start_recording()
+    batch_accounts = len(accounts.ids)
+batch_verified = batch_rules.verified.ids                                       # Saved in checkpoints, for reading the batch file again
+
 
 ## Read stream file
-out = open(out_file,'w')
+# When resuming, output files are cut back to where the checkpoint left them
+try:
+    out = open_output(out_file,resumed['out'] if resumed else None)
 
-# Open rewards file for Extra 3
-rewards = open(rewards_file,'w')
-rewards_writer = csv.writer(rewards)
-rewards_writer.writerow(['time',' id1',' id2',' amount',' message'])
+    # Open rewards file for Extra 3. Rewards are queued and written in
+    #   batches, and also sent to the payout service stand-in with --payouts
+    payout_log = Payout_log(payouts,resumed['payouts'] if resumed else None) \
+    if payouts else None
+    rewards_queue = Reward_queue(rewards_file,payout_log,
+    resume_at = resumed['rewards'] if resumed else None)
+except IOError as error:
+    sys.exit("Can't open the output files: %s" % error)
+if (resumed):
+    rewards_queue.count = resumed['reward_count']
 
 # Extra 4: In addition to the fraud score, we have manually flagged certain
-#   accounts as suspected scammers. I'm hard-coding this here, but it could just
-#   as easily be imported from a file.
-suspects = set([49594,20681,78285,20400,2316])
-for person in suspects:
-    if (not network.has_key(person)):
-        network[person] = User_account()                                        # Not sure how we could suspect someone of being a scammer before they made any transactions... Guess our precrime division is amazing! (Or I copied these ids from stream and can't be positive they occured in batch...)
-    network[person].suspected_scammer = 1
+#   accounts as suspected scammers. The list is rules.suspects, and accounts
+#   are marked as suspected scammers when created.
 
 # Extra 5: Don't ask us why, but the data analysis team has discovered that
 #   scammers frequently make requests for payments where the cent value is
-#   certain specific amounts. Again I'm hard-coding the amounts, but they could
-#   be read as well.
-suspicious_amounts = set([3,47,62,94])
+#   certain specific amounts, from rules.suspicious_cents.
+suspicious_amounts = rules.suspicious_cents
 
 # Extra 7: The FBI suspects PayMo is being used to transfer money during illicit
 #   purchases (oh my!). They have come to us with a court order requiring that
 #   we turn over the account information of people using certain words in
 #   payment messages. We will do this by first flagging accounts for using these
 #   'bad' words, then later printing out a list of account ids for the FBI. Note
-#   that the bad words list uses regular expressions
-bad_words = set([r'[Ww]ee+d',r'[Dd]ru+gs',r'[Rr]estore.*[Rr][Ee][Ii][Cc][Hh]']) # Yes, that last one appears 7 times in our data set...
+#   that the bad words list (rules.bad_words) uses regular expressions. With
+#   --watch-words, the list is read from a file instead, and reloaded whenever
+#   the file changes (see message_scanner.py)
+watch_list = None
+if (watch_words):
+    try:
+        watch_list = Watch_list(watch_words)
+    except (OSError,IOError,re.error) as error:
+        sys.exit("Couldn't read watched words from %s: %s" % (watch_words,
+        error))
+    bad_words_scanner = watch_list.scanner()
+else:
+    bad_words_scanner = rules.bad_words                                         # Checks messages against all the bad words in one pass
 
 
-second_degree_1 = set()                                                         # Initialize second degree sets for later use
-second_degree_2 = set()
-row_number = 1                                                                  # Row numbering starts at 2 (increments at beginning of loop) so that row_number lines up with files, which contain header line
+timestamps = Timestamp_parser()                                                 # Converts each row's timestamp once, for Extra 1
+friends = accounts.friends                                                      # The table's columns used in the stream loop
+fraud_score = accounts.fraud_score
+crime_flags = accounts.crime_flags
+verified = accounts.verified
+suspected_scammer = accounts.suspected_scammer
+last_requested_amount = accounts.last_requested_amount
+request_targets = accounts.request_targets
+profile = Phase_profile(args.profile_every) if args.profile else None           # Per-phase timings of the stream loop, if requested
+search_trace = [] if args.profile else None                                     # Frontier sizes of the current search, for profile
+row_number = resumed['row_number'] if resumed else 1                            # Row numbering starts at 2 (increments at beginning of loop) so that row_number lines up with files, which contain header line
 
 untrust = 0                                                                     # Initialize untrustworthiness variable
 id_1_initial_fraud = 0                                                          # Initialize fraud scores on entering transaction, for Extra 2
 id_2_initial_fraud = 0
 
-with open(stream_in,'rU') as stream_file:                                       # Opening with 'rU' instead of 'r' circumvents a bug related to newline characters in csv module
+# Saves a checkpoint of the state after the stream file's row row_number,
+#   which ends at byte offset row_end (see checkpoint.py)
+def save_state(row_number,row_end):
+    meta = {'batch': batch_id,'batch_accounts': batch_accounts,'clean': clean,
+    'stream': row_end,'row_number': row_number,'fieldnames': stream.fieldnames,
+    'rewards': rewards_queue.position(),'reward_count': rewards_queue.count,
+    'payouts': payout_log.position() if payout_log else None,
+    'out': sync_output(out),'rules': rules_fingerprint(accounts.rules)}
+    rates = account_rates.state()
+    meta['rates'] = len(rates)
+    save_checkpoint(checkpoint_path,meta,accounts.checkpoint_arrays() +
+    [('rates_%d' % k,column) for k, column in enumerate(rates)] +
+    [('batch_verified',batch_verified)])
+
+if (checkpoint_path):
+    # Read the stream file keeping count of the bytes read, so checkpoints can
+    #   record where each row ends
+    batch_id = list(batch_fingerprint(batch_in,False)[:2])                      # The batch file's size and modification time
+    stream_file = Stream_lines(stream_in,resumed['stream'] if resumed else 0,
+    clean)
+    next_checkpoint = row_number + 1 + args.checkpoint_every                    # The row at the start of which the next checkpoint is saved
+elif (clean):
+    stream_file = Clean_file(stream_in)                                         # Splits lines on '\n' only, removing '\r' characters (see filecleaner.py)
+else:
+    stream_file = open(stream_in,'rU')                                          # Opening with 'rU' instead of 'r' circumvents a bug related to newline characters in csv module
+with stream_file:
     stream = csv.DictReader(stream_file, skipinitialspace = True,
-    quoting=csv.QUOTE_NONE)
+    quoting=csv.QUOTE_NONE, fieldnames = resumed['fieldnames'] if resumed
+    else None)                                                                  # When resuming, the header line was read before the checkpoint
+    if (checkpoint_path):
+        stream.fieldnames                                                       # Reads the header line, if there is one to read
+        row_end = stream_file.offset                                            # Where the last row read ends
     for row in stream:
         # For each row in the stream file:
 
         row_number += 1
+        if (profile):
+            profile.start_row()
+
+        # Save a checkpoint of the state after the previous row, now and then
+        if (checkpoint_path):
+            if (row_number >= next_checkpoint):
+                save_state(row_number - 1,row_end)
+                next_checkpoint += args.checkpoint_every
+                if (profile):
+                    profile.mark('checkpoint')
+            row_end = stream_file.offset
+
+        # Load new rules if the process was sent SIGHUP (see rule_config.py)
+        if (rule_reloader.pending):
+            rules = rule_reloader.reload()
+            if (rules):
+                accounts.set_rules(rules)
+                suspicious_amounts = rules.suspicious_cents
+                if (not watch_list):
+                    bad_words_scanner = rules.bad_words
         
-        # See if the id1 and id2 elements of the csv file are integers and
-        #   create simple references
-        try:
-            id_1 = int(row['id1'])
-            id_2 = int(row['id2'])
-        except:
-            # Send error message and skip rows that do not contain integer ids
-            print "(In stream_payments) id field does not contain an integer! "+\
-            "Ignoring this entry... row number is:\n", row_number               # Outputs the string for debugging
-            continue
-        
-        # Unpack rest of data
-        try:
-            amount = map(int,row['amount'].split("."))                          # amount is now an integer list. amount[0] is the number of dollars and amount[1] is the number of cents requested
-            time_stamp = row['time']                                            # Note that time_stamp is an iso-formatted string (with ' ' as the separator), not a datetime() object
-            message = row['message']
-            try:
-                message = message + ", " + ", ".join(row[None])                 # If there is more data, i.e. the message itself had a comma, this will recombine the entire message. If the message has a \r linebreak, it will still not be included. NOTE: If the original message did not put a space after a comma, this implementation will add one. This seems like too minor of a problem to bother with for now, but keep in mind if it ever becomes an issue
-            except:
-                pass
-        except:
-            print("(In stream_payments) Read error, skipping entry. Message:\n")
-            print row['message']                                                # Output for debugging
+        # Unpack the row, skipping (and reporting) rows that can't be read
+        #   (see extras_params.py)
+        fields = read_row(row,row_number)
+        if (fields is None):
             continue
+        id_1, id_2, amount, time_stamp, message = fields
+        if (profile):
+            profile.mark('parse')
 
-        # If a dictionary entry does not yet exist for one of the participants, 
-        #   create it and initialize its value as an empty instance of
-        #   User_account
-        if (not network.has_key(id_1)):
-            network[id_1] = User_account()
-            
-        if (not network.has_key(id_2)):
-            network[id_2] = User_account() 
+        # If an account does not yet exist for one of the participants, create
+        #   it. i_1 and i_2 are their dense indices in the accounts table
+        i_1 = add_account(id_1)
+        i_2 = add_account(id_2)
         
         # If the account requesting payment is verified (Extra 0), the
         #   transaction is automatically trusted and no friendships are updated.
         #   Both participants are still eligible for the awards program though 
         #   (Extra 3).
-        if (network[id_2].verified == 1):
+        if (verified[i_2] == 1):
             out.write('0\n')
-            if (amount[0] >= 2):
-                network[id_1].account_rewards(id_1,rewards_writer)                                                 
-                network[id_2].account_rewards(id_2,rewards_writer)
+            if (amount[0] >= BIG_DOLLARS):
+                accounts.account_rewards(i_1,rewards_queue)
+                accounts.account_rewards(i_2,rewards_queue)
+            if (profile):
+                profile.mark('verified')
             continue
         
         # Record fraud scores on transaction entry, for Extra 2
-        id_1_initial_fraud = network[id_1].fraud_score
-        id_2_initial_fraud = network[id_2].fraud_score
+        id_1_initial_fraud = fraud_score[i_1]
+        id_2_initial_fraud = fraud_score[i_2]
         
         # Check if friends
-        if (id_2 in network[id_1].friends):
-            untrust = 0
+        if (id_2 in friends[i_1]):
+            untrust = DEGREE_UNTRUST[0]
         
         # Else check if friends of friends
-        elif (len(network[id_1].friends & network[id_2].friends) > 0):          # If the intersection of participant's friends sets are non-empty, they have at least one mutual friend
-            untrust = 1
+        elif (has_common_neighbor(friends[i_1],friends[i_2])):                  # Stops at the first mutual friend rather than building the whole intersection
+            untrust = DEGREE_UNTRUST[1]
             
         # Else check if third- or fourth-order friends
+        elif (within_distance(accounts,id_1,id_2,4,search_trace)):              # Searches outwards from both participants for a chain of four or fewer friendships (see graph_query.py)
+            untrust = DEGREE_UNTRUST[2]
         else:
-            second_degree_1 = network[id_1].friends.copy()                      # Creates copy of id_1's friends set
-            for person in network[id_1].friends:                                # For each of id_1's friends:
-                second_degree_1 |= network[person].friends                      #   Add their friends sets to second_degree_1. second_degree_1 thus contains all of id_1's first- and second-order friends
-                
-            second_degree_2 = network[id_2].friends.copy()                      # Repeat for id_2
-            for person in network[id_2].friends:
-                second_degree_2 |= network[person].friends
-                
-            if (len(second_degree_1 & second_degree_2) > 0):                    # Checks for overlap between second degree friends sets
-                untrust = 3
+            untrust = DEGREE_UNTRUST[3]
+        if (profile):
+            profile.mark('degree')
+            if (search_trace):                                                  # Only filled if the search ran
+                profile.searched(search_trace)
+                del search_trace[:]
             else:
-                untrust = 5
-                
-            second_degree_1.clear()                                             # Clear sets for future cycles
-            second_degree_2.clear()
+                profile.reached('friends' if id_2 in friends[i_1] else
+                'mutual friend')
         
         # Apply Extra 1 methods to ids
-        network[id_1].tick(time_stamp,1)
-        network[id_2].tick(time_stamp,0)
+        c_time = timestamps.parse(time_stamp)
+        accounts.tick(i_1,c_time,1)
+        accounts.tick(i_2,c_time,0)
+        if (profile):
+            profile.mark('tick')
         
         # Increase untrust if the money receiver (request sender) is a manually
         #   flagged scammer (Extra 4)
-        if (network[id_2].suspected_scammer):
-            untrust += 20
+        if (suspected_scammer[i_2]):
+            untrust += SCAMMER_UNTRUST
         
         # Increase untrust if cent amount suspicious (Extra 5)
         if (amount[1] in suspicious_amounts):
-            untrust += 3
+            untrust += CENTS_UNTRUST
         
         # Extra 6: We have found that payment requests with no messages attached
         #   (or where the message is only spaces) are often fraudulent. This
         #   raises the untrust accordingly.
         if (len(set(message) - set([' '])) == 0):
-            untrust += 4
+            untrust += EMPTY_UNTRUST
+        if (profile):
+            profile.mark('extras 4-6')
             
-        # Scan messages for the bad words (Extra 7)
-        for phrase in bad_words:
-            if (re.search(phrase,message)):
-                network[id_1].crime_flags += 1
-                network[id_2].crime_flags += 1
+        # Scan messages for the bad words (Extra 7). Each bad word found flags
+        #   both participants once
+        if (watch_list):
+            bad_words_scanner = watch_list.scanner()                            # Picks up changes to the watched words file
+        for phrase in bad_words_scanner.hits(message):
+            crime_flags[i_1] += 1
+            crime_flags[i_2] += 1
+        if (profile):
+            profile.mark('regex')
         
         # Extra 8: We have determined that scammers frequently request the same
         #   amount repeatedly. However, many people also use PayMo for recurring
         #   payments, e.g. rent, which is also in the same amount each time.
         #   Thus, we have decided to flag accounts that request the same amount
         #   repeatedly, but only if its from different people.
-        if (row['amount'] == network[id_2].last_requested_amount):
-            if(len(network[id_2].request_targets) >= 5 and 
-            not (id_1 in network[id_2].request_targets)):
-                network[id_2].fraud_score += 3
-            network[id_2].request_targets.add(id_1)
+        if (row['amount'] == last_requested_amount[i_2]):
+            targets = request_targets.get(i_2)
+            if (targets is None):                                               # Only possible if their first request is for 0.00
+                targets = request_targets[i_2] = set()
+            if(len(targets) >= REPEAT_TARGETS and not (id_1 in targets)):
+                fraud_score[i_2] += REPEAT_PENALTY
+            targets.add(id_1)
         else:
-            network[id_2].request_targets.clear()
-            network[id_2].last_requested_amount = row['amount']
-            network[id_2].request_targets.add(id_1)
+            request_targets[i_2] = set([id_1])
+            last_requested_amount[i_2] = row['amount']
  
         # Increases untrust based on fraud score of the money receiver
         #   (request sender)
-        untrust += network[id_2].fraud_score        
+        untrust += fraud_score[i_2]
+        if (profile):
+            profile.mark('extra 8')
         
         # Record transaction trustworthiness
         out.write('%d\n' % untrust)
+        if (profile):
+            profile.mark('write')
         
         # Here insert the code to get verification from the customer, if needed.
         # If verification withheld, flag as spam and continue. Else:
         
         # Run Extra 2 fraud reducer. This is coming after the untrust is
         #   measured, because better safe than sorry!
-        network[id_1].fraud_reducer(id_1_initial_fraud)
-        network[id_2].fraud_reducer(id_2_initial_fraud)
+        accounts.fraud_reducer(i_1,id_1_initial_fraud)
+        accounts.fraud_reducer(i_2,id_2_initial_fraud)
         
         # Run Extra 3 rewards program, if the transaction was for 2 dollars or
         #   more
-        if (amount[0] >= 2):
-            network[id_1].account_rewards(id_1,rewards_writer)                                                 
-            network[id_2].account_rewards(id_2,rewards_writer)
+        if (amount[0] >= BIG_DOLLARS):
+            accounts.account_rewards(i_1,rewards_queue)
+            accounts.account_rewards(i_2,rewards_queue)
+        if (profile):
+            profile.mark('rewards')
         
         # If the account payment is requested from is verified (Extra 0),
         #   friendships are not updated. However, since verified accounts can
         #   still be the victims of fraud, this check comes at the end of the
         #   loop.
-        if (network[id_1].verified == 1):
+        if (verified[i_1] == 1):
             continue
         
         # Since a valid transaction has occured between id_1 and id_2, add them
         #   to one another's friends sets
-        network[id_1].friends.add(id_2)                                                 
-        network[id_2].friends.add(id_1)
+        accounts.add_friendship(i_1,i_2)
+        if (profile):
+            profile.mark('friendship')
         
         
-# Process rewards payments (Extra 3)
-rewards.close()
-with open(rewards_file,'rU') as rewards:                                        # Opening with 'rU' instead of 'r' circumvents a bug related to newline characters in csv module
-    rew = csv.DictReader(rewards, skipinitialspace = True)
-    for row in rew:
-        # Because we know these payments come from us, they are automatically
-        #   trusted and don't generate friendships or other Extras features
-        out.write('0\n')
+# Process rewards payments (Extra 3). Because we know these payments come
+#   from us, they are automatically trusted and don't generate friendships or
+#   other Extras features
+rewards_queue.close()
+if (payout_log):
+    payout_log.close()
+out.write('0\n' * rewards_queue.count)
 
 # Close output files
 out.close()
 
+# The run is complete, so its checkpoint is no longer needed
+if (checkpoint_path and os.path.exists(checkpoint_path)):
+    os.remove(checkpoint_path)
+
 # Save suspects list for FBI (Extra 7)
 with open(suspects_file,'w') as suspects:
-    for id in network:
-        if (network[id].crime_flags >= 3):
+    for id, i in accounts.index.iteritems():
+        if (crime_flags[i] >= 3):
             suspects.write('%d\n' % id)
         
     
@@ -17,152 +17,86 @@
 # The code creates a dictionary called 'network' containing an entry for each
 #   unique costumer id. The value attached this entry is the set of ids
 #   corresponding to the people that person has transacted with ('friends').
+#   The few people with huge numbers of friends have their sets replaced by
+#   compressed bitmaps (see friend_bitmap.py), which are much smaller and
+#   quicker to intersect.
 #
 # While reading the batch file, with each transaction both participants are
 #   simply added to each other's friends sets.
 #
 # While reading the stream file, with each new transaction the code checks
-#   whether the participants are already friends, then checks if the
-#   intersection of their friend sets is non-empty (i.e. they have a mutual
-#   friend, i.e. they are second-order friends), and if that fails finally
-#   constructs sets of the union of each participant's first- and second-order
-#   friends and sees if there is any overlap (which would make them third- or
-#   fourth-order friends). Outputs are recorded and last of all the participants
-#   are added to each other's friends sets for future transactions (since we are
-#   assuming each transaction becomes a new, valid payment record after it is
-#   processed).
+#   whether the participants are already friends, then checks if their
+#   friends sets have an id in common (i.e. they have a mutual friend, i.e.
+#   they are second-order friends), and if that fails finally runs a
+#   bidirectional, depth-limited search outwards from both participants (see
+#   graph_query.py) to see if they are third- or fourth-order friends.
+#   Outputs are recorded and last of all the participants are added to each
+#   other's friends sets for future transactions (since we are assuming each
+#   transaction becomes a new, valid payment record after it is processed).
+#
+# The network and these checks are Search_strategy in paymo/strategies.py. The
+#   files are read and written by paymo/pipeline.py, as for every version.
+#   Besides its command line, this script only adds the modes which aren't
+#   part of the pipeline: answering transactions over a socket (--serve) and
+#   caching second-order friends for the fourth-order check (--two-hop-cache).
 
 
 import sys
-import csv
+import atexit
+import argparse
 
+from paymo.strategies import Search_strategy
+from paymo.pipeline import add_arguments, load_network, score_stream, VERDICTS
+from scoring_server import serve
+from two_hop_cache import Two_hop_cache
 
-# Input files
-try:
-    batch_in = sys.argv[1]                                                      # Batch input payments
-    stream_in = sys.argv[2]                                                     # Stream input payments
-    out_1 = sys.argv[3]                                                         # Feature 1 output
-    out_2 = sys.argv[4]                                                         # Feature 2 output
-    out_3 = sys.argv[5]                                                         # Feature 3 output
-except:
-    sys.exit("Input failed. Please check command line syntax")
 
+### Main code ###
 
-# Read batch file
-network = {}                                                                    # The dictionary containing costumer ids and their friends sets
-row_number = 1                                                                  # Row numbering starts at 2 (increments at beginning of loop) so that row_number lines up with files, which contain header line
+parser = argparse.ArgumentParser(description = "Fraud Detection System, " +
+"version 2")
+add_arguments(parser,optional = True)                                           # The stream file and output files aren't needed with --serve
+parser.add_argument('--compact', action = 'store_true', help = "Store the " +
+"network in flat integer arrays (see compact_network.py) instead of a " +
+"dictionary of sets. Uses roughly a tenth of the memory")
+parser.add_argument('--serve', metavar = 'ADDRESS', help = "Instead of " +
+"reading a stream file, keep running and answer transactions sent to " +
+"ADDRESS ('host:port', or the path of a Unix socket). See scoring_server.py")
+parser.add_argument('--pipelined', action = 'store_true', help = "Accepted " +
+"for older command lines. The stream file is always scored a block of rows " +
+"at a time, with the output files written from a separate thread (see " +
+"verdict_writer.py)")
+parser.add_argument('--two-hop-cache', metavar = 'BYTES', type = int,
+help = "Keep up to BYTES bytes of recently checked customers' second-order " +
+"friends, to answer later fourth-order checks involving them without " +
+"searching (see two_hop_cache.py). The output is the same")
+args = parser.parse_args()
+if (not args.serve and not args.out_3):
+    parser.error("stream_in and the three output files are required unless " +
+    "--serve is used")
+if (args.two_hop_cache is not None and args.compact):
+    parser.error("--two-hop-cache can't be used with --compact")
 
-with open(batch_in,'rU') as batch_file:                                         # Opening with 'rU' instead of 'r' circumvents a bug related to newline characters in csv module
-    batch_connections = csv.DictReader(batch_file, skipinitialspace = True,
-    quoting=csv.QUOTE_NONE)
-    for row in batch_connections:                                               
-        # For each row in the batch file:
-        
-        row_number += 1
-        
-        # See if the id1 and id2 elements of the csv file are integers and
-        #   create simple references
-        try:                                                                    
-            id_1 = int(row['id1'])
-            id_2 = int(row['id2'])
-        except:
-            # Send error message and skip rows that do not contain integer ids
-            print "(In batch_payments) id field does not contain an integer! "+\
-            "Ignoring this entry... row number is:\n", row_number               # Outputs the string for debugging
-            continue
-        
-        # If a dictionary entry does not yet exist for one of the participants,
-        #   create it and initialize its value as an empty set
-        if (not network.has_key(id_1)):
-            network[id_1] = set()
-            
-        if (not network.has_key(id_2)):
-            network[id_2] = set() 
-        
-        # Add each participant to the other's friends set
-        network[id_1].add(id_2)
-        network[id_2].add(id_1)
-        
 
-# Read stream file
-out1 = open(out_1,'w')
-out2 = open(out_2,'w')
-out3 = open(out_3,'w')
+# Read the batch file, or load the network from a snapshot
+strategy = Search_strategy(args)
+load_network(strategy,args)
 
-second_degree_1 = set()                                                         # Initialize sets for recording second-order friends
-second_degree_2 = set()
-row_number = 1                                                                  # Row numbering starts at 2 (increments at beginning of loop) so that row_number lines up with files, which contain header line
+# If requested, answer fourth-order checks from a cache of second-order friends
+#   (see two_hop_cache.py), printing how well it did at exit
+if (args.two_hop_cache is not None):
+    two_hop_cache = Two_hop_cache(args.two_hop_cache)
+    strategy.within_degree = two_hop_cache.searching(strategy.within_degree)
+    strategy.add_friendship = two_hop_cache.updating(strategy.add_friendship)
+    atexit.register(lambda: sys.stderr.write("Two-hop cache: " +
+    two_hop_cache.summary() + "\n"))
 
-with open(stream_in,'rU') as stream_file:                                       # Opening with 'rU' instead of 'r' circumvents a bug related to newline characters in csv module
-    stream = csv.DictReader(stream_file, skipinitialspace = True,
-    quoting=csv.QUOTE_NONE)  
-    for row in stream:
-        # For each row in the stream file:
-        
-        row_number += 1
-        
-        # See if the id1 and id2 elements of the csv file are integers and
-        #   create simple references
-        try:
-            id_1 = int(row['id1'])
-            id_2 = int(row['id2'])
-        except:
-            # Send error message and skip rows that do not contain integer ids
-            print "(In stream_payments) id field does not contain an integer! "+\
-            "Ignoring this entry... row number is:\n", row_number               # Outputs the string for debugging
-            continue
-        
-        # If a dictionary entry does not yet exist for one of the participants,
-        #   create it and initialize its value as an empty set
-        if (not network.has_key(id_1)):
-            network[id_1] = set()
-            
-        if (not network.has_key(id_2)):
-            network[id_2] = set() 
-        
-        # Check if friends
-        if (id_2 in network[id_1]):
-            out1.write('trusted\n')
-            out2.write('trusted\n')
-            out3.write('trusted\n')
-        
-        # Else check if friends of friends
-        elif (len(network[id_1] & network[id_2]) > 0):                          # If the intersection of participant's friends sets are non-empty, they have at least one mutual friend
-            out1.write('unverified\n')
-            out2.write('trusted\n')
-            out3.write('trusted\n')
-            
-        # Else check if third- or fourth-order friends
-        else:
-            out1.write('unverified\n')
-            out2.write('unverified\n')
-            
-            second_degree_1 = network[id_1].copy()                              # Creates copy of id_1's friends set
-            for friend in network[id_1]:                                        # For each of id_1's friends:
-                second_degree_1 |= network[friend]                              #   Add their friends sets to second_degree_1. second_degree_1 thus contains all of id_1's first- and second-order friends
-                
-            second_degree_2 = network[id_2].copy()                              # Repeat for id_2
-            for friend in network[id_2]:
-                second_degree_2 |= network[friend]
-                
-            if (len(second_degree_1 & second_degree_2) > 0):                    # Checks for overlap between first- and second-order friends sets
-                out3.write('trusted\n')
-            else:
-                out3.write('unverified\n')
-                
-            second_degree_1.clear()                                             # Clear sets for future cycles
-            second_degree_2.clear()
-        
-        
-        # Here insert the code to get verification from the customer, if needed.
-        # If verification withheld, flag as spam and continue. Else:
-        
-        # Since a valid transaction has occured between id_1 and id_2, add them
-        #   to one another's friends sets
-        network[id_1].add(id_2)                                                 
-        network[id_2].add(id_1)
+# If running as a server, answer transactions from clients instead of reading
+#   the stream file. Friendships are added after each reply is sent
+if (args.serve):
+    serve(args.serve,lambda id_1, id_2: VERDICTS[strategy.check(id_1,id_2)],
+    strategy.add)
+    sys.exit()
 
-# Close output files
-out1.close()
-out2.close()
-out3.close()
\ No newline at end of file
+# Score the stream file
+score_stream(strategy,args.stream_in,(args.out_1,args.out_2,args.out_3))
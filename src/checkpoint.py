@@ -0,0 +1,178 @@
+### Checkpoints ###
+#
+# Saves the state of a long stream run now and then, so that a run which dies
+#   partway through the stream file can be resumed where it stopped
+#
+#
+# Description:
+#
+# antifraud_2.extras.py's state is a set of columns (arrays with an entry per
+#   account or per slot, see User_accounts and rate_windows.py), plus the
+#   position reached in the stream file and in each output file. A checkpoint
+#   saves all of them between two rows. Resuming truncates the output files
+#   back to the saved positions (dropping anything written after the
+#   checkpoint), restores the columns and carries on reading the stream file
+#   from the saved byte offset, so the outputs are exactly the same as those
+#   of a run that never stopped.
+#
+# The friendships made while reading the batch file aren't saved, since they
+#   are the bulk of the state and can be rebuilt by reading the batch file (or
+#   snapshot) again. Only the friendships added since are saved, as two arrays
+#   of dense indices, and added again in order after the batch file is read.
+#
+# Checkpoints are written to a temporary file in the same directory, which is
+#   synced to disk and then renamed over the previous checkpoint, so a crash
+#   while writing one always leaves the previous checkpoint intact. The output
+#   files are flushed and synced first, so a checkpoint never refers to output
+#   that didn't reach the disk.
+#
+# Stream_lines reads the stream file in the same way as open(path,'rU') (or
+#   Clean_file, see filecleaner.py), but keeps count of the bytes read, which
+#   file objects can't report while being iterated over.
+#
+#
+# File format:
+#
+# The file starts with a fixed header (see HEADER) giving the length of the
+#   metadata, a JSON object holding the positions and other scalars along with
+#   the name, type code and length of each array. The arrays follow, one after
+#   another, in the machine's native byte order.
+
+
+import os
+import json
+import struct
+from array import array
+
+
+MAGIC = 'PAYMOCKP'
+VERSION = 1
+HEADER = struct.Struct('<8sIQ')                                                 # magic, version, metadata length
+CHUNK_SIZE = 1 << 20                                                            # Bytes of the stream file read at a time
+
+
+class Checkpoint_error(Exception):
+    pass
+
+
+# Writes a checkpoint to path. Inputs: a dictionary of values that can be
+#   written as JSON, and a list of (name, array) pairs
+def save_checkpoint(path,meta,arrays):
+    meta = dict(meta)
+    meta['arrays'] = [[name,column.typecode,column.itemsize,len(column)] for
+    name, column in arrays]
+    text = json.dumps(meta)
+    temporary = path + '.tmp'
+    with open(temporary,'wb') as f:
+        f.write(HEADER.pack(MAGIC,VERSION,len(text)))
+        f.write(text)
+        for name, column in arrays:
+            column.tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(temporary,path)                                                   # Atomic, so path is always either the old checkpoint or the new one
+
+
+# Reads the checkpoint in path. Returns the dictionary of values and a
+#   dictionary of the arrays by name. Raises Checkpoint_error if path isn't a
+#   complete checkpoint
+def load_checkpoint(path):
+    with open(path,'rb') as f:
+        header = f.read(HEADER.size)
+        if (len(header) < HEADER.size):
+            raise Checkpoint_error("%s is not a checkpoint" % path)
+        magic, version, length = HEADER.unpack(header)
+        if (magic != MAGIC or version != VERSION):
+            raise Checkpoint_error("%s is not a version %d checkpoint" %
+            (path,VERSION))
+        meta = json.loads(f.read(length))
+        arrays = {}
+        for name, typecode, itemsize, length in meta.pop('arrays'):
+            column = array(str(typecode))
+            if (column.itemsize != itemsize):
+                raise Checkpoint_error("%s was written on a machine with " %
+                path + "different integer sizes")
+            try:
+                column.fromfile(f,length)
+            except EOFError:
+                raise Checkpoint_error("%s is truncated" % path)
+            arrays[name] = column
+    return meta, arrays
+
+
+# Flushes the open file f and syncs it to disk. Returns its position
+def sync_output(f):
+    f.flush()
+    os.fsync(f.fileno())
+    return f.tell()
+
+
+# Opens output file path for writing. If resume_at is given, the file is kept
+#   up to that position and anything after it removed, and writing continues
+#   from there
+def open_output(path,resume_at = None):
+    if (resume_at is None):
+        return open(path,'wb')
+    f = open(path,'r+b')
+    f.truncate(resume_at)
+    f.seek(resume_at)
+    return f
+
+
+# Class reading the lines of a stream file from byte offset start, keeping the
+#   offset just past the last line given in offset. Lines end in '\n', as with
+#   open(path,'rU'): '\r\n' and '\r' become '\n'. If clean is set, lines are
+#   instead split on '\n' only, with '\r' characters removed, as Clean_file
+#   gives them
+class Stream_lines:
+
+    def __init__(self,path,start = 0,clean = False,chunk_size = CHUNK_SIZE):
+        self.file = open(path,'rb')
+        self.file.seek(start)
+        self.offset = start
+        self.clean = clean
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        remainder = ''                                                          # The incomplete line at the end of the last chunk
+        while (True):
+            chunk = self.file.read(self.chunk_size)
+            text = remainder + chunk
+            if (not chunk):
+                self.offset += len(text)                                        # The last line of the file may not end in a newline
+                if (self.clean):
+                    text = text.replace('\r','')
+                elif (text[-1:] == '\r'):
+                    text = text[:-1] + '\n'
+                if (text):
+                    yield text
+                return
+            if (self.clean):
+                lines = text.split('\n')
+                remainder = lines.pop()
+                for line in lines:
+                    self.offset += len(line) + 1
+                    yield line.replace('\r','') + '\n'
+            else:
+                lines = text.splitlines(True)                                   # Splits after '\r\n', '\r' or '\n', keeping them
+                remainder = lines.pop()
+                if (remainder[-1] == '\n'):                                     # A whole line. A final '\r' may be the first half of a '\r\n' split between chunks, so it waits for the next one
+                    lines.append(remainder)
+                    remainder = ''
+                for line in lines:
+                    self.offset += len(line)
+                    if (line[-1] == '\r'):
+                        yield line[:-1] + '\n'
+                    elif (line[-2:] == '\r\n'):
+                        yield line[:-2] + '\n'
+                    else:
+                        yield line
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc_info):
+        self.close()
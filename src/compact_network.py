@@ -0,0 +1,247 @@
+### Compact network storage ###
+#
+# A memory-efficient replacement for the 'network' dictionary of friends sets
+#
+#
+# Description:
+#
+# Keeping the network as a dictionary of Python sets costs upwards of 100 bytes
+#   for every friendship, which adds up quickly on the full batch file. This
+#   module stores the same information in flat integer arrays instead.
+#
+#
+# Basic outline:
+#
+# Every customer id is given a dense index (0, 1, 2, ...) in the order they
+#   first appear. All friendships are stored in 'compressed sparse row' form:
+#   Compact_network.neighbors is one long array of 32 bit friend indices, where
+#   the friends of the person with index i are found (sorted) between positions
+#   offsets[i] and offsets[i+1]. This costs 4 bytes per friendship (8 counting
+#   both directions), plus a few bytes per customer.
+#
+# The arrays are built in one go from the batch file. Since they can't be
+#   cheaply inserted into, friendships made afterwards (i.e. while reading the
+#   stream file) go into a small dictionary of sets called the 'delta'. Once
+#   the delta grows too large it is merged back into the arrays by compact().
+#
+# The degree checks used by antifraud_2.py (are_friends, have_mutual_friend and
+#   within_degree) are provided as methods, and accept customer ids directly.
+#   The last two run the shared checks of graph_query.py on dense indices:
+#   Compact_network.by_index gives a read-only, set-like Friends_view of each
+#   person's friends, which is all those checks need.
+#
+# The arrays can also be saved to and loaded from a snapshot file, see
+#   network_snapshot.py.
+
+
+from array import array
+from bisect import bisect_left
+from itertools import chain, izip
+
+from graph_query import has_common_neighbor, within_distance
+
+
+# The friends of the person with dense index i in network net, looked up in
+#   the arrays and the delta when needed. len() and 'in' read the arrays in
+#   place, while iterating copies the person's block of self.neighbors (one
+#   slice, see friends_of). Supports len(), iteration, 'in' and isdisjoint,
+#   like the friends sets of antifraud_2.py
+class Friends_view:
+
+    def __init__(self,net,i):
+        self.net = net
+        self.i = i
+
+    def __len__(self):
+        return self.net.degree(self.i)
+
+    def __iter__(self):
+        return iter(self.net.friends_of(self.i))
+
+    def __contains__(self,j):
+        return self.net._knows(self.i,j)
+
+    def isdisjoint(self,other):
+        if (len(other) < len(self)):                                            # Walk the shorter side, looking each up in the longer one
+            for j in other:
+                if (j in self):
+                    return False
+            return True
+        for j in self:
+            if (j in other):
+                return False
+        return True
+
+
+# Indexing network net by dense index gives Friends_views
+class Friends_table:
+
+    def __init__(self,net):
+        self.net = net
+
+    def __getitem__(self,i):
+        return Friends_view(self.net,i)
+
+
+class Compact_network:
+
+    def __init__(self,ids_1=(),ids_2=(),delta_limit=65536):
+        self.index = {}                                                         # Customer id -> dense index
+        self.ids = array('l')                                                   # Dense index -> customer id
+        self.offsets = array('l',[0])                                           # Start of each person's friends in self.neighbors (one extra entry marks the end of the last person's)
+        self.neighbors = array('i')                                             # Everyone's (sorted) friends, one person after another
+        self.delta = {}                                                         # Dense index -> set of friends made since the arrays were last built
+        self.delta_size = 0                                                     # Total number of entries in the delta sets
+        self.delta_limit = delta_limit                                          # The delta is compacted once it holds more entries than this (or than 1/8 of the arrays, whichever is bigger)
+        self.by_index = Friends_table(self)                                     # Dense index -> Friends_view, for the searches in graph_query.py
+        self.build(ids_1,ids_2)
+
+    # Returns the dense index of customer id, registering them if they are new
+    def add_user(self,id):
+        i = self.index.get(id)
+        if (i is None):
+            i = len(self.ids)
+            self.index[id] = i
+            self.ids.append(id)
+        return i
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self,id):
+        return id in self.index
+
+    # Builds the arrays from two equal-length sequences of customer ids, where
+    #   ids_1[k] and ids_2[k] are the participants of the k-th transaction.
+    #   Repeated transactions are only recorded once.
+    def build(self,ids_1,ids_2):
+        # Count each person's transactions so everyone's friends can be given
+        #   a block of the right size
+        counts = array('l')
+        for id_1, id_2 in izip(ids_1,ids_2):
+            i_1 = self.add_user(id_1)
+            i_2 = self.add_user(id_2)
+            if (len(counts) < len(self.ids)):
+                counts.extend([0] * (len(self.ids) - len(counts)))
+            counts[i_1] += 1
+            if (i_1 != i_2):                                                    # Someone paying themselves is only their own friend once
+                counts[i_2] += 1
+
+        fill = array('l',[0]) * (len(counts) + 1)                               # Next free position in each person's block
+        for i in xrange(len(counts)):
+            fill[i+1] = fill[i] + counts[i]
+        raw = array('i',[0]) * fill[len(counts)]
+        for id_1, id_2 in izip(ids_1,ids_2):
+            i_1 = self.index[id_1]
+            i_2 = self.index[id_2]
+            raw[fill[i_1]] = i_2
+            fill[i_1] += 1
+            if (i_1 != i_2):
+                raw[fill[i_2]] = i_1
+                fill[i_2] += 1
+
+        # Sort each block and drop repeated friendships
+        self.offsets = array('l',[0])
+        self.neighbors = array('i')
+        start = 0
+        for i in xrange(len(self.ids)):
+            end = fill[i]                                                       # After filling, fill[i] has moved to the end of i's block
+            self.neighbors.extend(sorted(set(raw[start:end])))
+            self.offsets.append(len(self.neighbors))
+            start = end
+        self.delta = {}
+        self.delta_size = 0
+
+    # Uses existing arrays instead of building them, e.g. ones loaded from a
+    #   snapshot (see network_snapshot.py). offsets and neighbors can be any
+    #   sequence of integers, including views of a memory-mapped file
+    def load_arrays(self,ids,offsets,neighbors):
+        self.ids = ids
+        self.index = dict(izip(ids,xrange(len(ids))))
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.delta = {}
+        self.delta_size = 0
+
+    # Merges the delta sets into the arrays
+    def compact(self):
+        offsets = array('l',[0])
+        neighbors = array('i')
+        n_built = len(self.offsets) - 1                                         # People added since the last build have no block yet
+        for i in xrange(len(self.ids)):
+            if (i < n_built):
+                block = self.neighbors[self.offsets[i]:self.offsets[i+1]]
+            else:
+                block = []
+            if (i in self.delta):
+                block = sorted(chain(block,self.delta[i]))
+            neighbors.extend(block)
+            offsets.append(len(neighbors))
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.delta = {}
+        self.delta_size = 0
+
+    # Returns an iterable of the dense indices of person i's friends
+    def friends_of(self,i):
+        if (i < len(self.offsets) - 1):
+            block = self.neighbors[self.offsets[i]:self.offsets[i+1]]
+        else:
+            block = ()
+        if (i in self.delta):
+            return chain(block,self.delta[i])
+        return block
+
+    # Returns the number of friends of the person with dense index i
+    def degree(self,i):
+        count = len(self.delta.get(i,()))
+        if (i < len(self.offsets) - 1):
+            count += self.offsets[i+1] - self.offsets[i]
+        return count
+
+    # Checks whether dense index j is among dense index i's friends
+    def _knows(self,i,j):
+        if (i < len(self.offsets) - 1):
+            lo = self.offsets[i]
+            hi = self.offsets[i+1]
+            k = bisect_left(self.neighbors,j,lo,hi)                             # Binary search within i's (sorted) block
+            if (k < hi and self.neighbors[k] == j):
+                return True
+        return i in self.delta and j in self.delta[i]
+
+    # Degree checks, taking customer ids. These are equivalent to the set
+    #   operations in antifraud_2.py
+    def are_friends(self,id_1,id_2):
+        i_1 = self.index.get(id_1)
+        i_2 = self.index.get(id_2)
+        if (i_1 is None or i_2 is None):
+            return False
+        return self._knows(i_1,i_2)
+
+    def have_mutual_friend(self,id_1,id_2):
+        i_1 = self.index.get(id_1)
+        i_2 = self.index.get(id_2)
+        if (i_1 is None or i_2 is None):
+            return False
+        return has_common_neighbor(self.by_index[i_1],self.by_index[i_2])
+
+    # Bidirectional, depth-limited search, run on dense indices through
+    #   by_index. See within_distance in graph_query.py
+    def within_degree(self,id_1,id_2,max_degree):
+        i_1 = self.index.get(id_1)
+        i_2 = self.index.get(id_2)
+        if (i_1 is None or i_2 is None):
+            return False
+        return within_distance(self.by_index,i_1,i_2,max_degree)
+
+    # Records a transaction between customer ids id_1 and id_2
+    def add_friendship(self,id_1,id_2):
+        i_1 = self.add_user(id_1)
+        i_2 = self.add_user(id_2)
+        if (self._knows(i_1,i_2)):
+            return
+        self.delta.setdefault(i_1,set()).add(i_2)
+        self.delta.setdefault(i_2,set()).add(i_1)
+        self.delta_size += 1 if i_1 == i_2 else 2
+        if (self.delta_size > max(self.delta_limit,len(self.neighbors) // 8)):
+            self.compact()
@@ -0,0 +1,89 @@
+### Extras parameters ###
+#
+# The thresholds and weights of antifraud_2.extras.py's Extras, and the
+#   reading of its stream rows, shared with rescore.py
+#
+#
+# Description:
+#
+# rescore.py recomputes antifraud_2.extras.py's output for other values of the
+#   Extras' thresholds and weights, and must give exactly the same output for
+#   the values antifraud_2.extras.py runs with. Both take those values from
+#   here, so a threshold changed in one place is changed for both, and both
+#   read each stream row (and skip the same rows, with the same messages)
+#   with read_row.
+#
+#
+# Basic outline:
+#
+# The constants below are used by antifraud_2.extras.py, and DEFAULTS gives
+#   them by name, as rescore.py's (and sweep.py's) parameters.
+#   read_row(row,row_number) returns the fields of csv.DictReader row.
+
+
+from rule_config import DEFAULT_SUSPICIOUS_CENTS
+
+
+DEGREE_UNTRUST = (0,1,3,5)                                                      # Untrust of friends, friends of friends, third- or fourth-order friends and strangers
+TAKE_PER_DAY = 10                                                               # Extra 1a.1: requests sent per day before each one raises the fraud score
+GIVE_PER_DAY = 50                                                               # Extra 1a.2: requests received per day before...
+GIVE_EVERY = 3                                                                  # ...every GIVE_EVERY-th one raises the fraud score
+BURST_EVENTS = 6                                                                # Extra 1b: this many transactions...
+BURST_SECONDS = 10                                                              # ...within this many seconds raise the fraud score
+CLEAN_RUN = 4                                                                   # Extra 2: clean transactions in a row that lower the fraud score
+BIG_DOLLARS = 2                                                                 # Extra 3: dollars for a transaction to count as large...
+BIG_TRANSACTIONS = 20                                                           # ...and large transactions for a reward
+SCAMMER_UNTRUST = 20                                                            # Extra 4
+CENTS_UNTRUST = 3                                                               # Extra 5 (the cent amounts are one of the rules' lists, see rule_config.py)
+EMPTY_UNTRUST = 4                                                               # Extra 6
+REPEAT_TARGETS = 5                                                              # Extra 8: different people asked for the same amount...
+REPEAT_PENALTY = 3                                                              # ...before each new one raises the fraud score by this
+
+DEFAULTS = {
+'degree_untrust': DEGREE_UNTRUST,
+'take_per_day': TAKE_PER_DAY,
+'give_per_day': GIVE_PER_DAY,
+'give_every': GIVE_EVERY,
+'burst_events': BURST_EVENTS,
+'burst_seconds': BURST_SECONDS,
+'clean_run': CLEAN_RUN,
+'big_dollars': BIG_DOLLARS,
+'big_transactions': BIG_TRANSACTIONS,
+'scammer_untrust': SCAMMER_UNTRUST,
+'suspicious_cents': DEFAULT_SUSPICIOUS_CENTS,                                   # The built-in list (rescore.py uses the rules file's, with --rules)
+'cents_untrust': CENTS_UNTRUST,
+'empty_untrust': EMPTY_UNTRUST,
+'repeat_targets': REPEAT_TARGETS,
+'repeat_penalty': REPEAT_PENALTY,
+}
+
+
+# Function reading stream row row (a csv.DictReader row), the row_number-th
+#   line of the file. Returns (id_1, id_2, amount, time_stamp, message), with
+#   amount a list of the dollars and the cents, or prints why the row can't be
+#   read and returns None
+def read_row(row,row_number):
+
+    # See if the id1 and id2 elements of the csv file are integers
+    try:
+        id_1 = int(row['id1'])
+        id_2 = int(row['id2'])
+    except:
+        print "(In stream_payments) id field does not contain an integer! "+\
+        "Ignoring this entry... row number is:\n", row_number                   # Outputs the string for debugging
+        return None
+
+    # Unpack rest of data
+    try:
+        amount = map(int,row['amount'].split("."))                              # amount is now an integer list. amount[0] is the number of dollars and amount[1] is the number of cents requested
+        time_stamp = row['time']                                                # Note that time_stamp is an iso-formatted string (with ' ' as the separator), not a datetime() object
+        message = row['message']
+        try:
+            message = message + ", " + ", ".join(row[None])                     # If there is more data, i.e. the message itself had a comma, this will recombine the entire message. If the message has a \r linebreak, it will still not be included. NOTE: If the original message did not put a space after a comma, this implementation will add one
+        except:
+            pass
+    except:
+        print("(In stream_payments) Read error, skipping entry. Message:\n")
+        print row['message']                                                    # Output for debugging
+        return None
+    return id_1, id_2, amount, time_stamp, message
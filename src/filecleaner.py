@@ -1,5 +1,5 @@
 ### File Cleaning System ###
-# 
+#
 # Removes '\r' character from input files
 #
 #
@@ -12,21 +12,107 @@
 #   comments with '\r' in them create new lines on reading. Running this program
 #   first is unnecessary (i.e. the code will accurately complete with the
 #   original data), but it will prevent some error messages from being generated
+#
+# The file is cleaned a fixed-size chunk at a time (optionally reading it
+#   through mmap), so memory use doesn't depend on the size of the file.
+#   Removing a character never depends on its neighbours, so the chunks can be
+#   cut anywhere.
+#
+# Clean_file does the same while the file is being read, giving its cleaned
+#   lines to the csv module directly, so that the antifraud codes can clean
+#   their stream files (with --clean) without a cleaned copy ever being
+#   written to disk.
+#
+# Usage: python filecleaner.py file_in file_out [--mmap] [--chunk-size BYTES]
+#   (file_out may be '-' for standard output)
 
+
+import os
 import sys
+import mmap
+import argparse
+
+
+CHUNK_SIZE = 1 << 22                                                            # Bytes cleaned at a time
+
+
+# Yields the contents of open binary file payments, without '\r' characters,
+#   in chunks of up to chunk_size bytes. If use_mmap is set, the file is
+#   mapped into memory rather than read
+def clean_chunks(payments,chunk_size = CHUNK_SIZE,use_mmap = False):
+    if (use_mmap):
+        size = os.fstat(payments.fileno()).st_size
+        if (not size):                                                          # Empty files can't be mapped
+            return
+        view = mmap.mmap(payments.fileno(),0,access = mmap.ACCESS_READ)
+        try:
+            for start in xrange(0,size,chunk_size):
+                yield view[start:start + chunk_size].replace('\r','')
+        finally:
+            view.close()
+    else:
+        while (True):
+            chunk = payments.read(chunk_size)
+            if (not chunk):
+                break
+            yield chunk.replace('\r','')
+
+
+# Class reading a payments file as cleaned lines. Iterating over it gives the
+#   lines of file path, split on '\n' only and without '\r' characters, so it
+#   can be handed to csv.reader or csv.DictReader in place of an open file
+class Clean_file:
+
+    def __init__(self,path,chunk_size = CHUNK_SIZE,use_mmap = False):
+        self.file = open(path,'rb')
+        self.chunks = clean_chunks(self.file,chunk_size,use_mmap)
+
+    def __iter__(self):
+        remainder = ''                                                          # The incomplete line at the end of the last chunk
+        for chunk in self.chunks:
+            lines = (remainder + chunk).split('\n')
+            remainder = lines.pop()
+            for line in lines:
+                yield line + '\n'
+        if (remainder):                                                         # The last line of the file may not end in a newline
+            yield remainder
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc_info):
+        self.close()
 
-try:
-    file_in = sys.argv[1]
-except:
-    sys.exit("No input file given")
 
-try:
-    file_out = sys.argv[2]
-except:
-    sys.exit("No output file given")    
+# Writes a cleaned copy of file path_in to path_out ('-' for standard output)
+def clean_file(path_in,path_out,chunk_size = CHUNK_SIZE,use_mmap = False):
+    with open(path_in,'rb') as payments:
+        out = sys.stdout if path_out == '-' else open(path_out,'wb')
+        try:
+            for chunk in clean_chunks(payments,chunk_size,use_mmap):
+                out.write(chunk)
+        finally:
+            if (out is not sys.stdout):
+                out.close()
 
-content = open(file_in, "r").read().replace('\r','')
 
-out = open(file_out,"w")
-out.write(content)
-out.close()
\ No newline at end of file
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(description = "Removes '\\r' " +
+    "characters from a payments file")
+    parser.add_argument('file_in', help = "File to clean")
+    parser.add_argument('file_out', help = "Cleaned file to write ('-' for " +
+    "standard output)")
+    parser.add_argument('--mmap', action = 'store_true', help = "Read the " +
+    "input through mmap instead of read()")
+    parser.add_argument('--chunk-size', metavar = 'BYTES', type = int,
+    default = CHUNK_SIZE, help = "Bytes cleaned at a time (default: " +
+    "%(default)s)")
+    args = parser.parse_args()
+    if (args.chunk_size < 1):
+        parser.error("--chunk-size must be positive")
+    if (os.path.abspath(args.file_in) == os.path.abspath(args.file_out)):
+        parser.error("file_out must be a different file from file_in")         # Cleaning in place would truncate the input before it is read
+    clean_file(args.file_in,args.file_out,args.chunk_size,args.mmap)
@@ -0,0 +1,213 @@
+### Friend bitmaps ###
+#
+# A compressed replacement for the friends sets of accounts with huge numbers
+#   of friends
+#
+#
+# Description:
+#
+# A few accounts transact with a huge number of people (see 'Other Thoughts' in
+#   README). As Python sets, their friends sets take up most of the network's
+#   memory, and intersecting two of them means walking one element by element.
+#   With antifraud_2.py, once someone has more than BITMAP_SIZE friends their
+#   set is replaced by a Friend_bitmap, which stores the same ids far more
+#   compactly and can be intersected a whole block of ids at a time. Everyone
+#   else keeps an ordinary set, which is smaller and faster for a few friends.
+#
+#
+# Basic outline:
+#
+# This follows the 'roaring bitmap' layout. Ids are split into their high and
+#   low 16 bits. Friend_bitmap.chunks maps each high half to a container
+#   holding the low halves that occur with it: a sorted array of 16 bit
+#   integers while there are at most ARRAY_SIZE of them, or else a bitmap (a
+#   Python integer with bit k set for low half k, 8 kilobytes at most).
+#   Intersecting two bitmap containers is a single '&' of two integers.
+#
+# Friend_bitmap supports the same operations antifraud_2.py uses on sets ('in',
+#   add, len, iteration, '&' and '|'), and '&' and '|' also work between a set
+#   and a Friend_bitmap, in either order.
+
+
+import re
+from array import array
+from bisect import bisect_left
+from binascii import hexlify
+from itertools import chain, imap
+
+
+BITMAP_SIZE = 1024                                                              # Friends sets larger than this are replaced by a Friend_bitmap
+ARRAY_SIZE = 4096                                                               # Containers with more entries than this are stored as bitmaps (at this point both take 8 kilobytes)
+ONE = re.compile('1')
+
+
+# Returns the low halves stored in a container, in increasing order
+def _lows(container):
+    if (isinstance(container,array)):
+        return container
+    return [match.start() for match in ONE.finditer(bin(container)[:1:-1])]    # bin() gives '0b...' with the most significant bit first, so reverse it and drop the '0b'
+
+
+# Returns a bitmap container holding the given low halves
+def _to_bitmap(lows):
+    bits = bytearray(1 << 13)
+    for low in lows:
+        bits[low >> 3] |= 1 << (low & 7)
+    bits.reverse()                                                              # hexlify reads the most significant byte first
+    return int(hexlify(bits),16)
+
+
+# Returns the container holding the low halves in both containers, or None if
+#   there aren't any
+def _and(container_1,container_2):
+    if (isinstance(container_1,array) and isinstance(container_2,array)):
+        lows = array('H',sorted(set(container_1).intersection(container_2)))
+    elif (isinstance(container_1,array)):
+        lows = array('H',[low for low in container_1 if
+        (container_2 >> low) & 1])
+    elif (isinstance(container_2,array)):
+        lows = array('H',[low for low in container_2 if
+        (container_1 >> low) & 1])
+    else:
+        return (container_1 & container_2) or None
+    return lows or None
+
+
+class Friend_bitmap:
+
+    def __init__(self,ids = ()):
+        self.chunks = {}                                                        # High 16 bits -> container of low 16 bits
+        self.size = 0
+        self.listed = {}                                                        # High 16 bits -> the low halves in a bitmap container as an array, made the first time the container is iterated over and then kept up to date
+        self.update(ids)
+
+    def add(self,id):
+        high = id >> 16
+        low = id & 0xFFFF
+        container = self.chunks.get(high)
+        if (container is None):
+            self.chunks[high] = array('H',[low])
+        elif (isinstance(container,array)):
+            k = bisect_left(container,low)
+            if (k < len(container) and container[k] == low):
+                return
+            container.insert(k,low)
+            if (len(container) > ARRAY_SIZE):
+                self.chunks[high] = _to_bitmap(container)
+        else:
+            if ((container >> low) & 1):
+                return
+            self.chunks[high] = container | (1 << low)
+            lows = self.listed.get(high)
+            if (lows is not None):
+                lows.insert(bisect_left(lows,low),low)
+        self.size += 1
+
+    def update(self,ids):
+        if (self.chunks):
+            for id in ids:
+                self.add(id)
+            return
+        
+        # Starting from empty, the containers can be built in one go from the
+        #   sorted ids
+        ordered = sorted(set(ids))
+        start = 0
+        while (start < len(ordered)):
+            high = ordered[start] >> 16
+            end = bisect_left(ordered,(high + 1) << 16,start)
+            lows = array('H',imap((high << 16).__rsub__,ordered[start:end]))   # id - (high << 16) for each id
+            if (len(lows) > ARRAY_SIZE):
+                self.chunks[high] = _to_bitmap(lows)
+            else:
+                self.chunks[high] = lows
+            start = end
+        self.size = len(ordered)
+
+    def __contains__(self,id):
+        container = self.chunks.get(id >> 16)
+        if (container is None):
+            return False
+        low = id & 0xFFFF
+        if (isinstance(container,array)):
+            k = bisect_left(container,low)
+            return k < len(container) and container[k] == low
+        return bool((container >> low) & 1)
+
+    def __len__(self):
+        return self.size
+
+    # Returns the low halves stored with high half high, as an array
+    def _listed(self,high):
+        container = self.chunks[high]
+        if (isinstance(container,array)):
+            return container
+        lows = self.listed.get(high)
+        if (lows is None):
+            lows = self.listed[high] = array('H',_lows(container))
+        return lows
+
+    def __iter__(self):
+        return chain.from_iterable(imap((high << 16).__or__,self._listed(high))
+        for high in sorted(self.chunks))                                        # imap and chain keep the loop over the ids in C
+
+    # Intersection. With a set, returns the set of common ids, otherwise a
+    #   Friend_bitmap
+    def __and__(self,other):
+        if (not isinstance(other,Friend_bitmap)):
+            return set(id for id in other if id in self)
+        result = Friend_bitmap()
+        if (len(self.chunks) > len(other.chunks)):
+            self, other = other, self
+        for high, container in self.chunks.iteritems():
+            if (high in other.chunks):
+                common = _and(container,other.chunks[high])
+                if (common is not None):
+                    result.chunks[high] = common
+                    if (isinstance(common,array)):
+                        result.size += len(common)
+                    else:
+                        result.size += bin(common).count('1')
+        return result
+
+    __rand__ = __and__
+
+    # Checks whether the intersection is non-empty, stopping at the first
+    #   common id
+    def intersects(self,other):
+        if (not isinstance(other,Friend_bitmap)):
+            if (isinstance(other,(set,frozenset)) and self.size <= len(other)):
+                return not other.isdisjoint(self)                               # Walks our ids (in C, see __iter__), looking each up in the larger set
+            for id in other:
+                if (id in self):
+                    return True
+            return False
+        if (len(self.chunks) > len(other.chunks)):
+            self, other = other, self
+        for high, container in self.chunks.iteritems():
+            if (high in other.chunks and
+            _and(container,other.chunks[high]) is not None):
+                return True
+        return False
+
+    # Union, always returned as a Friend_bitmap
+    def __or__(self,other):
+        result = Friend_bitmap()
+        for high, container in self.chunks.iteritems():
+            if (isinstance(container,array)):
+                result.chunks[high] = array('H',container)
+            else:
+                result.chunks[high] = container
+        result.size = self.size
+        result.update(other)
+        return result
+
+    __ror__ = __or__
+
+
+# Returns friends (a set or a Friend_bitmap), replacing a set with a
+#   Friend_bitmap if it has grown larger than BITMAP_SIZE
+def compress(friends):
+    if (len(friends) > BITMAP_SIZE and isinstance(friends,set)):
+        return Friend_bitmap(friends)
+    return friends
@@ -0,0 +1,123 @@
+### Graph queries ###
+#
+# The friendship checks shared by the Fraud Detection System versions
+#
+#
+# Description:
+#
+# Every version needs to answer the same two questions about a pair of
+#   customers: do they have a friend in common, and are they connected by a
+#   chain of at most k friendships. Working these out by building sets (e.g.
+#   'len(friends_1 & friends_2) > 0', or the union of everyone's friends of
+#   friends) allocates a set as large as the answer could possibly be, which
+#   around accounts with huge numbers of friends (see README) means millions of
+#   entries for a yes or no. The functions here only ever walk the smaller
+#   side, and stop at the first connection they find.
+#
+#
+# Basic outline:
+#
+# has_common_neighbor tests two friends sets (Python sets or Friend_bitmaps,
+#   see friend_bitmap.py) for a common element, optionally ignoring some ids.
+#
+# within_distance runs a bidirectional, depth-limited search outwards from
+#   both customers. It works on anything indexed by customer id giving a
+#   friends set, such as antifraud_2.py's network dictionary or
+#   antifraud_2.extras.py's User_accounts table.
+
+
+from friend_bitmap import Friend_bitmap
+
+
+PAIR_FACTOR = 16                                                                # Roughly how many times faster intersecting sets is than walking the same number of friendships in within_distance's loop
+
+
+# Function checking whether two friends sets have an id in common, other than
+#   those in exclude. Inputs: friends_1 and friends_2 (each a set or a
+#   Friend_bitmap), and optionally a set of ids to ignore. Returns True or False
+def has_common_neighbor(friends_1,friends_2,exclude = None):
+    if (not exclude):
+        if (isinstance(friends_1,Friend_bitmap)):
+            return friends_1.intersects(friends_2)
+        if (isinstance(friends_2,Friend_bitmap)):
+            return friends_2.intersects(friends_1)
+        return not friends_1.isdisjoint(friends_2)                              # isdisjoint walks the smaller set and stops at the first common element
+
+    if (len(friends_1) > len(friends_2)):
+        friends_1, friends_2 = friends_2, friends_1
+    for id in friends_1:
+        if (id in friends_2 and not (id in exclude)):
+            return True
+    return False
+
+
+# Function checking whether two clients are connected by a chain of at most
+#   max_distance friendships. Inputs: network net (indexed by id, giving
+#   friends sets), integer ids id_1 and id_2 of the two participants, integer
+#   max_distance, and optionally a list trace, to which the size of each
+#   frontier expanded is appended (see phase_profile.py). Returns True or
+#   False.
+#
+# This searches outwards from both participants at once, always expanding
+#   whichever side has the smaller frontier (measured by the number of
+#   friendships it would have to walk), and stops as soon as the two searches
+#   meet. When two steps are left and both frontiers are small (typically an
+#   account with huge numbers of friends on each side), rather than walking
+#   one side's next frontier, it intersects the friends sets of each pair of
+#   people across the two frontiers, which finds the same chains far quicker.
+def within_distance(net,id_1,id_2,max_distance,trace = None):
+    seen_1 = set([id_1])                                                        # Everyone reached so far from id_1's side
+    seen_2 = set([id_2])                                                        # Everyone reached so far from id_2's side
+    frontier_1 = [id_1]                                                         # The people most recently reached from each side
+    frontier_2 = [id_2]
+    cost_1 = len(net[id_1])                                                     # The number of friendships that expanding each frontier would walk
+    cost_2 = len(net[id_2])
+    depth = 0                                                                   # Total length of the chains searched so far (both sides combined)
+
+    while (depth < max_distance and frontier_1 and frontier_2):
+        # Always expand the cheaper side. Swapping the sides is harmless since
+        #   friendships are reciprocal
+        if (cost_1 > cost_2):
+            seen_1, seen_2 = seen_2, seen_1
+            frontier_1, frontier_2 = frontier_2, frontier_1
+            cost_1, cost_2 = cost_2, cost_1
+        if (trace is not None):
+            trace.append(len(frontier_1))
+
+        # With two steps left, a chain exists if someone in frontier_1 has a
+        #   friend already reached from the other side, or a friend in common
+        #   with someone in frontier_2. Checking this pair by pair takes at
+        #   most len(frontier_2) * cost_1 steps of set intersection, so it is
+        #   only done when that's cheaper than walking frontier_1's friends
+        if (depth + 2 == max_distance and len(frontier_2) <= PAIR_FACTOR and
+        len(frontier_1) * len(frontier_2) <= cost_1):
+            for person in frontier_1:
+                friends = net[person]
+                if (has_common_neighbor(friends,seen_2)):                       # A chain one step shorter
+                    return True
+                for other in frontier_2:
+                    if (has_common_neighbor(friends,net[other])):
+                        return True
+            return False
+
+        depth += 1
+        if (depth == max_distance):                                             # On the final step nobody new needs to be recorded, so just check whether anyone's friends meet the other side (which compressed bitmaps do far faster than listing them)
+            for person in frontier_1:
+                if (has_common_neighbor(net[person],seen_2)):
+                    return True
+            return False
+
+        next_frontier = []
+        next_cost = 0
+        for person in frontier_1:
+            for friend in net[person]:
+                if (friend in seen_2):                                          # The two searches have met, so a short enough chain exists
+                    return True
+                if (not (friend in seen_1)):
+                    seen_1.add(friend)
+                    next_frontier.append(friend)
+                    next_cost += len(net[friend])
+        frontier_1 = next_frontier
+        cost_1 = next_cost
+
+    return False
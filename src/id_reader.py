@@ -0,0 +1,243 @@
+### Fast id column reader ###
+#
+# Reads just the id1 and id2 columns of a payments file, in bulk
+#
+#
+# Description:
+#
+# Reading the batch file with csv.DictReader builds a dictionary for every row,
+#   including the time, amount and message fields, even though building the
+#   network only needs the two ids. This module skips all of that: the file is
+#   read in large binary chunks, a single regular expression pulls the id
+#   columns out of every line of the chunk at once, and the ids are converted
+#   to integers in one go (by handing them to the json module as one long list,
+#   which is much faster than calling int() on each one). The ids are returned
+#   as two arrays of 64 bit integers, where ids_1[k] and ids_2[k] are the
+#   participants of the k-th valid row. This is more than 5 times faster than
+#   csv.DictReader.
+#
+# Because the file is split on '\n' only, a '\r' in a message doesn't break its
+#   row in two (see filecleaner.py), and since nothing after the id columns is
+#   looked at, neither do extra commas in the message.
+#
+# Rows whose ids aren't integers are skipped with the same error message as
+#   the antifraud codes print, only now the row numbers always match the file.
+
+
+import os
+import re
+import json
+import argparse
+import multiprocessing
+from array import array
+from itertools import chain
+
+
+CHUNK_SIZE = 1 << 22                                                            # Bytes read at a time
+
+
+# Class holding the regular expressions for a particular file's layout
+class Id_columns:
+
+    # Builds the regular expression matching the start of a row, up to and
+    #   including the id columns. Input: the header line of the file
+    def __init__(self,header):
+        names = [name.strip() for name in header.split(',')]
+        if (not ('id1' in names and 'id2' in names)):
+            raise ValueError("Header does not contain id1 and id2 columns: " +
+            header.strip())
+        self.column_1 = names.index('id1')
+        self.column_2 = names.index('id2')
+        first = min(self.column_1,self.column_2)
+        last = max(self.column_1,self.column_2)
+
+        fields = []
+        for column in xrange(last + 1):
+            if (column == first and last == first + 1):                         # If the ids are next to each other (as in the challenge data) a single group captures both, which is faster to convert
+                fields.append(r' *(-?\d+ *, *-?\d+) *')
+                break
+            elif (column == first or column == last):
+                fields.append(r' *(-?\d+) *')
+            else:
+                fields.append(r'[^,\n]*')
+        self.pattern = re.compile('(?:' + ','.join(fields) + r'(?=,|\r?\n))?' +
+        r'[^\n]*\n')                                                            # The ids are optional, so that every line gives exactly one match (an empty one if its ids aren't integers). Matching the rest of the line too saves the regular expression engine from trying to match at every character of the message
+
+    # Converts the ids in a block of complete lines, appending them to ids_1
+    #   and ids_2. Inputs: the text, the row number of its first line (for
+    #   error messages), a label naming the file and the two arrays. If a list
+    #   bad_rows is given, the numbers of rows that couldn't be read are added
+    #   to it instead of being printed
+    def parse(self,text,first_row,label,ids_1,ids_2,bad_rows = None):
+        if (not text.endswith('\n')):
+            text += '\n'
+        found = self.pattern.findall(text)                                      # found[k] holds the ids on the k-th line of text
+        if (found and not isinstance(found[0],str)):                            # If the ids weren't next to each other, join each pair of groups
+            found = [','.join(pair) if pair[0] else '' for pair in found]
+
+        bad = found.count('')
+        if (bad):
+            joined = ','.join(filter(None,found))
+        else:
+            joined = ','.join(found)
+        if (joined):
+            try:
+                both = array('l',json.loads('[' + joined + ']'))
+            except ValueError:                                                  # e.g. ids with leading zeros, which json won't accept
+                both = array('l',[int(value) for value in joined.split(',')])
+            if (self.column_1 < self.column_2):
+                ids_1.extend(both[0::2])
+                ids_2.extend(both[1::2])
+            else:
+                ids_1.extend(both[1::2])
+                ids_2.extend(both[0::2])
+
+        # Report the rows that didn't match
+        if (bad):
+            lines = text.split('\n')
+            k = -1
+            for i in xrange(bad):
+                k = found.index('',k + 1)
+                if (lines[k].strip() == ''):                                    # Blank lines are skipped silently, as csv.DictReader does
+                    continue
+                if (bad_rows is not None):
+                    bad_rows.append(first_row + k)
+                    continue
+                print "(In %s) id field does not contain an integer! " % \
+                label + "Ignoring this entry... row number is:\n", first_row + k # Outputs the string for debugging
+
+
+# Yields the complete lines between byte positions start and end of file path,
+#   in blocks of roughly chunk_size bytes, along with the row number of each
+#   block's first line. start must be the beginning of a line
+def line_blocks(path,start,end,first_row,chunk_size = CHUNK_SIZE):
+    row_number = first_row
+    with open(path,'rb') as payments:
+        payments.seek(start)
+        remainder = ''                                                          # The incomplete line at the end of the last chunk
+        position = start
+        while (position < end):
+            chunk = payments.read(min(chunk_size,end - position))
+            if (not chunk):
+                break
+            position += len(chunk)
+            text = remainder + chunk
+            cut = text.rfind('\n') + 1
+            remainder = text[cut:]
+            if (cut):
+                yield text[:cut], row_number
+                row_number += text.count('\n',0,cut)
+        if (remainder.strip()):                                                 # The last line of the file may not end in a newline
+            yield remainder, row_number
+
+
+# Reads the id columns of the complete lines between byte positions start and
+#   end of payments file path, appending them to ids_1 and ids_2. start must
+#   be the beginning of a line. Other inputs are as for Id_columns.parse.
+#   Returns the number of lines read
+def read_range(path,columns,start,end,first_row,label,ids_1,ids_2,
+bad_rows = None,chunk_size = CHUNK_SIZE):
+    lines = 0
+    for text, row_number in line_blocks(path,start,end,first_row,chunk_size):
+        columns.parse(text,row_number,label,ids_1,ids_2,bad_rows)
+        lines = row_number - first_row + text.count('\n') + \
+        (not text.endswith('\n'))
+    return lines
+
+
+# Yields the id columns of payments file path one block at a time, as a pair
+#   of arrays, for reading a file too large (or too slow to arrive) to read in
+#   one go. label names the file in error messages
+def iter_id_blocks(path,label = 'stream_payments',chunk_size = CHUNK_SIZE):
+    with open(path,'rb') as payments:
+        columns = Id_columns(payments.readline())
+        start = payments.tell()
+    for text, row_number in line_blocks(path,start,os.path.getsize(path),2,
+    chunk_size):
+        ids_1 = array('l')
+        ids_2 = array('l')
+        columns.parse(text,row_number,label,ids_1,ids_2)
+        yield ids_1, ids_2
+
+
+# Reads the id columns of payments file path. label names the file in error
+#   messages. Returns the arrays ids_1 and ids_2
+def read_ids(path,label = 'batch_payments',chunk_size = CHUNK_SIZE):
+    ids_1 = array('l')
+    ids_2 = array('l')
+    with open(path,'rb') as payments:
+        columns = Id_columns(payments.readline())
+        start = payments.tell()
+    read_range(path,columns,start,os.path.getsize(path),2,label,ids_1,ids_2,    # Row numbering starts at 2 so that row numbers line up with files, which contain header line
+    chunk_size = chunk_size)
+    return ids_1, ids_2
+
+
+# Worker for read_ids_parallel. Reads one range of the file and returns the
+#   ids as strings (which are much quicker to send back to the main process
+#   than arrays of numbers), the number of lines read and the rows that
+#   couldn't be read, numbered from the start of the range
+def _read_range_job(job):
+    path, header, start, end = job
+    ids_1 = array('l')
+    ids_2 = array('l')
+    bad_rows = []
+    lines = read_range(path,Id_columns(header),start,end,0,'',ids_1,ids_2,
+    bad_rows)
+    return ids_1.tostring(), ids_2.tostring(), lines, bad_rows
+
+
+# Argument type of the --processes options: a number of worker processes for
+#   read_ids_parallel, with 0 meaning one per CPU
+def process_count(text):
+    processes = int(text)
+    if (processes < 0):
+        raise argparse.ArgumentTypeError("%d is not a number of processes" %
+        processes)
+    return processes
+
+
+# The same as read_ids, but the file is split into byte ranges (each starting
+#   at the beginning of a line), which are read by a pool of worker processes.
+#   The results are put back together in order, so the arrays are exactly the
+#   same as read_ids gives. processes is the number of workers (by default one
+#   per CPU)
+def read_ids_parallel(path,label = 'batch_payments',processes = None):
+    if (processes is None):
+        processes = multiprocessing.cpu_count()
+    size = os.path.getsize(path)
+
+    # Split the file into a few ranges per worker, so that one slow range
+    #   doesn't hold everything up
+    with open(path,'rb') as payments:
+        header = payments.readline()
+        boundaries = [payments.tell()]
+        ranges = processes * 4
+        for k in xrange(1,ranges):
+            position = boundaries[0] + k * (size - boundaries[0]) // ranges
+            payments.seek(max(position - 1,boundaries[-1]))
+            payments.readline()                                                 # Skip to the start of the next line
+            boundaries.append(max(payments.tell(),boundaries[-1]))
+        boundaries.append(size)
+    jobs = [(path,header,boundaries[k],boundaries[k+1]) for k in
+    xrange(ranges) if boundaries[k] < boundaries[k+1]]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(_read_range_job,jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+    # Merge the ranges in order
+    ids_1 = array('l')
+    ids_2 = array('l')
+    row_number = 2
+    for part_1, part_2, lines, bad_rows in results:
+        ids_1.fromstring(part_1)
+        ids_2.fromstring(part_2)
+        for bad_row in bad_rows:
+            print "(In %s) id field does not contain an integer! " % label +\
+            "Ignoring this entry... row number is:\n", row_number + bad_row     # Outputs the string for debugging
+        row_number += lines
+    return ids_1, ids_2
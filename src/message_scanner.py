@@ -0,0 +1,122 @@
+### Message scanner ###
+#
+# Checks payment messages against a list of watched regular expressions in a
+#   single pass, for Extra 7 of antifraud_2.extras.py
+#
+#
+# Description:
+#
+# Extra 7 flags the participants of a transaction once for every watched
+#   pattern its message matches. Calling re.search for each pattern on every
+#   message costs a regex cache lookup and a scan of the message per pattern,
+#   and the list only grows. Instead, the patterns are compiled once, and also
+#   combined into a single alternation ('(?:p1)|(?:p2)|...'), which finds out
+#   whether any of them matches in one scan. Since almost no messages match
+#   anything, the individual patterns only need to be tried on the few that
+#   do, to find out exactly which ones hit. Patterns which would mean
+#   something else inside the alternation (those with inline flags like
+#   '(?i)', or back references, see STANDALONE) are left out of it and tried
+#   on every message. The results are the same as searching for each pattern
+#   separately.
+#
+# The patterns can also be read from a file, one per line (blank lines and
+#   lines starting with '#' are skipped), which is checked for changes while
+#   the stream file is being read, so patterns can be added without
+#   restarting. If the new patterns don't compile, the old ones are kept.
+#
+#
+# Basic outline:
+#
+# Message_scanner(patterns).hits(message) returns the patterns message
+#   matches, each once even if it is listed more than once. Watch_list(path,interval).scanner() returns a Message_scanner for
+#   the patterns currently in file path, checking it for changes at most once
+#   every interval seconds.
+
+
+import os
+import re
+import sys
+import time
+
+
+# Matches the parts of a pattern which would change meaning inside the combined
+#   alternation: global inline flags such as '(?i)' or '(?x)', which apply to
+#   the whole alternation, and back references or conditionals by group
+#   number or name, which would refer to the other patterns' groups
+STANDALONE = re.compile(r'\(\?[aiLmsux]+\)|\\[1-9]|\(\?P=|\(\?\(')
+
+
+# Class matching messages against a list of regular expressions
+class Message_scanner:
+
+    def __init__(self,patterns):
+        seen = set()
+        self.patterns = [pattern for pattern in patterns if not (pattern in
+        seen or seen.add(pattern))]                                             # Each pattern once, in its first position, as the original set of bad words held them
+        self.compiled = [re.compile(pattern) for pattern in self.patterns]      # Raises re.error for invalid patterns
+        self.standalone = [STANDALONE.search(pattern) is not None for pattern
+        in self.patterns]                                                       # Patterns kept out of the combined alternation, and tried on every message instead
+        combinable = [pattern for pattern, alone in zip(self.patterns,
+        self.standalone) if not alone]
+        try:
+            self.combined = re.compile('|'.join('(?:%s)' % pattern for pattern
+            in combinable))
+        except re.error:
+            self.combined = None                                                # E.g. patterns repeating a group name, which can't be combined; each pattern is then tried on every message
+        if (not combinable):
+            self.search = lambda message: None                                  # An empty alternation would match everything
+        elif (self.combined is None):
+            self.search = lambda message: True
+        else:
+            self.search = self.combined.search
+        if (not any(self.standalone)):
+            self.standalone = None
+
+    # Returns the list of patterns that message matches (empty for most
+    #   messages)
+    def hits(self,message):
+        if (not self.search(message)):
+            if (self.standalone is None):
+                return ()
+            return [pattern for pattern, compiled, alone in zip(self.patterns,
+            self.compiled,self.standalone) if alone and compiled.search(message)]
+        return [pattern for pattern, compiled in zip(self.patterns,
+        self.compiled) if compiled.search(message)]
+
+
+# Function reading the patterns in file path. Returns a list of strings
+def read_patterns(path):
+    with open(path) as f:
+        lines = [line.rstrip('\r\n') for line in f]
+    return [line for line in lines if line.strip() and not
+    line.lstrip().startswith('#')]
+
+
+# Class keeping a Message_scanner up to date with a patterns file
+class Watch_list:
+
+    def __init__(self,path,interval = 1.0):
+        self.path = path
+        self.interval = interval
+        self.modified = os.stat(path).st_mtime
+        self.current = Message_scanner(read_patterns(path))                     # Errors in the initial file are fatal
+        self.next_check = time.time() + interval
+
+    # Returns the current Message_scanner, reloading the file first if it has
+    #   changed since it was last read
+    def scanner(self):
+        now = time.time()
+        if (now < self.next_check):
+            return self.current
+        self.next_check = now + self.interval
+        try:
+            modified = os.stat(self.path).st_mtime
+            if (modified != self.modified):
+                self.modified = modified
+                self.current = Message_scanner(read_patterns(self.path))
+                sys.stderr.write("Reloaded %d watched patterns from %s\n" %
+                (len(self.current.patterns),self.path))
+        except (OSError,IOError,re.error) as error:
+            sys.stderr.write("Keeping the previous watched patterns, " +
+            "couldn't reload %s: %s\n" % (self.path,error))
+        return self.current
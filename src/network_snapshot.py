@@ -0,0 +1,203 @@
+### Network snapshots ###
+#
+# Saves the network built from the batch file, so it doesn't have to be rebuilt
+#   every time the Fraud Detection System starts
+#
+#
+# Description:
+#
+# Reading the batch file is by far the slowest part of starting any version of
+#   the Fraud Detection System, and the network it produces is the same every
+#   time. Running a version with '--snapshot-out FILE' saves the network to a
+#   binary file after the batch file has been read. Later runs with
+#   '--snapshot-in FILE' load it back instead of reading the batch file at all.
+#
+# To make sure a snapshot isn't accidentally used with a different batch file,
+#   the size, modification time and SHA-1 checksum of the batch file are saved
+#   along with it. When loading, if the size or time don't match, the checksum
+#   is recalculated and the snapshot is refused if it is different.
+#
+#
+# File format:
+#
+# The file starts with a fixed header (see HEADER), followed by the number of
+#   entries in each 'layer'. A layer is one set of relationships per customer:
+#   version 2 has a single layer (friends), version 1.5 has two (friends and
+#   mutual friend counts, see layer_from_counts) and version 1 has four. The
+#   data follows, each section starting on an 8 byte boundary:
+#       ids        int64[n_users]        Customer ids, in dense index order
+#   and then for each layer:
+#       offsets    int64[n_users + 1]    Start of each person's entries
+#       neighbors  int32[n_entries]      Dense indices of everyone's entries,
+#                                        sorted, one person after another
+#   This is the same layout as Compact_network uses (see compact_network.py),
+#   so with --compact the arrays are used straight from the mapped file without
+#   being copied. Numbers are stored in the machine's native byte order.
+
+
+import os
+import mmap
+import ctypes
+import struct
+import hashlib
+from array import array
+from itertools import izip, groupby
+
+
+MAGIC = 'PAYMOSNP'
+VERSION = 2                                                                     # Version 1 stored the ids as int32
+HEADER = struct.Struct('<8sI16sQQd20sI')                                        # magic, version, kind, n_users, batch size, batch modification time, batch SHA-1, n_layers
+LAYER = struct.Struct('<Q')                                                     # Number of entries in a layer
+
+
+class Snapshot_error(Exception):
+    pass
+
+
+# Returns the size, modification time and SHA-1 checksum of file path
+def batch_fingerprint(path,checksum=True):
+    info = os.stat(path)
+    digest = ''
+    if (checksum):
+        sha = hashlib.sha1()
+        with open(path,'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20),''):
+                sha.update(chunk)
+        digest = sha.digest()
+    return info.st_size, info.st_mtime, digest
+
+
+# Converts one set per customer into a layer. Inputs: array of customer ids,
+#   and an iterable giving the set of customer ids related to each of them, in
+#   the same order. Returns the offsets and neighbors arrays
+def layer_from_sets(ids,sets):
+    index = dict(izip(ids,xrange(len(ids))))
+    offsets = array('l',[0])
+    neighbors = array('i')
+    for related in sets:
+        neighbors.extend(sorted([index[id] for id in related]))
+        offsets.append(len(neighbors))
+    return offsets, neighbors
+
+
+# The reverse of layer_from_sets. Yields the set of customer ids related to
+#   each customer, in the order of ids
+def sets_from_layer(ids,offsets,neighbors):
+    lookup = ids.__getitem__
+    for i in xrange(len(ids)):
+        yield set(map(lookup,neighbors[offsets[i]:offsets[i+1]]))
+
+
+# Like layer_from_sets, but for a dictionary per customer, mapping related
+#   customer ids to (positive integer) counts. Each id is stored as many times
+#   as its count
+def layer_from_counts(ids,counts):
+    return layer_from_sets(ids,([id for id, count in related.iteritems() for k in
+    xrange(count)] for related in counts))
+
+
+# The reverse of layer_from_counts. Yields the dictionary of counts for each
+#   customer, in the order of ids
+def counts_from_layer(ids,offsets,neighbors):
+    lookup = ids.__getitem__
+    for i in xrange(len(ids)):
+        yield dict((lookup(j), len(list(repeats))) for j, repeats in
+        groupby(neighbors[offsets[i]:offsets[i+1]]))
+
+
+def _pad(f):
+    f.write('\0' * (-f.tell() % 8))
+
+def _write_array(f,values,c_type):
+    _pad(f)
+    if (isinstance(values,array) and values.itemsize == ctypes.sizeof(c_type)):
+        values.tofile(f)
+    else:
+        f.write(buffer((c_type * len(values))(*values)))
+
+
+# Saves a snapshot. Inputs: snapshot path, the kind of network (e.g. 'v2', so
+#   that one version can't load another's snapshot), path of the batch file it
+#   was built from, array of customer ids and a list of (offsets, neighbors)
+#   layers. The file is written under a temporary name and then renamed, so an
+#   interrupted save never leaves a broken snapshot behind
+def save_snapshot(path,kind,batch_in,ids,layers):
+    size, mtime, digest = batch_fingerprint(batch_in)
+    temp_path = path + '.tmp'
+    with open(temp_path,'wb') as f:
+        f.write(HEADER.pack(MAGIC,VERSION,kind,len(ids),size,mtime,digest,
+        len(layers)))
+        for offsets, neighbors in layers:
+            f.write(LAYER.pack(len(neighbors)))
+        _write_array(f,ids,ctypes.c_int64)
+        for offsets, neighbors in layers:
+            _write_array(f,offsets,ctypes.c_int64)
+            _write_array(f,neighbors,ctypes.c_int32)
+    os.rename(temp_path,path)
+
+
+# Loads a snapshot saved by save_snapshot. The file is memory-mapped, and the
+#   offsets and neighbors arrays returned are views of the mapping rather than
+#   copies, so loading takes almost no time regardless of the network's size
+#   (the operating system reads pages in as they are used). The mapping is
+#   copy-on-write, so changes are never written back to the file. Returns the
+#   array of customer ids and the list of layers. Raises Snapshot_error if the
+#   file can't be read, is truncated, isn't a snapshot of the right kind or
+#   doesn't match batch_in
+def load_snapshot(path,kind,batch_in):
+    try:
+        with open(path,'rb') as f:
+            mapped = mmap.mmap(f.fileno(),0,access = mmap.ACCESS_COPY)
+    except (EnvironmentError,ValueError) as error:                              # mmap raises ValueError for an empty file
+        raise Snapshot_error("Can't read snapshot %s: %s" % (path,error))
+
+    try:
+        (magic, version, saved_kind, n_users, size, mtime, digest,
+        n_layers) = HEADER.unpack_from(mapped,0)
+    except struct.error:
+        raise Snapshot_error("%s is not a network snapshot" % path)
+    if (magic != MAGIC or version != VERSION):
+        raise Snapshot_error("%s is not a network snapshot" % path)
+    if (saved_kind.rstrip('\0') != kind):
+        raise Snapshot_error("%s is a snapshot of a %s network, not %s" %
+        (path,saved_kind.rstrip('\0'),kind))
+
+    # Only recalculate the checksum if the batch file looks like it changed
+    try:
+        current = batch_fingerprint(batch_in,checksum = False)
+        if (current[0] != size or current[1] != mtime):
+            if (batch_fingerprint(batch_in)[2] != digest):
+                raise Snapshot_error("%s was not made from %s" % (path,
+                batch_in))
+    except EnvironmentError as error:
+        raise Snapshot_error("Can't check snapshot %s against %s: %s" % (path,
+        batch_in,error))
+
+    position = HEADER.size
+    layer_sizes = []
+    try:
+        for i in xrange(n_layers):
+            layer_sizes.append(LAYER.unpack_from(mapped,position)[0])
+            position += LAYER.size
+    except struct.error:
+        raise Snapshot_error("%s is truncated" % path)
+
+    def view(c_type,count):
+        start = position + (-position % 8)
+        if (start + count * ctypes.sizeof(c_type) > len(mapped)):
+            raise Snapshot_error("%s is truncated" % path)
+        return (c_type * count).from_buffer(mapped,start), \
+        start + count * ctypes.sizeof(c_type)
+
+    id_view, position = view(ctypes.c_int64,n_users)
+    ids = array('l')                                                            # The ids are copied, since new customers are appended to them
+    if (ids.itemsize == ctypes.sizeof(ctypes.c_int64)):
+        ids.fromstring(buffer(id_view))
+    else:
+        ids.extend(id_view)
+    layers = []
+    for n_entries in layer_sizes:
+        offsets, position = view(ctypes.c_int64,n_users + 1)
+        neighbors, position = view(ctypes.c_int32,n_entries)
+        layers.append((offsets,neighbors))
+    return ids, layers
@@ -0,0 +1,32 @@
+### PayMo scoring package ###
+#
+# A single entry point for the Fraud Detection System versions
+#
+#
+# Description:
+#
+# The only real difference between versions 1, 1.5 and 2 is how the network
+#   is stored and searched. This package holds each version's network and
+#   checks (its 'strategy') and the reading and writing they all share.
+#   antifraud_1.py, antifraud_1.5.py and antifraud_2.py are command lines over
+#   it, and any version can also be run with:
+#
+#   python -m paymo score batch.csv stream.csv out1 out2 out3 --strategy v2
+#
+#   (with src on the Python path, e.g. by running it from src or setting
+#   PYTHONPATH=src). The output files are the same as the corresponding
+#   script's.
+#
+#
+# Basic outline:
+#
+# strategies.py holds one class per version (its 'strategy'), which builds the
+#   network from the batch file's ids, checks transactions and records new
+#   friendships. New strategies are added to STRATEGIES there.
+#
+# pipeline.py reads the files (see id_reader.py), hands each transaction to the
+#   strategy and writes the results from a separate thread (see
+#   verdict_writer.py). It also defines the arguments every command line
+#   takes.
+#
+# __main__.py is the command line.
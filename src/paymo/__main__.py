@@ -0,0 +1,37 @@
+### PayMo command line ###
+#
+# Usage: python -m paymo score batch_in stream_in out_1 out_2 out_3
+#   [--strategy NAME] [--processes N] [--hub-threshold N] [--compact]
+#   [--snapshot-out FILE] [--snapshot-in FILE] [--clean]
+#
+# Runs the Fraud Detection System version chosen with --strategy ('v1', 'v1.5'
+#   or 'v2', the default) on the batch and stream files, writing the same
+#   three output files as the corresponding antifraud script (which runs the
+#   same strategy through the same pipeline). See __init__.py.
+
+
+import argparse
+
+from paymo.strategies import STRATEGIES
+from paymo.pipeline import add_arguments, run
+
+
+parser = argparse.ArgumentParser(prog = 'python -m paymo', description =
+"PayMo Fraud Detection System")
+commands = parser.add_subparsers(dest = 'command')
+score = commands.add_parser('score', help = "Check every transaction of a " +
+"stream file against the network built from a batch file")
+add_arguments(score)
+score.add_argument('--strategy', choices = sorted(STRATEGIES), default = 'v2',
+help = "Which version's network and checks to use (default: %(default)s)")
+score.add_argument('--hub-threshold', metavar = 'N', type = int,
+default = 100, help = "v1.5 only: clients with more than N friends are " +
+"'hubs' (see two_hop_index.py, default: %(default)s)")
+score.add_argument('--compact', action = 'store_true', help = "v2 only: " +
+"store the network in flat integer arrays (see compact_network.py)")
+args = parser.parse_args()
+
+if (args.compact and args.strategy != 'v2'):
+    score.error("--compact only applies to --strategy v2")
+
+run(STRATEGIES[args.strategy](args),args)
@@ -0,0 +1,115 @@
+### Scoring pipeline ###
+#
+# The command line, reading and writing shared by every strategy
+#
+#
+# Description:
+#
+# The batch file's ids are read in bulk (see id_reader.py, optionally with
+#   several processes) and handed to the strategy's build(), or the network
+#   is loaded from a snapshot instead. The stream file is then read a block of
+#   rows at a time; each row is checked and its friendship added, in order,
+#   and each block's result codes are written to the three output files by a
+#   Verdict_writer thread (see verdict_writer.py) while the next block is
+#   checked. Rows whose ids aren't integers are reported and skipped, and the
+#   files are split on '\n' only, so '\r' characters never break a row.
+#
+# antifraud_1.py, antifraud_1.5.py, antifraud_2.py and python -m paymo are all
+#   command lines over this: add_arguments gives them the same arguments, and
+#   run (or load_network and score_stream) does the rest.
+
+
+import sys
+
+from id_reader import read_ids, read_ids_parallel, iter_id_blocks, \
+process_count
+from verdict_writer import Verdict_writer
+from network_snapshot import Snapshot_error
+
+
+# The line written to each output file for each result code (see
+#   strategies.py): feature k's file says 'unverified' if bit k - 1 is set
+FEATURE_LINES = tuple(tuple('unverified\n' if (code >> feature) & 1 else
+'trusted\n' for code in xrange(8)) for feature in xrange(3))
+
+# The verdicts of features 1, 2 and 3 for each result code, e.g. for the
+#   replies of scoring_server.py
+VERDICTS = tuple(tuple(lines[code][:-1] for lines in FEATURE_LINES) for code
+in xrange(8))
+
+
+# Adds the arguments every command line takes to argparse parser parser. If
+#   optional is set, the stream file and output files may be left out
+def add_arguments(parser,optional = False):
+    nargs = '?' if optional else None
+    parser.add_argument('batch_in', help = "Batch input payments")
+    parser.add_argument('stream_in', nargs = nargs, help = "Stream input " +
+    "payments")
+    parser.add_argument('out_1', nargs = nargs, help = "Feature 1 output")
+    parser.add_argument('out_2', nargs = nargs, help = "Feature 2 output")
+    parser.add_argument('out_3', nargs = nargs, help = "Feature 3 output")
+    parser.add_argument('--snapshot-out', metavar = 'FILE', help = "After " +
+    "reading the batch file, save the network to FILE (see " +
+    "network_snapshot.py)")
+    parser.add_argument('--snapshot-in', metavar = 'FILE', help = "Load the " +
+    "network from FILE instead of reading the batch file. batch_in must " +
+    "still be the file the snapshot was made from")
+    parser.add_argument('--processes', metavar = 'N', type = process_count,
+    help = "Read the batch file with N worker processes (0 for one per " +
+    "CPU). The network is the same as when reading it in a single process")
+    parser.add_argument('--clean', action = 'store_true', help = "Accepted " +
+    "for older command lines. The files are always split on '\\n' only, so " +
+    "'\\r' characters never break a row (see id_reader.py)")
+
+
+# Builds strategy's network from batch file batch_in, reading it with
+#   processes worker processes if given (0 for one per CPU)
+def load_batch(strategy,batch_in,processes = None):
+    if (processes is None):
+        ids_1, ids_2 = read_ids(batch_in,'batch_payments')
+    else:
+        ids_1, ids_2 = read_ids_parallel(batch_in,'batch_payments',
+        processes or None)
+    strategy.build(ids_1,ids_2)
+
+
+# Gives strategy its network, as requested by the parsed command line args:
+#   loaded from the snapshot args.snapshot_in, or built from the batch file
+#   args.batch_in, and saved to args.snapshot_out. Exits with an error message
+#   if the snapshot can't be loaded
+def load_network(strategy,args):
+    if (args.snapshot_in):
+        try:
+            strategy.load(args.snapshot_in,args.batch_in)
+        except Snapshot_error as error:
+            sys.exit(str(error))
+    else:
+        load_batch(strategy,args.batch_in,args.processes)
+    if (args.snapshot_out):
+        strategy.save(args.snapshot_out,args.batch_in)
+
+
+# Checks every transaction of stream file stream_in with strategy, adding each
+#   one's friendship after it is checked, and writes the results to the three
+#   files in out_paths
+def score_stream(strategy,stream_in,out_paths):
+    writer = Verdict_writer(out_paths,lines = FEATURE_LINES)
+    writer.start()
+    for ids_1, ids_2 in iter_id_blocks(stream_in,'stream_payments'):
+        check = strategy.check                                                  # Looked up once per block; strategies may replace these in build()
+        add = strategy.add
+        codes = bytearray(len(ids_1))
+        for k in xrange(len(ids_1)):
+            id_1 = ids_1[k]
+            id_2 = ids_2[k]
+            codes[k] = check(id_1,id_2)
+            add(id_1,id_2)
+        writer.put(codes)
+    writer.close()                                                              # Waits for the last blocks to be written
+
+
+# Runs strategy as requested by the parsed command line args (see
+#   add_arguments)
+def run(strategy,args):
+    load_network(strategy,args)
+    score_stream(strategy,args.stream_in,(args.out_1,args.out_2,args.out_3))
@@ -0,0 +1,262 @@
+### Scoring strategies ###
+#
+# The network storage and search of each Fraud Detection System version,
+#   behind a common interface
+#
+#
+# Description:
+#
+# A strategy holds the network and answers three calls:
+#
+#   build(ids_1,ids_2)  builds the network from the batch file's ids (two
+#                       arrays, as given by read_ids in id_reader.py)
+#   check(id_1,id_2)    returns the result code of a new transaction
+#   add(id_1,id_2)      records the transaction's friendship
+#
+# and two more for --snapshot-out and --snapshot-in (see network_snapshot.py):
+#
+#   save(path,batch_in) saves the network built from batch file batch_in
+#   load(path,batch_in) loads it back instead of calling build()
+#
+# Snapshots are saved in the same format, and with the same kind, as the
+#   corresponding script's, so either can load the other's.
+#
+# A result code has bit k set if feature k + 1 flags the transaction as
+#   'unverified' (so 0 means trusted by all three features, 7 unverified by
+#   all three). Strategies are created with the parsed command line options,
+#   and read the ones that apply to them.
+#
+#
+# Basic outline:
+#
+# Reach_strategy (v1) uses the bitmaps of reach_bitmaps.py, Two_hop_strategy
+#   (v1.5) the two-hop index of two_hop_index.py, and Search_strategy (v2) the
+#   friends sets (or Compact_network) and searches of graph_query.py.
+#   STRATEGIES maps the names used on the command line to the classes.
+#
+# antifraud_1.py, antifraud_1.5.py and antifraud_2.py each run their version's
+#   strategy through pipeline.py. antifraud_2.py's --serve and --two-hop-cache
+#   use the strategy too, answering a scoring server's clients with its checks
+#   and replacing its fourth-order check and friendship update with cached
+#   versions (see Search_strategy). antifraud_2.extras.py writes different
+#   files altogether, and has its own network (see User_accounts there).
+
+
+from array import array
+from itertools import izip
+
+from reach_bitmaps import Reach_network, members, mask_of
+from two_hop_index import Unique_id, merge, within_two, share_second_order
+from friend_bitmap import compress
+from graph_query import has_common_neighbor, within_distance
+from compact_network import Compact_network
+from network_snapshot import save_snapshot, load_snapshot, layer_from_sets, \
+sets_from_layer, layer_from_counts, counts_from_layer
+
+
+DEGREE_CODES = (0,1,3,7)                                                        # The result code for friends, second-order friends, third- or fourth-order friends and anyone further
+
+
+# Mixin for the strategies below, which must define check, add, save and load.
+#   It only stores the options and builds the network by adding the batch
+#   file's friendships one at a time, so it can't be used on its own
+class Strategy:
+
+    def __init__(self,options):
+        if (self.__class__ is Strategy):
+            raise TypeError("Strategy can't be used on its own, use one of " +
+            "STRATEGIES")
+        self.options = options
+
+    def build(self,ids_1,ids_2):
+        for id_1, id_2 in izip(ids_1,ids_2):
+            self.add(id_1,id_2)
+
+
+# Version 1: bitmaps of everyone within one to four friendships of each client
+class Reach_strategy(Strategy):
+
+    def __init__(self,options):
+        Strategy.__init__(self,options)
+        self.reach = Reach_network()
+
+    def check(self,id_1,id_2):
+        person_1 = self.reach.add_client(id_1)
+        person_2 = self.reach.add_client(id_2)
+        if (person_1.knows(person_2,1)):
+            return DEGREE_CODES[0]
+        elif (person_1.knows(person_2,2)):
+            return DEGREE_CODES[1]
+        elif (person_1.knows(person_2,4)):
+            return DEGREE_CODES[2]
+        return DEGREE_CODES[3]
+
+    def add(self,id_1,id_2):
+        person_1 = self.reach.add_client(id_1)
+        person_2 = self.reach.add_client(id_2)
+        if (not person_1.knows(person_2,1)):
+            self.reach.merge(id_1,id_2)
+
+    def save(self,path,batch_in):
+        clients = self.reach.clients
+        ids = array('l',(person.id for person in clients))
+        save_snapshot(path,'v1',batch_in,ids,[layer_from_sets(ids,
+        ([clients[index].id for index in members(person.within[k+1] &
+        ~person.within[k])] for person in clients)) for k in xrange(4)])       # Layer k holds the people exactly k + 1 friendships away
+
+    def load(self,path,batch_in):
+        ids, layers = load_snapshot(path,'v1',batch_in)
+        for index in xrange(len(ids)):                                          # The snapshot's order of ids is the dense index order
+            person = self.reach.add_client(ids[index])
+            for k in xrange(4):
+                offsets, neighbors = layers[k]
+                person.within[k+1] = person.within[k] | mask_of(
+                neighbors[offsets[index]:offsets[index+1]],len(ids))
+
+
+# Version 1.5: friends sets plus the two-hop index. Uses options.hub_threshold
+class Two_hop_strategy(Strategy):
+
+    def __init__(self,options):
+        Strategy.__init__(self,options)
+        self.net = {}
+        self.threshold = options.hub_threshold
+
+    def check(self,id_1,id_2):
+        net = self.net
+        if (not net.has_key(id_1)):
+            net[id_1] = Unique_id(id_1)
+        if (not net.has_key(id_2)):
+            net[id_2] = Unique_id(id_2)
+        friends = id_2 in net[id_1].friends
+        code = 0 if friends else 1                                              # As in antifraud_1.5.py, the three features are checked separately (someone paying themselves can be their own friend, but never their own second-order friend)
+        if (not within_two(net,id_1,id_2)):
+            code |= 2
+        if (not (friends or share_second_order(net,id_1,id_2))):
+            code |= 4
+        return code
+
+    def add(self,id_1,id_2):
+        net = self.net
+        if (not net.has_key(id_1)):
+            net[id_1] = Unique_id(id_1)
+        if (not net.has_key(id_2)):
+            net[id_2] = Unique_id(id_2)
+        if (not (id_2 in net[id_1].friends)):
+            merge(net,id_1,id_2,self.threshold)
+
+    def save(self,path,batch_in):
+        net = self.net
+        ids = array('l',net.iterkeys())
+        save_snapshot(path,'v1.5/%d' % self.threshold,batch_in,ids,
+        [layer_from_sets(ids,(net[id].friends for id in ids)),
+        layer_from_counts(ids,(net[id].mutual or {} for id in ids))])
+
+    def load(self,path,batch_in):
+        net = self.net
+        ids, layers = load_snapshot(path,'v1.5/%d' % self.threshold,batch_in)  # The index depends on the threshold, so snapshots made with a different one can't be used
+        for id, friends, mutual in izip(ids,sets_from_layer(ids,*layers[0]),
+        counts_from_layer(ids,*layers[1])):
+            net[id] = Unique_id(id)
+            net[id].friends = friends
+            if (len(friends) > self.threshold):
+                net[id].mutual = None
+                net[id].hubs = None
+            else:
+                net[id].mutual = mutual
+        for person in net.itervalues():                                         # Record everyone's hub friends
+            if (person.hubs is not None):
+                person.hubs.update(friend for friend in person.friends if
+                net[friend].mutual is None)
+
+
+# Adds the friendship between id_1 and id_2 to network dictionary net. Friends
+#   sets that grow large are replaced by compressed bitmaps (see
+#   friend_bitmap.py), which support the same operations
+def add_friendship(net,id_1,id_2):
+    net[id_1].add(id_2)
+    net[id_2].add(id_1)
+    net[id_1] = compress(net[id_1])
+    net[id_2] = compress(net[id_2])
+
+
+# Version 2: friends sets, searched when a transaction is checked. Uses
+#   options.compact to store them in a Compact_network instead. The fourth-order
+#   check and the friendship update of the friends sets are the attributes
+#   within_degree and add_friendship, which take the network as their first
+#   argument, so they can be replaced (e.g. by two_hop_cache.py's cached
+#   versions)
+class Search_strategy(Strategy):
+
+    def __init__(self,options):
+        Strategy.__init__(self,options)
+        self.within_degree = within_distance
+        self.add_friendship = add_friendship
+
+    def build(self,ids_1,ids_2):
+        if (self.options.compact):
+            self._use_compact(Compact_network(ids_1,ids_2))
+            return
+        net = self.net = {}
+        for id_1, id_2 in izip(ids_1,ids_2):
+            net.setdefault(id_1,set()).add(id_2)
+            net.setdefault(id_2,set()).add(id_1)
+        for id, friends in net.iteritems():
+            net[id] = compress(friends)                                         # Replace the largest friends sets with compressed bitmaps
+
+    def _use_compact(self,net):
+        self.net = net
+        self.check = self._check_compact
+        self.add = net.add_friendship
+
+    def save(self,path,batch_in):
+        net = self.net
+        if (self.options.compact):
+            net.compact()
+            save_snapshot(path,'v2',batch_in,net.ids,[(net.offsets,
+            net.neighbors)])
+        else:
+            ids = array('l',net.iterkeys())
+            save_snapshot(path,'v2',batch_in,ids,[layer_from_sets(ids,
+            (net[id] for id in ids))])
+
+    def load(self,path,batch_in):
+        ids, layers = load_snapshot(path,'v2',batch_in)
+        if (self.options.compact):
+            net = Compact_network()
+            net.load_arrays(ids,*layers[0])
+            self._use_compact(net)
+        else:
+            self.net = dict(izip(ids,(compress(friends) for friends in
+            sets_from_layer(ids,*layers[0]))))
+
+    def check(self,id_1,id_2):
+        net = self.net
+        if (not net.has_key(id_1)):
+            net[id_1] = set()
+        if (not net.has_key(id_2)):
+            net[id_2] = set()
+        if (id_2 in net[id_1]):
+            return DEGREE_CODES[0]
+        elif (has_common_neighbor(net[id_1],net[id_2])):
+            return DEGREE_CODES[1]
+        elif (self.within_degree(net,id_1,id_2,4)):                             # Searches for a chain of four or fewer friendships between the participants
+            return DEGREE_CODES[2]
+        return DEGREE_CODES[3]
+
+    def _check_compact(self,id_1,id_2):
+        net = self.net
+        if (net.are_friends(id_1,id_2)):
+            return DEGREE_CODES[0]
+        elif (net.have_mutual_friend(id_1,id_2)):
+            return DEGREE_CODES[1]
+        elif (net.within_degree(id_1,id_2,4)):
+            return DEGREE_CODES[2]
+        return DEGREE_CODES[3]
+
+    def add(self,id_1,id_2):
+        self.add_friendship(self.net,id_1,id_2)
+
+
+STRATEGIES = {'v1': Reach_strategy, 'v1.5': Two_hop_strategy,
+'v2': Search_strategy}
@@ -0,0 +1,103 @@
+### Phase profile ###
+#
+# Where the time goes in a stream loop, for antifraud_2.extras.py's --profile
+#   option
+#
+#
+# Description:
+#
+# The stream loop calls mark(phase) at the end of each of its phases (reading
+#   the row, parsing it, the degree check, Extra 1's tick, and so on), and
+#   each phase is charged the time since the previous mark. This costs one
+#   clock reading per phase, and when profiling is off the loop only tests
+#   whether a profile was given.
+#
+# The degree check also records how far it got: whether the participants were
+#   friends, had a mutual friend, or needed the search of graph_query.py, in
+#   which case the number of frontiers it expanded and their sizes (grouped
+#   into powers of two) are recorded too.
+#
+# A summary of all three is written to stderr every 'interval' seconds and
+#   when the program exits.
+#
+#
+# Basic outline:
+#
+# Phase_profile(interval) is created once. start_row() is called at the top of
+#   each row (charging the time since the last mark to reading the row),
+#   mark(phase) after each phase, and reached(level) or searched(trace) after
+#   the degree check.
+
+
+import sys
+import time
+import atexit
+
+
+# Class accumulating the time and number of calls of each phase, and the
+#   degree check histograms. Input: seconds between summaries (0 for only at
+#   exit)
+class Phase_profile:
+
+    def __init__(self,interval):
+        self.interval = interval
+        self.phases = {}                                                        # Phase name: [calls, total seconds]
+        self.order = []                                                         # Phase names in the order first seen, for the summary
+        self.levels = {}                                                        # Degree check outcome: count
+        self.frontiers = {}                                                     # Frontier size, rounded up to a power of two: count
+        self.rows = 0
+        self.started = self.last = time.time()
+        self.next_report = self.started + interval
+        atexit.register(self.report,'at exit')
+
+    # Charges the time since the last mark to phase
+    def mark(self,phase):
+        now = time.time()
+        totals = self.phases.get(phase)
+        if (totals is None):
+            totals = self.phases[phase] = [0,0.0]
+            self.order.append(phase)
+        totals[0] += 1
+        totals[1] += now - self.last
+        self.last = now
+
+    # Marks the start of a row, charging the time since the last mark to
+    #   reading it. Writes a summary if one is due
+    def start_row(self):
+        self.mark('read')
+        self.rows += 1
+        if (self.interval and self.last >= self.next_report):
+            self.report('after %d rows' % self.rows)
+            self.next_report = self.last + self.interval
+            self.last = time.time()                                             # Don't charge writing the summary to the next phase
+
+    # Records a degree check that ended at level (e.g. 'friends')
+    def reached(self,level):
+        self.levels[level] = self.levels.get(level,0) + 1
+
+    # Records a degree check that ran the search. Input: the trace filled by
+    #   graph_query.within_distance
+    def searched(self,trace):
+        self.reached('search, %d frontiers' % len(trace))
+        frontiers = self.frontiers
+        for size in trace:
+            bucket = 1 << max(size - 1,0).bit_length()
+            frontiers[bucket] = frontiers.get(bucket,0) + 1
+
+    def report(self,when):
+        elapsed = time.time() - self.started
+        lines = ['Profile %s (%.1f s):' % (when,elapsed),
+        '  %-10s %10s %10s %10s %7s' % ('phase','calls','total s','us/call',
+        'share')]
+        total = sum(totals[1] for totals in self.phases.itervalues()) or 1.0
+        for phase in self.order:
+            calls, seconds = self.phases[phase]
+            lines.append('  %-10s %10d %10.3f %10.2f %6.1f%%' % (phase,calls,
+            seconds,seconds / calls * 1e6,seconds / total * 100))
+        lines.append('  Degree check reached:')
+        for level in sorted(self.levels):
+            lines.append('    %-24s %10d' % (level,self.levels[level]))
+        lines.append('  Frontier sizes:')
+        for bucket in sorted(self.frontiers):
+            lines.append('    <= %-21d %10d' % (bucket,self.frontiers[bucket]))
+        sys.stderr.write('\n'.join(lines) + '\n')
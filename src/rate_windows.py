@@ -0,0 +1,184 @@
+### Rate windows ###
+#
+# Per-account event rates (N events in T seconds, events per day) kept in
+#   shared arrays, for antifraud_2.extras.py's Extra 1
+#
+#
+# Description:
+#
+# Extra 1 flags accounts by how often they transact: more than a given number
+#   of transactions in a day, or six transactions within 10 seconds. Keeping
+#   the last five timestamps (and each daily count) as attributes of every
+#   account costs a Python object and a dictionary entry each, and adding a
+#   rule means adding more attributes. Here every account is given a slot
+#   (0, 1, 2, ...) when it is created, and each rule keeps its state for all
+#   accounts in one flat array, indexed by slot:
+#
+#   Event_window(events,seconds) answers 'is this the events-th event within
+#     seconds?'. It keeps a ring buffer of each account's last events - 1 event
+#     times (8 bytes each) plus the position of the oldest (1 byte). Recording
+#     an event compares its time with the oldest, then overwrites it.
+#
+#   Daily_count counts events (4 bytes per account). As before, counts are
+#     only reset when an account's next event comes two or more whole days
+#     after its previous one.
+#
+# So Extra 1's rules cost 8 + 5 * 8 + 1 + 2 * 4 = 57 bytes per account, and a
+#   new velocity rule only adds a few more.
+#
+#
+# Basic outline:
+#
+# Rate_windows holds the rules and the time of each account's previous event.
+#   Accounts only need a slot once they have an event, so accounts that never
+#   have one cost nothing.
+#   Rules are created with add_window and add_daily_count, slots with
+#   add_slot (rules can be added before or after slots). start_event(slot,time)
+#   must be called once per event, before the rules are updated, to reset the
+#   daily counts if needed. state() and restore(arrays) save and restore every
+#   slot's state, for checkpoints.
+#
+# Timestamp_parser converts the stream file's timestamps to the seconds these
+#   rules work in.
+
+
+import datetime
+from array import array
+
+
+NEVER = -62135593200                                                            # 0001-01-01 01:00:00 in seconds since 1970, i.e. long before any real transaction
+EPOCH_ORDINAL = datetime.date(1970,1,1).toordinal()                             # Day number of 1970-01-01, from which timestamps are counted
+
+
+# Class holding the ring buffers of an 'events in seconds' rule. Times are
+#   stored as doubles, which hold whole seconds exactly and are 8 bytes on
+#   every platform
+class Event_window:
+
+    def __init__(self,events,seconds,slots):
+        self.size = events - 1                                                  # The number of previous events remembered
+        self.seconds = seconds
+        self.times = array('d',[NEVER]) * (self.size * slots)                   # Slot s's ring buffer is times[s * size:(s + 1) * size]
+        self.oldest = array('B',[0]) * slots                                    # Position of the oldest time in each ring buffer
+
+    def add_slot(self):
+        self.times.extend(array('d',[NEVER]) * self.size)
+        self.oldest.append(0)
+
+    # Records an event for slot at c_time (in seconds). Returns True if it is
+    #   at least the events-th event within seconds
+    def record(self,slot,c_time):
+        position = self.oldest[slot]
+        k = slot * self.size + position
+        burst = c_time - self.times[k] < self.seconds
+        self.times[k] = c_time
+        position += 1
+        self.oldest[slot] = 0 if position == self.size else position
+        return burst
+
+
+# Class holding a daily event count for every slot
+class Daily_count:
+
+    def __init__(self,slots):
+        self.counts = array('i',[0]) * slots
+
+    def add_slot(self):
+        self.counts.append(0)
+
+    # Adds an event for slot, returning the count so far today
+    def increment(self,slot):
+        count = self.counts[slot] + 1
+        self.counts[slot] = count
+        return count
+
+
+# Class holding the rules and the time of each slot's previous event
+class Rate_windows:
+
+    def __init__(self):
+        self.slots = 0
+        self.last = array('d')                                                  # Time of each slot's previous event
+        self.windows = []
+        self.daily_counts = []
+
+    # Returns a new Event_window for the rule 'events events within seconds'
+    def add_window(self,events,seconds):
+        window = Event_window(events,seconds,self.slots)
+        self.windows.append(window)
+        return window
+
+    # Returns a new Daily_count
+    def add_daily_count(self):
+        counter = Daily_count(self.slots)
+        self.daily_counts.append(counter)
+        return counter
+
+    # Returns the slot of a new account
+    def add_slot(self):
+        self.last.append(NEVER)
+        for rule in self.windows + self.daily_counts:
+            rule.add_slot()
+        self.slots += 1
+        return self.slots - 1
+
+    # Starts an event for slot at c_time (in seconds), resetting its daily
+    #   counts if its previous event was two or more whole days before
+    def start_event(self,slot,c_time):
+        if ((c_time - self.last[slot]) // 86400 > 1):                           # Whole days between them, rounded down as timedelta.days does
+            for counter in self.daily_counts:
+                counter.counts[slot] = 0
+        self.last[slot] = c_time
+
+    # Returns the arrays holding the state of every slot, for checkpoints (see
+    #   checkpoint.py)
+    def state(self):
+        arrays = [self.last]
+        for window in self.windows:
+            arrays += [window.times,window.oldest]
+        for counter in self.daily_counts:
+            arrays.append(counter.counts)
+        return arrays
+
+    # Replaces the state of every slot with arrays returned by state(). The
+    #   same rules must have been added, in the same order
+    def restore(self,arrays):
+        arrays = iter(arrays)
+        self.last = next(arrays)
+        for window in self.windows:
+            window.times = next(arrays)
+            window.oldest = next(arrays)
+        for counter in self.daily_counts:
+            counter.counts = next(arrays)
+        self.slots = len(self.last)
+
+
+# Class converting timestamps in the stream file's fixed format
+#   ('YYYY-MM-DD HH:MM:SS') to integer seconds since 1970-01-01 00:00:00.
+#   datetime.strptime is slow, so the date part is converted once per day seen
+#   and the time part is read by slicing. Rows often share a timestamp, so the
+#   previous one is remembered too
+class Timestamp_parser:
+
+    def __init__(self):
+        self.last_text = None
+        self.last_seconds = None
+        self.days = {}                                                          # Date string: seconds at the start of that day
+
+    def parse(self,text):
+        if (text == self.last_text):
+            return self.last_seconds
+        if (len(text) != 19 or text[10] != ' '):
+            raise ValueError("timestamp '%s' does not match format " % text +
+            "'%Y-%m-%d %H:%M:%S'")
+        day = text[:10]
+        seconds = self.days.get(day)
+        if (seconds is None):
+            seconds = (datetime.date(int(day[:4]),int(day[5:7]),
+            int(day[8:10])).toordinal() - EPOCH_ORDINAL) * 86400
+            self.days[day] = seconds
+        seconds += int(text[11:13]) * 3600 + int(text[14:16]) * 60 + \
+        int(text[17:19])
+        self.last_text = text
+        self.last_seconds = seconds
+        return seconds
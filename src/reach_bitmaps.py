@@ -0,0 +1,123 @@
+### Reach bitmaps ###
+#
+# Version 1's network: bitmaps of everyone within one to four friendships of
+#   each client
+#
+#
+# Description:
+#
+# Every client is given a dense index (0, 1, 2, ...) in the order they first
+#   appear, and Unique_id.within holds bitmaps (Python integers, where bit i
+#   stands for the client with index i) of everyone within one, two, three and
+#   four friendships of the client. Checking a transaction is then a single bit
+#   test.
+#
+# Reach_network.merge records a new friendship. Previously this was done with
+#   sets, copying every affected set and then removing repeated entries from
+#   all of them ('collapsing'). With bitmaps, the people who actually get
+#   closer to one of the participants are found with a few whole-bitmap
+#   operations, and only their bitmaps are updated. Bitmaps are never modified
+#   in place, so when someone's bitmap ends up the same as a participant's, the
+#   two share a single copy.
+#
+#
+# Basic outline:
+#
+# members and mask_of convert between bitmaps and lists of dense indices (for
+#   snapshots). Used by antifraud_1.py and the v1 strategy of the paymo
+#   package.
+
+
+import re
+from binascii import hexlify
+
+
+ONE = re.compile('1')
+
+# Function returning the list of dense indices of the bits set in bitmap mask
+def members(mask):
+    return [match.start() for match in ONE.finditer(bin(mask)[:1:-1])]         # bin() gives '0b...' with the most significant bit first, so reverse it and drop the '0b'
+
+
+# Function returning a bitmap with the given dense indices set. size is
+#   (at least) the number of clients
+def mask_of(indices,size):
+    bits = bytearray(size // 8 + 1)
+    for index in indices:
+        bits[index >> 3] |= 1 << (index & 7)
+    bits.reverse()                                                              # hexlify reads the most significant byte first
+    return int(hexlify(bits),16)
+
+
+# Class containing friends bitmaps
+class Unique_id:
+    
+    def __init__(self,id,index):
+        self.id = id
+        self.index = index                                                      # The client's dense index, i.e. their bit in everyone's bitmaps
+        self.within = [1 << index] * 5                                          # self.within[k] is a bitmap of everyone within k friendships of the client, including the client themselves (so self.within[0] is just the client)
+
+    def knows(self,other,degree):                                               # Checks if other is within degree friendships of the client (no-one counts as their own friend)
+        return (self.within[degree] >> other.index) & 1 and other is not self
+        
+    def verification_1x(self,other):                                            # Checks if new request is from a friend
+        if(self.knows(other,1)):
+            return "trusted"
+        else:
+            return "unverified"
+    
+    def verification_2x(self,other):                                            # Checks if new request is from a friend or friend of a friend
+        if(self.knows(other,2)):
+            return "trusted"
+        else:
+            return "unverified"
+    
+    def verification_4x(self,other):                                            # Checks if new request is from a fourth-order friend or lower
+        if(self.knows(other,4)):
+            return "trusted"
+        else:
+            return "unverified"
+
+
+# Class holding the network: the Unique_id of every client, by id and by dense
+#   index
+class Reach_network:
+
+    def __init__(self):
+        self.network = {}                                                       # The dictionary of client ids and their Unique_id instance
+        self.clients = []                                                       # The same Unique_id instances, in dense index order
+
+    # Returns the Unique_id of client id, creating it if it doesn't exist yet
+    def add_client(self,id):
+        if (not self.network.has_key(id)):
+            self.network[id] = Unique_id(id,len(self.clients))
+            self.clients.append(self.network[id])
+        return self.network[id]
+
+    # Updates friendships after a new transaction between integer ids id_1 and
+    #   id_2.
+    #
+    # The new friendship puts someone i friendships from id_1 within i + 1 + j
+    #   friendships of everyone within j friendships of id_2 (and vice versa),
+    #   so their within[k] bitmap gains id_2's within[k-1-i]. Only people who
+    #   are strictly more than i + 1 friendships from id_2 gain anything, since
+    #   the others already reach everyone near id_2 that quickly. Those people
+    #   are found with a few bitmap operations, and nobody else is touched.
+    def merge(self,id_1,id_2):
+        if (id_1 == id_2):                                                      # Paying yourself doesn't make you your own friend
+            return
+        
+        within_1 = list(self.network[id_1].within)                              # The bitmaps from before the new friendship. Bitmaps are never changed in place, so copying the lists is enough
+        within_2 = list(self.network[id_2].within)
+        for near, far in ((within_1,within_2),(within_2,within_1)):
+            for i in xrange(4):
+                shell = near[i] & ~near[i-1] if i else near[0]                  # Everyone exactly i friendships from near's owner
+                moved = shell & ~far[i+1]                                       # ...who are now closer to far's owner than before
+                if (not moved):
+                    continue
+                gains = [(k,far[k-1-i]) for k in xrange(i + 1,5)]               # Each of them gains everyone within k - 1 - i of far's owner at degree k
+                for index in members(moved):
+                    within = self.clients[index].within
+                    for k, theirs in gains:
+                        merged = within[k] | theirs
+                        within[k] = theirs if merged == theirs else merged      # Share far's bitmap rather than keeping an identical copy
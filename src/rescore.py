@@ -0,0 +1,470 @@
+### Offline rescoring ###
+#
+# Recomputes the output of antifraud_2.extras.py for other values of the
+#   Extras' thresholds and weights, without replaying the stream file row by
+#   row each time
+#
+#
+# Description:
+#
+# Backtesting a new threshold (say, 8 payment requests a day instead of 10)
+#   used to mean editing antifraud_2.extras.py and rerunning it on the whole
+#   stream file. Most of that work doesn't depend on the thresholds at all:
+#   parsing the rows, the degree check against the network (which only
+#   changes with the friendships added by the stream itself), whether a row's
+#   cents or message are suspicious, how many requests each account had made
+#   that day and which earlier requests each repeated one targeted. Here all of
+#   that is worked out once, into one column per feature (arrays with an entry
+#   per row, or per participant of a row, called an 'event'). Scoring a set of
+#   parameters then only takes:
+#
+#   - Comprehensions over whole columns for the stateless rules (Extras 4, 5 and
+#     6 and the degree weights) and the daily counts of Extra 1a.
+#
+#   - For Extra 1b, the events grouped by account (a stable sort, done once):
+#     an event is the N-th within T seconds if the event N - 1 places before it
+#     in its group belongs to the same account and is less than T seconds
+#     older, so every event is checked with one comparison.
+#
+#   - A single sequential pass for what really is sequential: each account's
+#     fraud score, which every row reads and Extra 2 lowers again after clean
+#     runs.
+#
+# The features can be saved with --features-out and loaded with --features-in,
+#   so later runs skip the stream file (and the batch file) entirely. Scoring
+#   the default parameters gives exactly the output.txt of antifraud_2.extras.py
+#   (Extra 7 only writes suspects.txt, so it isn't part of rescoring).
+#
+#
+# Basic outline:
+#
+# build_features(batch_in,stream_in,rules) reads both files into a
+#   Stream_features, with the verified accounts and suspected scammers of rules
+#   (see rule_config.py).
+#   Rescorer(features).score(params) returns the untrustworthiness of every row
+#   and the number of Extra 3 rewards for a dictionary of parameters (see
+#   DEFAULTS in extras_params.py), and write_scores writes them in the format
+#   of output.txt.
+#
+# Usage: python rescore.py batch_in stream_in out_file [--set NAME=VALUE ...]
+#   [--features-out FILE | --features-in FILE] [--rules FILE]
+
+
+import sys
+import csv
+import json
+import zlib
+import argparse
+from array import array
+from itertools import izip
+from collections import Counter
+
+from id_reader import read_ids
+from graph_query import has_common_neighbor, within_distance
+from rate_windows import NEVER, Timestamp_parser
+from network_snapshot import batch_fingerprint
+from rule_config import Rule_error, load_rules
+from extras_params import DEFAULTS, read_row
+
+
+VERIFIED = 255                                                                  # The degree of rows whose requester is verified (Extra 0), which skip every other rule
+NO_FRIENDS = frozenset()                                                        # The friends set of every client without friends, shared until they make one
+
+
+class Features_error(Exception):
+    pass
+
+
+# Class holding the features of a stream file's rows. Columns with an entry per
+#   row are indexed by row r (counting only the rows antifraud_2.extras.py
+#   scores), those with an entry per event by 2 * r for the row's id1 and
+#   2 * r + 1 for its id2
+class Stream_features:
+
+    COLUMNS = (
+    ('account_1','i'),                                                          # Dense index of each row's id1
+    ('account_2','i'),                                                          # Dense index of each row's id2
+    ('degree','B'),                                                             # 0 for friends, 1 for friends of friends, 2 for third- or fourth-order friends, 3 otherwise (or VERIFIED)
+    ('dollars','l'),
+    ('cents','l'),
+    ('empty','B'),                                                              # Whether the message is empty or only spaces (Extra 6)
+    ('scammer','B'),                                                            # Whether id2 is a suspected scammer (Extra 4)
+    ('repeat_size','i'),                                                        # If id2 asked id1 for the same amount as it asked others just before, how many others (else -1), for Extra 8
+    ('event_account','i'),                                                      # Dense index of the event's account
+    ('event_time','l'),                                                         # Time of the event in seconds (see Timestamp_parser)
+    ('event_count','i'),                                                        # Requests of the event's kind (sent for id1, received for id2) made by its account that day, for Extra 1a
+    ('event_order','i'))                                                        # The events of non-verified rows, grouped by account and otherwise in order, for Extra 1b
+
+    def __init__(self):
+        self.accounts = 0
+        self.lists = None                                                       # Fingerprint of the rules' lists the features were made with (see lists_fingerprint)
+        for name, typecode in self.COLUMNS:
+            setattr(self,name,array(typecode))
+
+
+# Returns checksums of the verified accounts and suspected scammers of rules,
+#   which are part of the features
+def lists_fingerprint(rules):
+    return [zlib.crc32(rules.verified.ids.tostring()),
+    zlib.crc32(rules.suspects.ids.tostring())]
+
+
+# Adds each of id_1 and id_2 to the other's friends set in net
+def add_friendship(net,id_1,id_2):
+    if (net[id_1] is NO_FRIENDS):
+        net[id_1] = set()
+    if (net[id_2] is NO_FRIENDS):
+        net[id_2] = set()
+    net[id_1].add(id_2)
+    net[id_2].add(id_1)
+
+
+# Function reading batch file batch_in and stream file stream_in into a
+#   Stream_features, with the lists of rules. Rows are parsed (and skipped,
+#   with the same messages) as antifraud_2.extras.py does
+def build_features(batch_in,stream_in,rules):
+    features = Stream_features()
+    features.lists = lists_fingerprint(rules)
+    verified_accounts = rules.verified
+    suspects = rules.suspects
+    index = {}                                                                  # Client id: dense index
+    net = {}                                                                    # Client id: friends set
+
+    batch_ids_1, batch_ids_2 = read_ids(batch_in,'batch_payments')
+    for id_1, id_2 in izip(batch_ids_1,batch_ids_2):
+        for id in (id_1,id_2):
+            if (not (id in index)):
+                index[id] = len(index)
+                net[id] = NO_FRIENDS
+        if (id_1 in verified_accounts or id_2 in verified_accounts):
+            continue
+        add_friendship(net,id_1,id_2)
+    del batch_ids_1, batch_ids_2
+
+    timestamps = Timestamp_parser()
+    last_requested_amount = {}                                                  # Client id: the last amount they requested, for Extra 8
+    request_targets = {}                                                        # Client id: the targets of their repeated requests
+    degree = features.degree
+    cents = features.cents
+    empty = features.empty
+    scammer = features.scammer
+    repeat_size = features.repeat_size
+    event_time = features.event_time
+    row_number = 1
+    with open(stream_in,'rU') as stream_file:
+        stream = csv.DictReader(stream_file, skipinitialspace = True,
+        quoting=csv.QUOTE_NONE)
+        for row in stream:
+            row_number += 1
+            fields = read_row(row,row_number)
+            if (fields is None):
+                continue
+            id_1, id_2, amount, time_stamp, message = fields
+
+            for id in (id_1,id_2):
+                if (not (id in index)):
+                    index[id] = len(index)
+                    net[id] = NO_FRIENDS
+            features.account_1.append(index[id_1])
+            features.account_2.append(index[id_2])
+            features.dollars.append(amount[0])
+            if (id_2 in verified_accounts):
+                degree.append(VERIFIED)
+                cents.append(0)
+                empty.append(0)
+                scammer.append(0)
+                repeat_size.append(-1)
+                event_time.extend((0,0))
+                continue
+
+            if (id_2 in net[id_1]):
+                degree.append(0)
+            elif (has_common_neighbor(net[id_1],net[id_2])):
+                degree.append(1)
+            elif (within_distance(net,id_1,id_2,4)):
+                degree.append(2)
+            else:
+                degree.append(3)
+            c_time = timestamps.parse(time_stamp)
+            event_time.extend((c_time,c_time))
+            cents.append(amount[1])
+            empty.append(len(set(message) - set([' '])) == 0)
+            scammer.append(id_2 in suspects)
+
+            if (row['amount'] == last_requested_amount.get(id_2,'0.00')):
+                targets = request_targets.get(id_2)
+                if (targets is None):                                           # Only possible if their first request is for 0.00
+                    targets = request_targets[id_2] = set()
+                repeat_size.append(-1 if id_1 in targets else len(targets))
+                targets.add(id_1)
+            else:
+                request_targets[id_2] = set([id_1])
+                last_requested_amount[id_2] = row['amount']
+                repeat_size.append(-1)
+
+            if (not (id_1 in verified_accounts)):
+                add_friendship(net,id_1,id_2)
+
+    features.accounts = len(index)
+    del net, request_targets
+
+    # Interleave the rows' accounts into events, and group the events of
+    #   non-verified rows by account. The sort is stable, so each account's
+    #   events stay in order
+    events = 2 * len(degree)
+    event_account = features.event_account
+    event_account.extend(array('i',[0]) * events)
+    event_account[0::2] = features.account_1
+    event_account[1::2] = features.account_2
+    order = [e for e in xrange(events) if degree[e >> 1] != VERIFIED]
+    order.sort(key = event_account.__getitem__)
+    features.event_order.extend(order)
+
+    # Count each account's requests of each kind per day, resetting the counts
+    #   as Rate_windows.start_event does (see rate_windows.py)
+    event_count = features.event_count
+    event_count.extend(array('i',[0]) * events)
+    previous = None
+    for e in order:
+        account = event_account[e]
+        if (account != previous):
+            previous = account
+            last = NEVER
+            counts = [0,0]                                                      # Requests sent (as id1), received (as id2)
+        c_time = event_time[e]
+        if ((c_time - last) // 86400 > 1):
+            counts = [0,0]
+        last = c_time
+        counts[e & 1] += 1
+        event_count[e] = counts[e & 1]
+    return features
+
+
+# Class scoring a Stream_features with different parameters. The grouped
+#   events are kept between calls, as are Extra 1b's flags for each window
+class Rescorer:
+
+    def __init__(self,features):
+        self.features = features
+        order = features.event_order
+        self.grouped_accounts = array('i',
+        map(features.event_account.__getitem__,order))
+        self.grouped_times = array('l',
+        map(features.event_time.__getitem__,order))
+        self.bursts = {}                                                        # (events, seconds): flag of each event
+
+    # Returns a bytearray flagging each event that is at least the events-th
+    #   of its account within seconds (Extra 1b)
+    def burst_flags(self,events,seconds):
+        flags = self.bursts.get((events,seconds))
+        if (flags is None):
+            accounts = self.grouped_accounts
+            times = self.grouped_times
+            order = self.features.event_order
+            back = events - 1
+            flags = bytearray(len(self.features.event_account))
+            for k in [k for k in xrange(back,len(order)) if
+            accounts[k - back] == accounts[k] and
+            times[k] - times[k - back] < seconds]:
+                flags[order[k]] = 1
+            self.bursts[(events,seconds)] = flags
+        return flags
+
+    # Returns the untrustworthiness of every row (an array) and the number of
+    #   rewards, with the parameters in params (any not given take their
+    #   value from DEFAULTS)
+    def score(self,params = {}):
+        p = dict(DEFAULTS)
+        p.update(params)
+        f = self.features
+        if (p['burst_events'] < 2):
+            raise ValueError("burst_events must be at least 2")
+
+        # Extra 1's fraud score increments for each event, and Extra 8's
+        #   for each row's id2
+        burst = self.burst_flags(p['burst_events'],p['burst_seconds'])
+        give_per_day = p['give_per_day']
+        give_every = p['give_every']
+        take_per_day = p['take_per_day']
+        repeat_targets = p['repeat_targets']
+        repeat_penalty = p['repeat_penalty']
+        give_raise = [(count > give_per_day and count % give_every == 0) + b
+        for count, b in izip(f.event_count[0::2],burst[0::2])]
+        take_raise = [(count > take_per_day) + b + (size >= repeat_targets and
+        repeat_penalty) for count, b, size in izip(f.event_count[1::2],
+        burst[1::2],f.repeat_size)]
+
+        # The untrust of each row before the fraud score (-1 for verified
+        #   rows, which are always trusted)
+        degree_untrust = p['degree_untrust']
+        suspicious_cents = frozenset(p['suspicious_cents'])
+        scammer_untrust = p['scammer_untrust']
+        cents_untrust = p['cents_untrust']
+        empty_untrust = p['empty_untrust']
+        base = [-1 if d == VERIFIED else degree_untrust[d] +
+        s * scammer_untrust + (c in suspicious_cents) * cents_untrust +
+        e * empty_untrust for d, s, c, e in
+        izip(f.degree,f.scammer,f.cents,f.empty)]
+
+        # The fraud scores, in order (Extra 2 is the only reason this pass
+        #   can't be done column by column)
+        fraud_score = [0] * f.accounts
+        clean_count = [0] * f.accounts
+        clean_run = p['clean_run']
+        untrust = array('i')
+        append = untrust.append
+        for a, b, u, give, take in izip(f.account_1,f.account_2,base,
+        give_raise,take_raise):
+            if (u < 0):
+                append(0)
+                continue
+            initial_a = fraud_score[a]
+            initial_b = fraud_score[b]
+            fraud_score[a] += give
+            fraud_score[b] += take
+            append(u + fraud_score[b])
+            for i, initial in ((a,initial_a),(b,initial_b)):
+                if (initial == fraud_score[i]):
+                    clean_count[i] += 1
+                    if (clean_count[i] >= clean_run):
+                        clean_count[i] = 0
+                        fraud_score[i] = max(fraud_score[i] - 1,0)
+                else:
+                    clean_count[i] = 0
+
+        # Extra 3: every account in at least big_transactions large
+        #   transactions is rewarded once
+        big_dollars = p['big_dollars']
+        big = Counter([a for a, d in izip(f.account_1,f.dollars) if
+        d >= big_dollars])
+        big.update([a for a, d in izip(f.account_2,f.dollars) if
+        d >= big_dollars])
+        big_transactions = p['big_transactions']
+        rewards = sum(1 for count in big.itervalues() if
+        count >= big_transactions)
+        return untrust, rewards
+
+
+# Writes untrust and a trusted line for each reward to path, as
+#   antifraud_2.extras.py writes output.txt
+def write_scores(path,untrust,rewards):
+    with open(path,'w') as out:
+        if (untrust):
+            out.write('\n'.join(map(str,untrust)) + '\n')
+        out.write('0\n' * rewards)
+
+
+# Saves features to path, with the sizes and modification times of the files
+#   they were read from
+def save_features(path,features,batch_in,stream_in):
+    header = {'batch': batch_fingerprint(batch_in,False)[:2],
+    'stream': batch_fingerprint(stream_in,False)[:2],
+    'accounts': features.accounts,
+    'lists': features.lists,
+    'columns': [[name,typecode,len(getattr(features,name))] for name,
+    typecode in Stream_features.COLUMNS]}
+    with open(path,'wb') as f:
+        f.write(json.dumps(header) + '\n')
+        for name, typecode in Stream_features.COLUMNS:
+            getattr(features,name).tofile(f)
+
+
+# Loads the features saved in path, checking they were made from batch_in and
+#   stream_in with the lists of rules. Raises Features_error if not
+def load_features(path,batch_in,stream_in,rules):
+    with open(path,'rb') as f:
+        try:
+            header = json.loads(f.readline())
+        except ValueError:
+            raise Features_error("%s is not a features file" % path)
+        for key, source in (('batch',batch_in),('stream',stream_in)):
+            if (header[key] != list(batch_fingerprint(source,False)[:2])):
+                raise Features_error("%s was not made from %s (size or " %
+                (path,source) + "modification time differs)")
+        if (header.get('lists') != lists_fingerprint(rules)):
+            raise Features_error("%s was made with different lists of " % path +
+            "verified accounts or suspected scammers")
+        features = Stream_features()
+        features.accounts = header['accounts']
+        features.lists = header['lists']
+        for (name, typecode), (saved_name, saved_typecode, length) in izip(
+        Stream_features.COLUMNS,header['columns']):
+            column = getattr(features,name)
+            if (saved_name != name or saved_typecode != typecode):
+                raise Features_error("%s has a different layout" % path)
+            try:
+                column.fromfile(f,length)
+            except EOFError:
+                raise Features_error("%s is truncated" % path)
+    return features
+
+
+# Checks that value is a valid value for parameter name. Returns it (lists as
+#   tuples), or raises ValueError
+def check_parameter(name,value):
+    if (not (name in DEFAULTS)):
+        raise ValueError("unknown parameter '%s' (one of: %s)" % (name,
+        ', '.join(sorted(DEFAULTS))))
+    if (isinstance(DEFAULTS[name],tuple) != isinstance(value,list)):
+        raise ValueError("'%s' must be a " % name +
+        ("list" if isinstance(DEFAULTS[name],tuple) else "number"))
+    return tuple(value) if isinstance(value,list) else value
+
+
+# Parses a '--set NAME=VALUE' option. VALUE is JSON, e.g. 8 or [3,47]
+def parse_setting(text):
+    name, _, value = text.partition('=')
+    try:
+        value = json.loads(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("'%s' is not a JSON value" % value)
+    try:
+        return name, check_parameter(name,value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(description = "Recomputes the output " +
+    "of antifraud_2.extras.py with other parameters")
+    parser.add_argument('batch_in', help = "Batch input payments")
+    parser.add_argument('stream_in', help = "Stream input payments")
+    parser.add_argument('out_file', help = "Trustworthiness output")
+    parser.add_argument('--set', metavar = 'NAME=VALUE', type = parse_setting,
+    action = 'append', default = [], help = "Use VALUE (JSON) for " +
+    "parameter NAME instead of its default. Parameters: " +
+    ', '.join('%s=%s' % (name,json.dumps(DEFAULTS[name])) for name in
+    sorted(DEFAULTS)))
+    features_files = parser.add_mutually_exclusive_group()
+    features_files.add_argument('--features-out', metavar = 'FILE', help =
+    "Save the features read from the input files to FILE")
+    features_files.add_argument('--features-in', metavar = 'FILE', help =
+    "Load the features from FILE instead of reading the input files (which " +
+    "must still be the files FILE was made from)")
+    parser.add_argument('--rules', metavar = 'FILE', help = "Read the lists " +
+    "of verified accounts, suspected scammers and suspicious cent amounts " +
+    "from the files named in FILE, as antifraud_2.extras.py's --rules does")
+    args = parser.parse_args()
+
+    try:
+        rules = load_rules(args.rules)
+    except Rule_error as error:
+        sys.exit(str(error))
+    if (args.features_in):
+        try:
+            features = load_features(args.features_in,args.batch_in,
+            args.stream_in,rules)
+        except (Features_error,IOError) as error:
+            sys.exit(str(error))
+    else:
+        features = build_features(args.batch_in,args.stream_in,rules)
+        if (args.features_out):
+            save_features(args.features_out,features,args.batch_in,
+            args.stream_in)
+    params = {'suspicious_cents': tuple(sorted(rules.suspicious_cents))}
+    params.update(args.set)
+    try:
+        untrust, rewards = Rescorer(features).score(params)
+    except ValueError as error:
+        sys.exit(str(error))
+    write_scores(args.out_file,untrust,rewards)
@@ -0,0 +1,112 @@
+### Reward queue ###
+#
+# Collects the rewards payments of antifraud_2.extras.py's Extra 3 in memory,
+#   writing them to the rewards file and passing them on to a payout consumer a
+#   batch at a time
+#
+#
+# Description:
+#
+# Extra 3 pays accounts a one-time reward, which used to be written to the
+#   rewards file as a row at a time through csv.writer, with the current time
+#   formatted by datetime.utcnow().strftime for each one. At the end of the
+#   stream file the rewards file was then closed and read back with
+#   csv.DictReader, only to write a '0' line to the output file for each
+#   reward (rewards come from PayMo itself, so they are always trusted).
+#
+# Instead, rewards are put on a Reward_queue, which keeps them in a list and
+#   writes them out with a single writerows call once batch of them are
+#   waiting (and when the queue is closed). The time is only formatted again
+#   when the second changes. The queue counts the rewards it was given, so the
+#   output lines for them can be written without reading the file back.
+#
+# Each batch is also handed to an optional consumer, any callable taking a list
+#   of Reward records, e.g. the client of a payout service. Payout_log is a
+#   stand-in for one, writing each reward as a line of JSON.
+#
+#
+# Basic outline:
+#
+# Reward_queue(path,consumer,batch) writes the header of rewards file path.
+#   put(id_1,id_2,amount,message) adds a reward, flush() writes out the ones
+#   waiting and close() flushes and closes the file. count is the number of
+#   rewards put so far. position() flushes the rewards and syncs the file,
+#   returning its position, which can be given as resume_at to carry on
+#   writing from there (see checkpoint.py).
+
+
+import csv
+import json
+import time
+from collections import namedtuple
+
+from checkpoint import open_output, sync_output
+
+
+Reward = namedtuple('Reward','time id1 id2 amount message')                     # time is a 'YYYY-MM-DD HH:MM:SS' string (UTC), amount a string such as '5.00'
+
+
+# Class buffering rewards for the rewards file and an optional consumer
+class Reward_queue:
+
+    def __init__(self,path,consumer = None,batch = 4096,resume_at = None):
+        self.file = open_output(path,resume_at)
+        self.writer = csv.writer(self.file)
+        if (resume_at is None):
+            self.writer.writerow(['time',' id1',' id2',' amount',' message'])
+        self.consumer = consumer
+        self.batch = batch
+        self.pending = []                                                       # Rewards not yet written
+        self.count = 0
+        self.second = None                                                      # The second self.stamp was formatted for
+        self.stamp = None
+
+    # Adds a payment of amount from id_1 to id_2, dated now
+    def put(self,id_1,id_2,amount,message):
+        now = int(time.time())
+        if (now != self.second):
+            self.second = now
+            self.stamp = time.strftime('%Y-%m-%d %H:%M:%S',time.gmtime(now))    # The same string as datetime.utcnow().strftime gives
+        self.pending.append(Reward(self.stamp,id_1,id_2,amount,message))
+        self.count += 1
+        if (len(self.pending) >= self.batch):
+            self.flush()
+
+    # Writes the waiting rewards to the file and hands them to the consumer
+    def flush(self):
+        pending = self.pending
+        if (not pending):
+            return
+        self.writer.writerows([(reward.time,' %d' % reward.id1,
+        ' %d' % reward.id2,' ' + reward.amount,' ' + reward.message)
+        for reward in pending])
+        if (self.consumer is not None):
+            self.consumer(pending)
+        self.pending = []
+
+    # Writes the waiting rewards and syncs the file. Returns its position
+    def position(self):
+        self.flush()
+        return sync_output(self.file)
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+# Stand-in for a payout service: a consumer writing each reward it is given as
+#   a line of JSON to file path (from position resume_at, if given)
+class Payout_log:
+
+    def __init__(self,path,resume_at = None):
+        self.file = open_output(path,resume_at)
+
+    def __call__(self,rewards):
+        self.file.write(''.join(json.dumps(reward._asdict()) + '\n'
+        for reward in rewards))
+
+    def position(self):
+        return sync_output(self.file)
+
+    def close(self):
+        self.file.close()
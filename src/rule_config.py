@@ -0,0 +1,187 @@
+### Rule configuration ###
+#
+# Reads the lists antifraud_2.extras.py's rules check against (verified
+#   accounts, suspected scammers, suspicious cent amounts and bad words) from
+#   files, and reloads them on SIGHUP
+#
+#
+# Description:
+#
+# Extras 0, 4, 5 and 7 each check transactions against a list, which used to
+#   be hard-coded in antifraud_2.extras.py. Real lists can be far longer (e.g.
+#   hundreds of thousands of verified merchants), so they are read from files
+#   named in a JSON rules file:
+#
+#   {"verified": "verified.txt", "suspects": "suspects.txt",
+#    "suspicious_cents": "cents.txt", "bad_words": "bad_words.txt"}
+#
+#   Paths are relative to the rules file, and any list left out keeps its
+#   built-in value (the DEFAULT_ lists below). Each list file has one entry
+#   per line: an id, a number of cents or a regular expression. Blank lines
+#   and lines starting with '#' are skipped.
+#
+# Account ids are kept in an Id_list, a sorted array of 8 byte integers searched
+#   by bisection, which takes about a seventh of the memory of a set of them.
+#   It is only searched once per account, when the account is created: from
+#   then on the stream loop reads the account's entry in the verified or
+#   suspected scammer column of User_accounts (one byte per account). Cents
+#   are a small set, and bad words a Message_scanner (see message_scanner.py).
+#
+# Sending the process SIGHUP reloads the rules file and every list. The signal
+#   handler only records the request; the stream loop picks it up before its
+#   next row, so a row is never scored with half old and half new rules. If
+#   anything fails to load, the previous rules are all kept. The network isn't
+#   rebuilt, so friendships made with newly verified accounts while reading
+#   the batch file are kept (only later ones are skipped).
+#
+#
+# Basic outline:
+#
+# load_rules(path) returns the Rules in rules file path (the built-in lists if
+#   path is None), raising Rule_error if they can't be read.
+#   Rule_reloader(path) loads them and installs the SIGHUP handler; while
+#   pending is set, reload() should be called to load the new rules.
+#   rules_fingerprint(rules) returns a checksum of all the lists.
+
+
+import os
+import re
+import sys
+import json
+import zlib
+import signal
+from array import array
+from bisect import bisect_left
+
+from message_scanner import Message_scanner, read_patterns
+
+
+DEFAULT_VERIFIED = (6101,1023,67385,18768,22467)                                # Extra 0
+DEFAULT_SUSPECTS = (49594,20681,78285,20400,2316)                               # Extra 4
+DEFAULT_SUSPICIOUS_CENTS = (3,47,62,94)                                         # Extra 5
+DEFAULT_BAD_WORDS = (r'[Ww]ee+d',r'[Dd]ru+gs',
+r'[Rr]estore.*[Rr][Ee][Ii][Cc][Hh]')                                            # Extra 7 (yes, that last one appears 7 times in our data set...)
+
+
+class Rule_error(Exception):
+    pass
+
+
+# Class holding a set of account ids as a sorted array, tested with 'in'
+class Id_list:
+
+    def __init__(self,ids):
+        self.ids = array('l',sorted(set(ids)))
+
+    def __contains__(self,id):
+        ids = self.ids
+        k = bisect_left(ids,id)
+        return k < len(ids) and ids[k] == id
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+# Class holding the lists of one version of the rules
+class Rules:
+
+    def __init__(self,verified,suspects,suspicious_cents,bad_words):
+        self.verified = verified                                                # Id_list of verified accounts (Extra 0)
+        self.suspects = suspects                                                # Id_list of suspected scammers (Extra 4)
+        self.suspicious_cents = suspicious_cents                                # frozenset of cent amounts (Extra 5)
+        self.bad_words = bad_words                                              # Message_scanner of bad words (Extra 7)
+
+
+# Returns a checksum of every list in rules, e.g. to tell whether the rules
+#   have changed since a checkpoint was saved
+def rules_fingerprint(rules):
+    return zlib.crc32('\n'.join([rules.verified.ids.tostring(),
+    rules.suspects.ids.tostring(),','.join(map(str,
+    sorted(rules.suspicious_cents)))] + rules.bad_words.patterns))
+
+
+# Function reading the integers in list file path, one per line. Returns a list
+def read_numbers(path):
+    numbers = []
+    with open(path) as f:
+        for line_number, line in enumerate(f,1):
+            line = line.strip()
+            if (not line or line.startswith('#')):
+                continue
+            try:
+                numbers.append(int(line))
+            except ValueError:
+                raise Rule_error("%s, line %d: '%s' is not an integer" %
+                (path,line_number,line))
+    return numbers
+
+
+# Function reading the rules file path. Returns a Rules, or raises Rule_error
+def load_rules(path = None):
+    sources = {}
+    if (path is not None):
+        try:
+            with open(path) as f:
+                sources = json.load(f)
+        except (IOError,ValueError) as error:
+            raise Rule_error("Couldn't read rules from %s: %s" % (path,error))
+        if (not isinstance(sources,dict)):
+            raise Rule_error("%s must hold a JSON object" % path)
+        unknown = set(sources) - set(['verified','suspects',
+        'suspicious_cents','bad_words'])
+        if (unknown):
+            raise Rule_error("%s: unknown lists %s" % (path,
+            ', '.join(sorted(unknown))))
+        for name, file in sources.iteritems():
+            if (not isinstance(file,basestring)):
+                raise Rule_error("%s: the %s list must be given a file name" %
+                (path,name))
+        base = os.path.dirname(path)
+        sources = dict((name,os.path.join(base,file)) for name, file in
+        sources.iteritems())
+    try:
+        verified = Id_list(read_numbers(sources['verified']) if 'verified' in
+        sources else DEFAULT_VERIFIED)
+        suspects = Id_list(read_numbers(sources['suspects']) if 'suspects' in
+        sources else DEFAULT_SUSPECTS)
+        suspicious_cents = frozenset(read_numbers(sources['suspicious_cents'])
+        if 'suspicious_cents' in sources else DEFAULT_SUSPICIOUS_CENTS)
+        bad_words = Message_scanner(read_patterns(sources['bad_words']) if
+        'bad_words' in sources else DEFAULT_BAD_WORDS)
+    except (IOError,re.error) as error:
+        raise Rule_error("Couldn't read rules from %s: %s" % (path,error))
+    return Rules(verified,suspects,suspicious_cents,bad_words)
+
+
+# Class holding the current rules, and reloading them when the process is sent
+#   SIGHUP (if a rules file was given)
+class Rule_reloader:
+
+    def __init__(self,path):
+        self.path = path
+        self.rules = load_rules(path)                                           # Errors in the initial rules are fatal
+        self.pending = False                                                    # Whether SIGHUP has been received since the last reload
+        if (path is not None and hasattr(signal,'SIGHUP')):
+            signal.signal(signal.SIGHUP,self.request)
+            signal.siginterrupt(signal.SIGHUP,False)                            # Resume reads the signal interrupts (e.g. of a stream file that is a pipe) rather than failing them
+
+    def request(self,signum,frame):
+        self.pending = True
+
+    # Reloads the rules, returning the new Rules (or None if they couldn't be
+    #   read, in which case the previous ones stay current)
+    def reload(self):
+        self.pending = False
+        try:
+            self.rules = load_rules(self.path)
+        except Rule_error as error:
+            sys.stderr.write("Keeping the previous rules. %s\n" % error)
+            return None
+        sys.stderr.write("Reloaded rules from %s: %d verified accounts, " %
+        (self.path,len(self.rules.verified)) + "%d suspects, %d suspicious " %
+        (len(self.rules.suspects),len(self.rules.suspicious_cents)) +
+        "cent amounts, %d bad words\n" % len(self.rules.bad_words.patterns))
+        return self.rules
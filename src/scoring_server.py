@@ -0,0 +1,176 @@
+### Scoring server ###
+#
+# Keeps the Fraud Detection System running, answering transactions sent to it
+#   over a socket
+#
+#
+# Description:
+#
+# The antifraud codes read every transaction from a file and then exit. In real
+#   life, the point is to answer a client's request as quickly as possible,
+#   and reading the batch file again for every request would be hopeless. This
+#   module lets antifraud_2.py (run with '--serve ADDRESS') load the network
+#   once and then answer transactions for as long as it keeps running.
+#
+#
+# Basic outline:
+#
+# The server listens on a TCP port ('host:port') or a Unix socket (any address
+#   containing a '/'). Clients send one transaction per line, either in the
+#   same format as stream_payment.csv ('time, id1, id2, amount, message') or as
+#   just 'id1, id2'. For each transaction the server replies with one line
+#   containing the three features' verdicts, e.g. 'unverified, trusted, trusted'
+#   and only then adds the participants to each other's friends sets, so the
+#   update never delays the reply. Lines that can't be read get a reply
+#   starting with 'error:'.
+#
+# A Unix socket's file is removed when the server shuts down (and one left
+#   behind by a server that was killed is removed at startup).
+#
+# Sending the line 'STATS' returns the number of transactions answered and the
+#   50th and 99th percentile time (in milliseconds) taken to answer them. The
+#   same numbers are printed when the server shuts down.
+#
+# Python 2 doesn't have asyncio, so this uses asyncore and asynchat, which
+#   handle many clients at once in a single thread the same way.
+
+
+import os
+import sys
+import stat
+import time
+import signal
+import socket
+import asyncore
+import asynchat
+from collections import deque
+
+
+# Class recording how long transactions take to answer
+class Latency_counter:
+
+    def __init__(self,keep = 100000):
+        self.count = 0                                                          # Total transactions answered
+        self.recent = deque(maxlen = keep)                                      # The most recent times (in seconds), which the percentiles are taken from
+
+    def record(self,seconds):
+        self.count += 1
+        self.recent.append(seconds)
+
+    # Returns the p-th percentile of the recent times, in milliseconds
+    def percentile(self,p):
+        if (not self.recent):
+            return 0.0
+        ordered = sorted(self.recent)
+        position = min(len(ordered) - 1,int(len(ordered) * p / 100.0))
+        return 1000 * ordered[position]
+
+    def summary(self):
+        return "count %d, p50 %.3f ms, p99 %.3f ms" % (self.count,
+        self.percentile(50),self.percentile(99))
+
+
+# Reads the ids from one line sent by a client. Returns the integer ids, or
+#   raises ValueError
+def parse_transaction(line):
+    fields = line.split(',')
+    if (len(fields) == 2):                                                      # Just 'id1, id2'
+        return int(fields[0]), int(fields[1])
+    if (len(fields) < 3):
+        raise ValueError(line)
+    return int(fields[1]), int(fields[2])
+
+
+# Class handling one client connection
+class Scoring_channel(asynchat.async_chat):
+
+    def __init__(self,connection,server):
+        asynchat.async_chat.__init__(self,connection)
+        self.server = server
+        self.received = []
+        self.set_terminator('\n')
+
+    def collect_incoming_data(self,data):
+        self.received.append(data)
+
+    def found_terminator(self):
+        started = time.time()
+        line = ''.join(self.received).strip()
+        self.received = []
+        if (not line):
+            return
+        if (line == 'STATS'):
+            self.push(self.server.latency.summary() + '\n')
+            return
+
+        try:
+            id_1, id_2 = parse_transaction(line)
+        except ValueError:
+            self.push("error: id field does not contain an integer\n")
+            return
+
+        verdicts = self.server.check(id_1,id_2)
+        self.push(', '.join(verdicts) + '\n')                                   # push sends straight away if the socket is ready
+        self.server.latency.record(time.time() - started)
+
+        # The reply has gone, so now the network can be updated for future
+        #   transactions
+        self.server.update(id_1,id_2)
+
+
+# Class accepting client connections. Inputs: the address to listen on, and
+#   the functions check(id_1,id_2), which returns the three verdicts for a
+#   transaction, and update(id_1,id_2), which is called after replying
+class Scoring_server(asyncore.dispatcher):
+
+    def __init__(self,address,check,update):
+        asyncore.dispatcher.__init__(self)
+        self.check = check
+        self.update = update
+        self.latency = Latency_counter()
+
+        self.path = None                                                        # The Unix socket's file, removed when the server closes
+        if ('/' in address):
+            if (os.path.exists(address) and
+            stat.S_ISSOCK(os.stat(address).st_mode)):
+                os.remove(address)                                              # Left over from a run that didn't shut down cleanly
+            self.create_socket(socket.AF_UNIX,socket.SOCK_STREAM)
+            self.bind(address)
+            self.path = address
+        else:
+            host, port = address.rsplit(':',1)
+            self.create_socket(socket.AF_INET,socket.SOCK_STREAM)
+            self.set_reuse_addr()
+            self.bind((host,int(port)))
+        self.listen(128)
+
+    def handle_accept(self):
+        pair = self.accept()
+        if (pair is not None):
+            Scoring_channel(pair[0],self)
+
+    # Stops listening, removing the Unix socket's file so that the next run
+    #   can use the same path
+    def close(self):
+        asyncore.dispatcher.close(self)
+        if (self.path is not None):
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+
+# Runs the server until it is interrupted. See Scoring_server for the inputs
+def serve(address,check,update):
+    server = Scoring_server(address,check,update)
+    signal.signal(signal.SIGTERM,lambda signum, frame: sys.exit(0))           # Shut down cleanly when asked to stop
+    print "Listening on", address
+    sys.stdout.flush()
+    try:
+        asyncore.loop(timeout = 1,use_poll = True)
+    except (KeyboardInterrupt,SystemExit):
+        pass
+    finally:
+        server.close()
+    print "Latency:", server.latency.summary()
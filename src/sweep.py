@@ -0,0 +1,203 @@
+### Parameter sweep ###
+#
+# Scores the stream file with many sets of the Extras' parameters, in parallel,
+#   and tabulates how many transactions each set flags
+#
+#
+# Description:
+#
+# Tuning the thresholds and weights of antifraud_2.extras.py (see DEFAULTS in
+#   extras_params.py) means trying many combinations of them, and running the
+#   whole program for each one reads the batch file and rebuilds the network
+#   every time. Here the batch and stream files are read once, into the features of
+#   rescore.py (which include each row's degree, the only thing the network is
+#   needed for). Then a pool of worker processes is forked, each inheriting the
+#   features from the main process instead of reading or receiving them: the
+#   columns are arrays, whose contents the workers only read, so the operating
+#   system shares their memory pages between all the processes (copy-on-write)
+#   rather than copying them. Each worker scores the sets of parameters it is
+#   handed and sends back a few totals, so the wall time is about the time to
+#   read the files once plus the scoring time divided among the workers.
+#
+# The sets of parameters are every combination of the values given with
+#   '--vary NAME=[V1,V2,...]' (as many as needed), or the JSON objects listed
+#   in a file given with --configs, each on top of any '--set NAME=VALUE'
+#   options. The table has a row per set: its parameters, then the number of
+#   rows scored, how many were flagged (untrust of at least --flag-at), the
+#   share flagged, the mean untrust and the number of Extra 3 rewards.
+#
+#
+# Basic outline:
+#
+# run_sweep(features,configs,flag_at,processes) returns the totals of each
+#   config. write_table writes them as csv.
+#
+# Usage: python sweep.py batch_in stream_in table_out [--vary NAME=[V1,...] ...]
+#   [--configs FILE] [--set NAME=VALUE ...] [--flag-at N] [--processes N]
+#   [--features-in FILE] [--rules FILE]
+
+
+import sys
+import csv
+import json
+import argparse
+import multiprocessing
+from itertools import product
+
+from rescore import DEFAULTS, Rescorer, Features_error, build_features, \
+load_features, check_parameter, parse_setting
+from rule_config import Rule_error, load_rules
+
+
+_rescorer = None                                                                # Set by run_sweep before the workers are forked, so they inherit it
+_flag_at = None
+
+
+# Worker for run_sweep. Scores one config, returning the number of rows, the
+#   number flagged, the total untrust and the number of rewards
+def _score_job(config):
+    untrust, rewards = _rescorer.score(config)
+    flag_at = _flag_at
+    return (len(untrust),sum(1 for u in untrust if u >= flag_at),sum(untrust),
+    rewards)
+
+
+# Scores features with each config (a dictionary of parameters) in configs,
+#   counting rows with untrust of at least flag_at as flagged. processes is the
+#   number of worker processes (by default one per CPU; with 1 the configs are
+#   scored in this process). Returns a list of the totals of each config
+def run_sweep(features,configs,flag_at,processes = None):
+    global _rescorer, _flag_at
+    _rescorer = Rescorer(features)
+    _flag_at = flag_at
+    if (processes is None):
+        processes = multiprocessing.cpu_count()
+    if (processes <= 1 or len(configs) <= 1):
+        return map(_score_job,configs)
+    pool = multiprocessing.Pool(min(processes,len(configs)))
+    try:
+        return pool.map(_score_job,configs,chunksize = 1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+# Returns every combination of the values in varied, a list of (parameter,
+#   list of values) pairs, as a list of configs
+def grid_configs(varied):
+    names = [name for name, values in varied]
+    return [dict(zip(names,values)) for values in
+    product(*[values for name, values in varied])]
+
+
+# Writes a table of configs and their totals (from run_sweep) to path ('-' for
+#   standard output). names are the parameters given a column
+def write_table(path,names,configs,results):
+    out = sys.stdout if path == '-' else open(path,'wb')
+    try:
+        table = csv.writer(out)
+        table.writerow(names + ['rows','flagged','flagged_rate','mean_untrust',
+        'rewards'])
+        for config, (rows, flagged, total, rewards) in zip(configs,results):
+            table.writerow([json.dumps(config[name]) for name in names] +
+            [rows,flagged,'%.6f' % (float(flagged) / rows if rows else 0.0),
+            '%.4f' % (float(total) / rows if rows else 0.0),rewards])
+    finally:
+        if (out is not sys.stdout):
+            out.close()
+
+
+# Parses a '--vary NAME=[V1,V2,...]' option
+def parse_range(text):
+    name, _, values = text.partition('=')
+    try:
+        values = json.loads(values)
+    except ValueError:
+        raise argparse.ArgumentTypeError("'%s' is not a JSON list" % values)
+    if (not isinstance(values,list) or not values):
+        raise argparse.ArgumentTypeError("'%s' must be given a non-empty " %
+        name + "list of values")
+    try:
+        return name, [check_parameter(name,value) for value in values]
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+# Reads a list of configs from JSON file path
+def read_configs(path):
+    with open(path) as f:
+        configs = json.load(f)
+    if (not isinstance(configs,list) or not all(isinstance(config,dict) for
+    config in configs)):
+        raise ValueError("%s must hold a list of objects" % path)
+    return [dict((str(name),check_parameter(str(name),value)) for
+    name, value in config.iteritems()) for config in configs]
+
+
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(description = "Scores the stream file " +
+    "with many sets of antifraud_2.extras.py's parameters in parallel, " +
+    "writing a table of how many transactions each flags")
+    parser.add_argument('batch_in', help = "Batch input payments")
+    parser.add_argument('stream_in', help = "Stream input payments")
+    parser.add_argument('table_out', help = "Table of results, as csv ('-' " +
+    "for standard output)")
+    configs_from = parser.add_mutually_exclusive_group()
+    configs_from.add_argument('--vary', metavar = 'NAME=[V1,V2,...]', type =
+    parse_range, action = 'append', default = [], help = "Try each of the " +
+    "values (JSON) for parameter NAME, in every combination with the other " +
+    "--vary options. Parameters: " + ', '.join(sorted(DEFAULTS)))
+    configs_from.add_argument('--configs', metavar = 'FILE', help = "Try " +
+    "each of the sets of parameters in FILE, a JSON list of objects")
+    parser.add_argument('--set', metavar = 'NAME=VALUE', type = parse_setting,
+    action = 'append', default = [], help = "Use VALUE (JSON) for " +
+    "parameter NAME in every set")
+    parser.add_argument('--flag-at', metavar = 'N', type = int, default = 5,
+    help = "Count transactions with an untrust of N or more as flagged " +
+    "(default: %(default)s)")
+    parser.add_argument('--processes', metavar = 'N', type = int, help =
+    "Number of worker processes (default: one per CPU)")
+    parser.add_argument('--features-in', metavar = 'FILE', help = "Load the " +
+    "features from FILE (see rescore.py's --features-out) instead of " +
+    "reading the input files")
+    parser.add_argument('--rules', metavar = 'FILE', help = "Read the lists " +
+    "of verified accounts, suspected scammers and suspicious cent amounts " +
+    "from the files named in FILE, as antifraud_2.extras.py's --rules does")
+    args = parser.parse_args()
+    try:
+        rules = load_rules(args.rules)
+    except Rule_error as error:
+        sys.exit(str(error))
+
+    if (args.configs):
+        try:
+            configs = read_configs(args.configs)
+        except (IOError,ValueError) as error:
+            sys.exit("Couldn't read configs from %s: %s" % (args.configs,
+            error))
+        names = sorted(set(name for config in configs for name in config))
+    else:
+        configs = grid_configs(args.vary)
+        names = [name for name, values in args.vary]
+    fixed = {'suspicious_cents': tuple(sorted(rules.suspicious_cents))} if \
+    args.rules else {}
+    fixed.update(args.set)
+    names += sorted(name for name in fixed if not (name in names))
+    configs = [dict(fixed,**config) for config in configs]
+    for config in configs:
+        for name in names:
+            config.setdefault(name,DEFAULTS[name])
+
+    if (args.features_in):
+        try:
+            features = load_features(args.features_in,args.batch_in,
+            args.stream_in,rules)
+        except (Features_error,IOError) as error:
+            sys.exit(str(error))
+    else:
+        features = build_features(args.batch_in,args.stream_in,rules)
+    try:
+        results = run_sweep(features,configs,args.flag_at,args.processes)
+    except ValueError as error:
+        sys.exit(str(error))
+    write_table(args.table_out,names,configs,results)
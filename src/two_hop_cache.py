@@ -0,0 +1,173 @@
+### Two-hop cache ###
+#
+# Remembers the second-order friends of recently checked customers, so that
+#   the fourth-order check doesn't have to search outwards from them again
+#
+#
+# Description:
+#
+# The same customers turn up in many transactions of the stream file. Each
+#   time, antifraud_2.py's fourth-order check searches outwards from both
+#   participants from scratch. With '--two-hop-cache BYTES', the set of
+#   everyone within two friendships of a participant (their 'two-hop set',
+#   including themselves) is kept after it is first worked out. Two different
+#   people are within four friendships exactly when their two-hop sets
+#   overlap, so a repeat check involving a cached customer only needs one
+#   intersection test.
+#
+#
+# Basic outline:
+#
+# Two_hop_cache holds the two-hop sets in least-recently-used order. Whenever
+#   the total size of the sets (as given by __sizeof__) goes over the budget,
+#   the least recently used sets are dropped ('evicted'). Most customers only
+#   ever make one or two payments, so a set is only built the second time its
+#   customer comes up (the first time, the check is left to the ordinary
+#   search and the id is just remembered as a 'first sighting').
+#
+# Only small two-hop sets, of at most MAX_SIZE ids, are cached. Near accounts
+#   with huge numbers of friends (see README) the sets would be huge, slow to
+#   build and changing with every transaction, and the ordinary search is fast
+#   there anyway (see graph_query.py), so those checks are left to it
+#   ('skipped'). In particular, no one with a friend who has more than
+#   MAX_SIZE friends is ever cached.
+#
+# A new friendship between A and B changes the two-hop sets of A, B and all of
+#   their friends, and only those. Rather than dropping those entries (the
+#   participants of a transaction are the people most likely to come up
+#   again), they are updated in place: A's set gains B and B's friends, and
+#   each of A's friends' sets gains B, and the same the other way around. Sets
+#   which grow larger than MAX_SIZE are dropped instead ('invalidated').
+#
+# The numbers of hits, misses, evictions, updates, invalidations, first
+#   sightings and skipped checks are printed when the program exits.
+
+
+from collections import OrderedDict
+
+
+MAX_SIZE = 1024                                                                 # Largest two-hop set that is cached
+SEEN_SIZE = 1 << 16                                                             # Number of ids checked once that are remembered
+
+
+class Two_hop_cache:
+
+    def __init__(self,budget):
+        self.budget = budget                                                    # Maximum total size of the cached sets, in bytes
+        self.used = 0
+        self.entries = OrderedDict()                                            # Customer id -> (two-hop set, size), least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.updates = 0
+        self.invalidations = 0
+        self.skipped = 0                                                        # Checks left to the ordinary search, see MAX_SIZE
+        self.seen = set()                                                       # Ids checked once so far, see SEEN_SIZE
+        self.first_sightings = 0
+
+    # Returns the two-hop set of customer id in network dictionary net, or None
+    #   if id hasn't come up before or the set may be larger than MAX_SIZE
+    def two_hop(self,net,id):
+        entry = self.entries.pop(id,None)
+        if (entry is not None):
+            self.hits += 1
+            self.entries[id] = entry                                            # Re-inserting moves it to the most recently used end
+            return entry[0]
+
+        if (not (id in self.seen)):                                             # Only build the set the second time id comes up
+            if (len(self.seen) >= SEEN_SIZE):
+                self.seen.clear()
+            self.seen.add(id)
+            self.first_sightings += 1
+            return None
+        friends = net[id]
+        if (len(friends) > MAX_SIZE or sum(len(net[friend]) for friend in
+        friends) > MAX_SIZE):                                                   # The number of ids the set would be built from
+            self.skipped += 1
+            return None
+        self.misses += 1
+        reached = set(friends)
+        reached.add(id)
+        for friend in friends:
+            reached.update(net[friend])
+        size = reached.__sizeof__()
+        self.entries[id] = (reached,size)
+        self.used += size
+        self._evict()
+        return reached
+
+    # Adds ids to the cached two-hop set of id, if there is one
+    def _extend(self,id,ids):
+        entry = self.entries.get(id)
+        if (entry is None):
+            return
+        reached, size = entry
+        reached.update(ids)
+        if (len(reached) > MAX_SIZE):
+            self._drop(id)
+            return
+        self.entries[id] = (reached,reached.__sizeof__())                       # Assigning to an existing key leaves its place in the order alone
+        self.used += self.entries[id][1] - size
+        self.updates += 1
+
+    def _drop(self,id):
+        entry = self.entries.pop(id,None)
+        if (entry is not None):
+            self.used -= entry[1]
+            self.invalidations += 1
+
+    # Drops the least recently used entries until the cache is within budget
+    def _evict(self):
+        while (self.used > self.budget):
+            old_id, (old_set, old_size) = self.entries.popitem(last = False)
+            self.used -= old_size
+            self.evictions += 1
+
+    # Brings the cache up to date after a new friendship between id_1 and id_2
+    #   (who must already have been added to each other's friends)
+    def friendship_added(self,net,id_1,id_2):
+        for id, other in ((id_1,id_2),(id_2,id_1)):
+            if (len(net[other]) > MAX_SIZE):
+                self._drop(id)
+            else:
+                self._extend(id,list(net[other]) + [other])                     # other joins id's set along with their friends
+
+            # Friends of someone with more than MAX_SIZE friends are never
+            #   cached, so they only need looking at once, as that person
+            #   passes that size
+            friends = net[id]
+            if (len(friends) == MAX_SIZE + 1):
+                for friend in friends:
+                    self._drop(friend)
+            elif (len(friends) <= MAX_SIZE):
+                for friend in friends:
+                    self._extend(friend,(other,))
+        self._evict()
+
+    # Returns a version of within_degree (see Search_strategy in
+    #   paymo/strategies.py) which answers fourth-order checks from the cache
+    def searching(self,within_degree):
+        def cached_within_degree(net,id_1,id_2,max_degree):
+            if (id_1 == id_2 or max_degree != 4):                               # The search has its own rules for someone paying themselves
+                return within_degree(net,id_1,id_2,max_degree)
+            reached_1 = self.two_hop(net,id_1)
+            reached_2 = self.two_hop(net,id_2)                                  # Looked up even if id_1's set isn't available, so that id_2 counts as seen
+            if (reached_1 is None or reached_2 is None):
+                return within_degree(net,id_1,id_2,max_degree)
+            return not reached_1.isdisjoint(reached_2)
+        return cached_within_degree
+
+    # Returns a version of add_friendship (see Search_strategy in
+    #   paymo/strategies.py) which also keeps the cache up to date
+    def updating(self,add_friendship):
+        def cached_add_friendship(net,id_1,id_2):
+            add_friendship(net,id_1,id_2)
+            self.friendship_added(net,id_1,id_2)
+        return cached_add_friendship
+
+    def summary(self):
+        return "hits %d, misses %d, evictions %d, updates %d, " % (self.hits,
+        self.misses,self.evictions,self.updates) + "invalidations %d, " % \
+        self.invalidations + "first sightings %d, skipped %d, " % \
+        (self.first_sightings,self.skipped) + "%d sets (%d bytes) cached " % \
+        (len(self.entries),self.used) + "at exit"
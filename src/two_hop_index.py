@@ -0,0 +1,179 @@
+### Two-hop index ###
+#
+# Version 1.5's network: everyone's friends, plus an index of their
+#   second-order friends
+#
+#
+# Description:
+#
+# Version 1.5 stores first- and second-order friendships for everyone, so that
+#   checking a transaction only needs lookups and set intersections. Storing
+#   every second-order friendship takes gigabytes around accounts with huge
+#   numbers of friends ('hubs', see README): everyone who has paid a hub is the
+#   second-order friend of everyone else who has. So instead, the two-hop
+#   index (Unique_id.mutual) records, for each costumer who isn't a hub, how
+#   many mutual friends they share with each of their second-order friends,
+#   counting only mutual friends who aren't hubs either. A costumer is a hub
+#   once they have more than a given threshold of friends, so the index never
+#   holds more than about threshold * threshold entries per costumer. Each
+#   costumer also keeps the set of their friends who are hubs
+#   (Unique_id.hubs), which are few. Checks involving hubs fall back to
+#   intersecting friends sets on demand.
+#
+#
+# Basic outline:
+#
+# The network is a dictionary of Unique_id instances, one per costumer id.
+#   within_two and share_second_order answer the second- and fourth-order
+#   checks, and merge(net,id_1,id_2,threshold) records a new friendship,
+#   updating the counts in the index. Used by antifraud_1.5.py and the v1.5
+#   strategy of the paymo package.
+
+
+from itertools import chain
+
+from graph_query import has_common_neighbor
+
+
+# Class containing a client's friends and their entries in the two-hop index
+class Unique_id:
+    
+    def __init__(self,id):
+        self.id = id
+        self.friends = set()                                                    # The client's set of friends
+        self.mutual = {}                                                        # Second-order friend id -> number of mutual friends who aren't hubs. None once the client is a hub
+        self.hubs = set()                                                       # The ids of the client's friends who are hubs. None once the client is a hub
+
+    # Returns everyone the two-hop index records within two friendships of the
+    #   client (possibly including the client): their friends, plus, unless
+    #   they are a hub, everyone they share a mutual friend with who isn't a hub
+    def close_friends(self):
+        if (self.mutual is None):
+            return self.friends
+        return chain(self.friends,self.mutual)
+    
+    # Returns the friends whose own friends are not in the index, and must be
+    #   looked up when needed: all friends for a hub, otherwise just the hubs
+    def unindexed_friends(self):
+        if (self.mutual is None):
+            return self.friends
+        return self.hubs
+
+    def verification_1x(self,id_2):                                             # Checks if new request is from a friend
+        if(id_2 in self.friends):
+            return "trusted"
+        else:
+            return "unverified"
+    
+    def verification_2x(self,net,id_2):                                         # Checks if new request is from a friend or friend of a friend
+        if(within_two(net,self.id,id_2)):
+            return "trusted"
+        else:
+            return "unverified"
+    
+    def verification_4x(self,net,id_2):                                         # Checks if new request is from a fourth-order friend or lower
+        if(id_2 in self.friends or share_second_order(net,self.id,id_2)):
+            return "trusted"
+        else:
+            return "unverified"
+
+
+# Function checking whether id_2 is a first- or second-order friend of id_1 (a
+#   client is never their own first- or second-order friend). Inputs: network
+#   dictionary net, integer ids id_1 and id_2. Returns True or False
+def within_two(net,id_1,id_2):
+    if (id_1 == id_2):
+        return False
+    person = net[id_1]
+    if (id_2 in person.friends):
+        return True
+    if (person.mutual is None):                                                 # id_1 is a hub, so intersect friends sets instead
+        return has_common_neighbor(person.friends,net[id_2].friends)
+    if (id_2 in person.mutual):
+        return True
+    for hub in person.hubs:                                                     # Mutual friends who are hubs aren't in the index
+        if (id_2 in net[hub].friends):
+            return True
+    return False
+
+
+# Function checking whether id_1 and id_2 have a first- or second-order friend
+#   in common (i.e. whether they are fourth-order friends or lower). Inputs:
+#   network dictionary net, integer ids id_1 and id_2. Returns True or False.
+#
+# Each client's first- and second-order friends are those in close_friends(),
+#   plus the friends of their unindexed_friends(). So a common friend is either
+#   in one side's close_friends() (checked with within_two), or a friend of
+#   both sides' unindexed friends (checked by intersecting their sets)
+def share_second_order(net,id_1,id_2):
+    first = net[id_1]
+    second = net[id_2]
+    if (len(first.friends) <= (id_1 in first.friends) or
+    len(second.friends) <= (id_2 in second.friends)):
+        return False                                                            # Someone with no friends (other than themselves) has no second-order friends either
+    
+    if (len(first.friends) > len(second.friends)):                              # Start with the side that's quicker to walk
+        id_1, id_2 = id_2, id_1
+        first, second = second, first
+    for person, id_other in ((first,id_2),(second,id_1)):
+        for id in person.close_friends():
+            if (id != person.id and within_two(net,id_other,id)):
+                return True
+    
+    exclude = set([id_1,id_2])
+    for hub_1 in first.unindexed_friends():
+        for hub_2 in second.unindexed_friends():
+            if (has_common_neighbor(net[hub_1].friends,net[hub_2].friends,
+            exclude)):
+                return True
+    return False
+
+
+# Function adding step to the number of mutual friends recorded for id_1 and
+#   id_2, if id_1 isn't a hub
+def count_mutual(net,id_1,id_2,step):
+    mutual = net[id_1].mutual
+    if (mutual is None or id_1 == id_2):
+        return
+    count = mutual.get(id_2,0) + step
+    if (count):
+        mutual[id_2] = count
+    else:
+        del mutual[id_2]
+
+
+# Function for updating friendships after a new transaction. Inputs: network
+#   dictionary net, integer ids id_1 and id_2 of the two participants (who must
+#   not already be friends), and the number of friends above which a client
+#   counts as a hub
+def merge(net,id_1,id_2,threshold):
+    
+    if (id_1 == id_2):
+        ends = ((id_1,id_2),)
+    else:
+        ends = ((id_1,id_2),(id_2,id_1))
+    
+    for person, other in ends:
+        friends = net[person].friends                                           # person's friends before the new friendship
+        if (net[person].mutual is None):                                        # Hubs are never counted as mutual friends
+            continue
+        
+        elif (len(friends) + 1 > threshold):                                    # person becomes a hub, so stop counting them as a mutual friend
+            for friend in friends:
+                for friend_2 in friends:
+                    count_mutual(net,friend,friend_2,-1)
+                if (net[friend].hubs is not None):
+                    net[friend].hubs.add(person)
+            net[person].mutual = None
+            net[person].hubs = None
+        
+        else:
+            for friend in friends:                                              # person is now a mutual friend of other and each of their friends
+                count_mutual(net,other,friend,1)
+                count_mutual(net,friend,other,1)
+    
+    net[id_1].friends.add(id_2)                                                 # Add id_2 as id_1's friend
+    net[id_2].friends.add(id_1)                                                 # Add id_1 as id_2's friend
+    for person, other in ends:
+        if (net[person].mutual is None and net[other].hubs is not None):
+            net[other].hubs.add(person)
@@ -0,0 +1,76 @@
+### Verdict writer ###
+#
+# Writes the three output files from a separate thread, a block of
+#   transactions at a time
+#
+#
+# Description:
+#
+# Writing three short lines per transaction means three calls into the file
+#   objects for every row of the stream file. Instead, the stream file is
+#   scored a block of rows at a time (see iter_id_blocks in id_reader.py and
+#   paymo/pipeline.py), and each row's result is stored as a single byte in a
+#   buffer: by default 0 if the participants are friends, 1 if they have a
+#   mutual friend, 2 if they are third- or fourth-order friends and 3
+#   otherwise (paymo/pipeline.py uses the result codes of
+#   paymo/strategies.py instead). Finished buffers are handed to a
+#   Verdict_writer, which turns them into text and writes each output file in
+#   one large write per block, while the main thread carries on scoring the
+#   next block.
+#
+# The rows are still scored one after another, each seeing the friendships
+#   added by the rows before it, and the buffers are written in the order they
+#   were handed over, so the output files are exactly the same as when writing
+#   one line at a time.
+
+
+import threading
+from Queue import Queue
+
+
+# The line written to each output file for each result code
+LINES = (('trusted\n','unverified\n','unverified\n','unverified\n'),
+('trusted\n','trusted\n','unverified\n','unverified\n'),
+('trusted\n','trusted\n','trusted\n','unverified\n'))
+
+
+# Thread writing blocks of result codes to the three output files. Inputs:
+#   the paths of the three output files, the number of blocks that may be
+#   waiting to be written before put() waits for the writer to catch up, and
+#   the line written to each file for each code (LINES by default)
+class Verdict_writer(threading.Thread):
+
+    def __init__(self,paths,backlog = 4,lines = LINES):
+        threading.Thread.__init__(self)
+        self.lines = lines
+        self.daemon = True                                                      # Don't keep the program running if the main thread fails
+        self.files = [open(path,'wb') for path in paths]
+        self.blocks = Queue(backlog)
+        self.error = None                                                       # Anything raised while writing, passed on to the main thread by close()
+
+    # Queues a block of result codes (a bytearray) to be written
+    def put(self,codes):
+        self.blocks.put(codes)
+
+    def run(self):
+        try:
+            while (True):
+                codes = self.blocks.get()
+                if (codes is None):                                             # Sent by close()
+                    break
+                for f, lines in zip(self.files,self.lines):
+                    f.write(''.join(map(lines.__getitem__,codes)))
+        except Exception as error:
+            self.error = error
+            while (self.blocks.get() is not None):                              # Keep the main thread from waiting forever on a full queue
+                pass
+        finally:
+            for f in self.files:
+                f.close()
+
+    # Waits for every queued block to be written and closes the files
+    def close(self):
+        self.blocks.put(None)
+        self.join()
+        if (self.error is not None):
+            raise self.error